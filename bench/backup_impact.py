@@ -0,0 +1,111 @@
+"""
+Влияние резервного копирования на задержку записи.
+
+На копии синтетической базы из bench/db_bench.py писатель создает брони
+с постоянным темпом (как бот через AsyncBookingService.reserve), пока в
+отдельном потоке снимается копия booking.backup.backup() с разным числом
+страниц за шаг. Для сравнения — те же записи без копирования.
+
+Пример:
+    python bench/backup_impact.py --size 100000 --pages -1,64,16
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from booking import AsyncBookingService, backup  # noqa: E402
+from db_bench import build_database  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, p):
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Writer:
+    """Создает брони на уникальные даты далеко в будущем"""
+
+    def __init__(self, service, interval):
+        self.service = service
+        self.interval = interval
+        self.day = 0
+
+    async def write(self, stop):
+        latencies = []
+        while not stop():
+            self.day += 1
+            excursion_date = (datetime.date(2200, 1, 1) + datetime.timedelta(days=self.day)).isoformat()
+            started = time.perf_counter()
+            await self.service.reserve(
+                user_id=1, username='bench', school_name='Школа', class_number='10А',
+                class_profile='нет', excursion_date=excursion_date, excursion_time='10:00',
+                contact_person='Иванов', contact_phone='+79000000000', participants_count=20,
+            )
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(self.interval)
+        return latencies
+
+
+def describe(latencies):
+    values = sorted(latencies)
+    return (f"{len(values):>7} {percentile(values, 50) * 1000:>9.2f} {percentile(values, 99) * 1000:>9.2f} "
+            f"{(values[-1] if values else 0) * 1000:>9.2f}")
+
+
+async def run(db_path, backup_dir, pages_list, interval, baseline_seconds):
+    service = AsyncBookingService(db_path, capacity=10 ** 6)
+    writer = Writer(service, interval)
+    print(f"\n{'Режим':<28} {'Копия, с':>9} {'Записей':>7} {'p50, мс':>9} {'p99, мс':>9} {'Макс, мс':>9}")
+    try:
+        deadline = time.perf_counter() + baseline_seconds
+        latencies = await writer.write(lambda: time.perf_counter() > deadline)
+        print(f"{'без копирования':<28} {'-':>9} {describe(latencies)}")
+
+        for pages in pages_list:
+            started = time.perf_counter()
+            task = asyncio.create_task(asyncio.to_thread(backup.backup, db_path, backup_dir, pages))
+            latencies = await writer.write(task.done)
+            await task
+            elapsed = time.perf_counter() - started
+            label = 'за один шаг' if pages < 0 else f'{pages} страниц за шаг'
+            print(f"{label:<28} {elapsed:>9.2f} {describe(latencies)}")
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Задержка записи во время резервного копирования')
+    parser.add_argument('--size', type=int, default=100000, help='Записей в базе')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора данных')
+    parser.add_argument('--pages', default='-1,64,16', help='Страниц за шаг через запятую (-1 — все сразу)')
+    parser.add_argument('--interval', type=float, default=0.01, help='Пауза между записями, с')
+    parser.add_argument('--baseline', type=float, default=3.0, help='Длительность замера без копирования, с')
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'), help='Каталог для баз')
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    source = os.path.join(args.data_dir, f'bookings-{args.size}-{args.seed}.db')
+    build_database(source, args.size, args.seed)
+
+    with tempfile.TemporaryDirectory(prefix='backup-bench-') as workdir:
+        db_path = os.path.join(workdir, 'excursions.db')
+        shutil.copyfile(source, db_path)
+        pages_list = [int(value) for value in args.pages.split(',')]
+        asyncio.run(run(db_path, os.path.join(workdir, 'backups'), pages_list, args.interval, args.baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Сквозной нагрузочный тест бота без обращения к Telegram.
+
+Поднимает локальную замену Bot API (fake_bot_api.py), при --spawn запускает
+bot.py во временном каталоге со своей базой и списком админов, и гонит
+через бота тысячи «школ», которые параллельно проходят диалог
+SCHOOL → ... → CONFIRMATION. Одновременно админы выгружают Excel и делают
+рассылку.
+
+Пример:
+    python bench/bot_load.py --spawn --users 2000 --concurrency 300 --admins 2
+
+Выводит p50/p95/p99 задержки от отправки сообщения до ответа бота по каждому
+шагу диалога и пропускную способность бронирования.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from fake_bot_api import FakeBotApi
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Пользователи-школы и админы получают непересекающиеся id
+ADMIN_ID_BASE = 1000
+USER_ID_BASE = 1000000
+
+EXCURSION_TIMES = ['10:00', '11:00', '12:00', '13:00', '14:00', '15:00']
+# Вторник, среда, четверг (как WORKING_DAYS в config.py)
+WORKING_DAYS = (1, 2, 3)
+
+STEPS = ('start', 'school', 'class', 'profile', 'date', 'time',
+         'contact_person', 'phone', 'participants', 'confirmation')
+ADMIN_STEPS = ('export', 'broadcast')
+
+# Начало текста рассылки: такие сообщения школы пропускают
+BROADCAST_PREFIX = '📢 *Сообщение от администратора'
+
+
+def percentile(values, p):
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def working_dates(weeks):
+    """Даты экскурсий на ближайшие недели в формате ДД.ММ.ГГГГ"""
+    days = []
+    current = date.today() + timedelta(days=1)
+    for _ in range(weeks * 7):
+        if current.weekday() in WORKING_DAYS:
+            days.append(current.strftime('%d.%m.%Y'))
+        current += timedelta(days=1)
+    return days
+
+
+class LoadTest:
+    def __init__(self, api: FakeBotApi, args):
+        self.api = api
+        self.args = args
+        self.dates = working_dates(args.weeks)
+        self.latencies = {name: [] for name in STEPS + ADMIN_STEPS}
+        self.timeouts = {name: 0 for name in STEPS + ADMIN_STEPS}
+        self.booked = 0
+        self.rejected = 0
+        self.dates_taken = 0
+        self.gave_up = 0
+
+    async def reply(self, chat_id, timeout=None):
+        """Следующий ответ бота в чате, без сообщений рассылки"""
+        timeout = timeout or self.args.timeout
+        while True:
+            message = await self.api.next_reply(chat_id, timeout)
+            if not message.get('text', '').startswith(BROADCAST_PREFIX):
+                return message
+
+    async def step(self, name, chat_id, text, timeout=None):
+        """Отправляет сообщение и замеряет время до ответа бота"""
+        started = time.perf_counter()
+        self.api.push_message(chat_id, text)
+        try:
+            message = await self.reply(chat_id, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[name] += 1
+            raise
+        self.latencies[name].append(time.perf_counter() - started)
+        return message.get('text') or message.get('caption') or ''
+
+    async def school(self, number):
+        chat_id = USER_ID_BASE + number
+        await self.step('start', chat_id, '/start')
+        await self.step('school', chat_id, f'ГБОУ Школа №{number}, корпус 1, ул. Тестовая, д. {number}')
+        await self.step('class', chat_id, random.choice(['8', '9А', '10Б', '11']))
+        await self.step('profile', chat_id, random.choice(['нет', 'экономический', 'физмат']))
+
+        for _ in range(self.args.date_attempts):
+            text = await self.step('date', chat_id, random.choice(self.dates))
+            if 'доступна' in text:
+                break
+            self.dates_taken += 1
+        else:
+            self.gave_up += 1
+            self.api.push_message(chat_id, '/cancel')
+            return
+
+        await self.step('time', chat_id, random.choice(EXCURSION_TIMES))
+        await self.step('contact_person', chat_id, 'Иванов Иван Иванович')
+        await self.step('phone', chat_id, f'+7900{number % 10000000:07d}')
+        await self.step('participants', chat_id, str(random.randint(5, 20)))
+        text = await self.step('confirmation', chat_id, '✅ Подтвердить')
+        if 'успешно' in text:
+            self.booked += 1
+        else:
+            self.rejected += 1
+
+    async def admin(self, number):
+        chat_id = ADMIN_ID_BASE + number
+        self.api.push_message(chat_id, '/start')
+        await self.reply(chat_id)
+
+        actions = ['export'] * self.args.exports + ['broadcast'] * self.args.broadcasts
+        random.shuffle(actions)
+        for action in actions:
+            await asyncio.sleep(random.uniform(0, self.args.admin_pause))
+            if action == 'export':
+                await self.step('export', chat_id, '📤 Экспорт в Excel')
+            else:
+                # Замеряем всю рассылку: от текста до итогового отчета
+                self.api.push_message(chat_id, '📱 Отправить сообщение')
+                await self.reply(chat_id)
+                started = time.perf_counter()
+                self.api.push_message(chat_id, 'Нагрузочный тест: рассылка')
+                await self.reply(chat_id)
+                await self.reply(chat_id, timeout=self.args.broadcast_timeout)
+                self.latencies['broadcast'].append(time.perf_counter() - started)
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def limited(number):
+            async with semaphore:
+                try:
+                    await self.school(number)
+                except asyncio.TimeoutError:
+                    pass
+
+        async def admin(number):
+            try:
+                await self.admin(number)
+            except asyncio.TimeoutError:
+                self.timeouts['broadcast'] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(limited(number) for number in range(1, self.args.users + 1)),
+            *(admin(number) for number in range(1, self.args.admins + 1)),
+        )
+        return time.perf_counter() - started
+
+    def report(self, elapsed):
+        print(f"{'Шаг':<16} {'Ответов':>8} {'Таймаутов':>10} {'p50, мс':>9} {'p95, мс':>9} "
+              f"{'p99, мс':>9} {'Макс, мс':>9}")
+        for name in STEPS + ADMIN_STEPS:
+            latencies = sorted(self.latencies[name])
+            if not latencies and not self.timeouts[name]:
+                continue
+            print(f"{name:<16} {len(latencies):>8} {self.timeouts[name]:>10} "
+                  f"{percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 95) * 1000:>9.1f} "
+                  f"{percentile(latencies, 99) * 1000:>9.1f} {(latencies[-1] if latencies else 0) * 1000:>9.1f}")
+
+        total_updates = sum(len(values) for values in self.latencies.values())
+        print()
+        print(f"Длительность: {elapsed:.1f} с, обновлений: {total_updates} ({total_updates / elapsed:.1f}/с)")
+        print(f"Бронирований: {self.booked} ({self.booked / elapsed:.1f}/с), отказов при подтверждении: "
+              f"{self.rejected}, занятых дат: {self.dates_taken}, без свободной даты: {self.gave_up}")
+        print(f"Вызовы Bot API: {dict(self.api.calls.most_common())}")
+
+
+def spawn_bot(workdir, api_url, admins, slots_per_day):
+    """Запускает bot.py с отдельной базой, логом и списком админов"""
+    with open(os.path.join(workdir, 'admins.json'), 'w', encoding='utf-8') as f:
+        json.dump([str(ADMIN_ID_BASE + number) for number in range(1, admins + 1)], f)
+
+    env = dict(
+        os.environ,
+        BOT_TOKEN='123456:load-test',
+        TELEGRAM_API_URL=api_url,
+        EXCURSIONS_DB_PATH=os.path.join(workdir, 'excursions.db'),
+        EXCURSIONS_SLOTS_PER_DAY=str(slots_per_day),
+        LOG_FILE=os.path.join(workdir, 'bot.log'),
+        LOG_LEVEL='ERROR',
+        METRICS_PORT='0',
+    )
+    return subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'bot.py')], cwd=workdir, env=env)
+
+
+async def main_async(args):
+    api = FakeBotApi()
+    await api.start(args.host, args.port)
+    api_url = f'http://{args.host}:{args.port}'
+
+    bot_process = None
+    workdir = None
+    if args.spawn:
+        workdir = tempfile.TemporaryDirectory(prefix='bot-load-')
+        bot_process = spawn_bot(workdir.name, api_url, args.admins, args.slots_per_day)
+    else:
+        print(f"Запустите бота с TELEGRAM_API_URL={api_url}")
+
+    try:
+        # Ждем, пока бот начнет опрашивать getUpdates
+        while not api.calls['getUpdates']:
+            if bot_process is not None and bot_process.poll() is not None:
+                raise SystemExit('Бот завершился при запуске')
+            await asyncio.sleep(0.1)
+
+        test = LoadTest(api, args)
+        elapsed = await test.run()
+        test.report(elapsed)
+    finally:
+        if bot_process is not None:
+            bot_process.terminate()
+            bot_process.wait()
+            workdir.cleanup()
+        api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота через локальный Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081, help='Порт фейкового Bot API')
+    parser.add_argument('--spawn', action='store_true', help='Запустить bot.py во временном каталоге')
+    parser.add_argument('--users', type=int, default=1000, help='Сколько школ проходит диалог')
+    parser.add_argument('--concurrency', type=int, default=200, help='Сколько диалогов идет одновременно')
+    parser.add_argument('--admins', type=int, default=2, help='Число админов')
+    parser.add_argument('--exports', type=int, default=3, help='Выгрузок Excel на админа')
+    parser.add_argument('--broadcasts', type=int, default=1, help='Рассылок на админа')
+    parser.add_argument('--admin-pause', type=float, default=5.0, help='Пауза админа между действиями, до N секунд')
+    parser.add_argument('--weeks', type=int, default=8, help='Горизонт выбора дат, недель')
+    parser.add_argument('--date-attempts', type=int, default=5, help='Попыток выбрать свободную дату')
+    parser.add_argument('--slots-per-day', type=int, default=6, help='Мест в день для --spawn')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Ожидание ответа на шаг, секунд')
+    parser.add_argument('--broadcast-timeout', type=float, default=900.0, help='Ожидание конца рассылки, секунд')
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""
+Бенчмарк методов database.Database на больших таблицах.
+
+Генерирует синтетические базы нужных размеров (названия школ, рабочие дни
+за годы истории, число участников), замеряет время и выделения памяти для
+каждого метода, печатает EXPLAIN QUERY PLAN выполненных запросов и
+сохраняет результаты в JSON для сравнения между коммитами.
+
+Пример:
+    python bench/db_bench.py --sizes 10000,100000,1000000
+    python bench/db_bench.py --sizes 100000 --compare bench/results/db-<старый коммит>.json
+
+Сгенерированные базы кешируются в bench/data/ (размер и seed в имени файла).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from booking import connect, from_day, init_schema, to_day, to_minute  # noqa: E402
+from booking.dates import TODAY_SQL  # noqa: E402
+from booking.schools import school_key  # noqa: E402
+from database import Database  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Вторник, среда, четверг (как WORKING_DAYS в config.py)
+WORKING_DAYS = (1, 2, 3)
+# Время по минутам с 10:00 до 15:59: уникальность (дата, время) держится
+# даже на миллионе записей
+TIMES = [f'{hour:02d}:{minute:02d}' for hour in range(10, 16) for minute in range(60)]
+HISTORY_YEARS = 10
+FUTURE_WEEKS = 8
+
+SCHOOL_KINDS = ['ГБОУ Школа', 'ГБОУ Лицей', 'ГБОУ Гимназия', 'ГБОУ Центр образования', 'АНО Школа']
+STREETS = ['ул. Профсоюзная', 'Ленинский пр-т', 'ул. Вавилова', 'Варшавское ш.', 'ул. Бутлерова',
+           'Каширское ш.', 'ул. Народного Ополчения', 'Мичуринский пр-т', 'ул. Академика Янгеля']
+PROFILES = ['нет', 'общеобразовательный', 'экономический', 'физико-математический',
+            'социально-экономический', 'информационно-технологический', 'гуманитарный']
+FIRST_NAMES = ['Иван', 'Мария', 'Анна', 'Сергей', 'Елена', 'Ольга', 'Дмитрий', 'Наталья']
+LAST_NAMES = ['Иванов', 'Петрова', 'Смирнова', 'Кузнецов', 'Попова', 'Соколов', 'Лебедева']
+
+
+def working_dates(size):
+    """Рабочие дни: история за годы и несколько недель вперед, с запасом под size записей"""
+    today = datetime.date.today()
+    end = today + datetime.timedelta(weeks=FUTURE_WEEKS)
+    start = today - datetime.timedelta(days=365 * HISTORY_YEARS)
+    # На очень больших размерах история длиннее: в дне не больше len(TIMES) записей
+    needed_days = math.ceil(size / len(TIMES))
+    dates = []
+    current = end
+    while current >= start or len(dates) < needed_days:
+        if current.weekday() in WORKING_DAYS:
+            dates.append(current)
+        current -= datetime.timedelta(days=1)
+    dates.reverse()
+    return dates
+
+
+def generate_rows(size, seed):
+    """Синтетические бронирования: (дата, время) уникальны, школы бронируют повторно"""
+    rng = random.Random(seed)
+    dates = working_dates(size)
+    per_day = math.ceil(size / len(dates))
+    # Школ примерно втрое меньше, чем броней; популярные бронируют чаще
+    schools = max(1, size // 3)
+
+    produced = 0
+    for day in dates:
+        day_number = to_day(day)
+        for excursion_time in rng.sample(TIMES, min(per_day, size - produced)):
+            school = int(rng.paretovariate(1.2)) % schools + 1
+            kind = SCHOOL_KINDS[school % len(SCHOOL_KINDS)]
+            street = STREETS[school % len(STREETS)]
+            contact = f'{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}'
+            booked_at = datetime.datetime.combine(day, datetime.time(9)) - datetime.timedelta(days=rng.randint(1, 60))
+            yield (
+                100000 + school, f'user{school}', f'{kind} №{school}, {street}, д. {school % 150 + 1}',
+                f'{rng.randint(5, 11)}{rng.choice("АБВГ")}', rng.choice(PROFILES), day_number, to_minute(excursion_time),
+                contact, f'+79{rng.randint(0, 999999999):09d}', rng.randint(5, 22),
+                booked_at.strftime('%Y-%m-%d %H:%M:%S'),
+            )
+            produced += 1
+            if produced == size:
+                return
+
+
+def build_database(path, size, seed):
+    """Создает базу с size записями (если такой еще нет)"""
+    if os.path.exists(path):
+        # Базы, собранные старой версией, обновляются, как в боте
+        conn = connect(path)
+        try:
+            if init_schema(conn):
+                conn.execute('ANALYZE')
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        finally:
+            conn.close()
+        return
+    print(f"Генерация {size} записей в {path}...")
+    started = time.perf_counter()
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = connect(tmp_path)
+    try:
+        init_schema(conn)
+        conn.execute('BEGIN')
+        conn.executemany('''
+            INSERT INTO bookings (user_id, username, school_name, class_number, class_profile,
+                                  excursion_date, excursion_time, contact_person, contact_phone,
+                                  participants_count, booking_date, school_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (row + (school_key(row[2]),) for row in generate_rows(size, seed)))
+        conn.execute('COMMIT')
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    print(f"  готово за {time.perf_counter() - started:.1f} с")
+
+
+def explain(conn, statements):
+    """EXPLAIN QUERY PLAN для каждого выполненного запроса"""
+    plans = []
+    for sql in statements:
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        rows = conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+        plans.append({'sql': ' '.join(sql.split()), 'plan': [row[3] for row in rows]})
+    return plans
+
+
+async def sample_arguments(db):
+    """Аргументы методов: самый активный пользователь и ближайшая занятая дата"""
+    conn = await db.connection()
+    cursor = await conn.execute(
+        'SELECT user_id FROM bookings GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1')
+    user_id = (await cursor.fetchone())[0]
+    cursor = await conn.execute(
+        f"SELECT excursion_date FROM bookings WHERE excursion_date >= {TODAY_SQL} ORDER BY excursion_date LIMIT 1")
+    row = await cursor.fetchone()
+    date_str = (from_day(row[0]) if row else datetime.date.today()).isoformat()
+    return user_id, date_str
+
+
+def bench_cases(db, user_id, date_str):
+    """Вызовы, которые замеряются; «без кеша» — сброс кеша доступности перед вызовом"""
+
+    async def cold(method, *args):
+        db.cache.invalidate()
+        return await method(*args)
+
+    async def drain(iterator):
+        count = 0
+        async for _ in iterator:
+            count += 1
+        return count
+
+    return {
+        'get_user_bookings': lambda: db.get_user_bookings(user_id),
+        'get_all_bookings': lambda: db.get_all_bookings(),
+        'iter_all_bookings': lambda: drain(db.iter_all_bookings()),
+        'get_booking_stats': lambda: db.get_booking_stats(),
+        'is_date_available': lambda: db.is_date_available(date_str),
+        'is_date_available (без кеша)': lambda: cold(db.is_date_available, date_str),
+        'get_booked_dates (без кеша)': lambda: cold(db.get_booked_dates),
+        'get_booking_by_date': lambda: db.get_booking_by_date(date_str),
+        'get_booked_slots_for_date': lambda: db.get_booked_slots_for_date(date_str),
+        'is_time_available': lambda: db.is_time_available(date_str, '10:00'),
+        'get_user_ids': lambda: db.get_user_ids(),
+        'search_bookings (частое слово)': lambda: db.search_bookings('школа'),
+        'search_bookings (школа и номер)': lambda: db.search_bookings('лицей 131'),
+        'search_bookings (фамилия)': lambda: db.search_bookings('иванов'),
+    }
+
+
+def result_size(value):
+    # Потоковые методы замеряются вместе с обходом и возвращают число строк
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, (list, tuple)) and not isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return len(value)
+    return 1
+
+
+async def bench_size(path, repeat, methods):
+    db = Database(path)
+    conn = await db.connection()
+    statements = []
+    await conn.set_trace_callback(statements.append)
+    user_id, date_str = await sample_arguments(db)
+
+    results, plans = {}, {}
+    for name, call in bench_cases(db, user_id, date_str).items():
+        if methods and name.split()[0] not in methods:
+            continue
+
+        # Прогрев и сбор запросов для EXPLAIN
+        statements.clear()
+        value = await call()
+        executed = [sql for sql in statements if 'data_version' not in sql]
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await call()
+            timings.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        await call()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings.sort()
+        results[name] = {
+            'median_ms': statistics.median(timings) * 1000,
+            'p95_ms': timings[max(0, round(0.95 * len(timings)) - 1)] * 1000,
+            'min_ms': timings[0] * 1000,
+            'peak_kib': (peak - before) / 1024,
+            'retained_kib': (current - before) / 1024,
+            'rows': result_size(value),
+        }
+        plans[name] = executed
+
+    await conn.set_trace_callback(None)
+    await db.close()
+
+    sync_conn = sqlite3.connect(path)
+    try:
+        plans = {name: explain(sync_conn, executed) for name, executed in plans.items()}
+    finally:
+        sync_conn.close()
+    return results, plans
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_results(size, results, plans, show_plans):
+    print(f"\n=== {size} записей ===")
+    print(f"{'Метод':<30} {'Строк':>7} {'Медиана, мс':>12} {'p95, мс':>9} {'Мин, мс':>9} {'Пик, КиБ':>10}")
+    for name, data in results.items():
+        print(f"{name:<30} {data['rows']:>7} {data['median_ms']:>12.3f} {data['p95_ms']:>9.3f} "
+              f"{data['min_ms']:>9.3f} {data['peak_kib']:>10.1f}")
+    if show_plans:
+        for name, queries in plans.items():
+            for query in queries:
+                print(f"\n{name}: {query['sql']}")
+                for line in query['plan']:
+                    print(f"    {line}")
+
+
+def compare(baseline_path, report, threshold):
+    """Печатает изменение медианы относительно сохраненного прогона"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nСравнение с {baseline.get('commit')} ({baseline_path}), порог регрессии x{threshold}:")
+    print(f"{'Размер':>8} {'Метод':<30} {'Было, мс':>10} {'Стало, мс':>10} {'Изменение':>10}")
+    regressions = 0
+    for size, data in report['sizes'].items():
+        old_results = baseline.get('sizes', {}).get(size, {}).get('results', {})
+        for name, new in data['results'].items():
+            old = old_results.get(name)
+            if not old:
+                continue
+            ratio = new['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+            mark = '  <-- регрессия' if ratio > threshold else ''
+            regressions += bool(mark)
+            print(f"{size:>8} {name:<30} {old['median_ms']:>10.3f} {new['median_ms']:>10.3f} {ratio:>9.2f}x{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк методов Database')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='Размеры таблицы через запятую')
+    parser.add_argument('--repeat', type=int, default=20, help='Повторов каждого метода')
+    parser.add_argument('--methods', default='', help='Только эти методы (через запятую)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора данных')
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'), help='Каталог для баз')
+    parser.add_argument('--output', default='', help='Файл JSON (по умолчанию bench/results/db-<коммит>.json)')
+    parser.add_argument('--compare', default='', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=1.2, help='Во сколько раз медленнее считать регрессией')
+    parser.add_argument('--no-plans', action='store_true', help='Не печатать планы запросов')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    methods = {name.strip() for name in args.methods.split(',') if name.strip()}
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'sizes': {},
+    }
+    for size in sizes:
+        path = os.path.join(args.data_dir, f'bookings-{size}-{args.seed}.db')
+        build_database(path, size, args.seed)
+        results, plans = asyncio.run(bench_size(path, args.repeat, methods))
+        print_results(size, results, plans, not args.no_plans)
+        report['sizes'][str(size)] = {'results': results, 'plans': plans}
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f'db-{commit}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {output}")
+
+    if args.compare:
+        regressions = compare(args.compare, report, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
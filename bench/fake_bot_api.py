@@ -0,0 +1,202 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов бота.
+
+Реализует методы getMe, getUpdates (long polling), sendMessage,
+sendDocument, editMessageText; на остальные методы (deleteWebhook,
+setMyCommands и т.п.) отвечает true. Обновления от «пользователей»
+добавляются через push_message(), ответы бота читаются из очереди чата
+через next_reply().
+
+Бот направляется сюда настройкой TELEGRAM_API_URL:
+    python fake_bot_api.py --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_TOKEN=123:fake python ../bot.py
+"""
+import argparse
+import asyncio
+import collections
+import email.parser
+import email.policy
+import itertools
+import json
+import time
+from typing import Deque, Dict, Optional
+from urllib.parse import parse_qsl
+
+BOT_USER = {
+    'id': 100000001,
+    'is_bot': True,
+    'first_name': 'Экскурсии (тест)',
+    'username': 'excursions_fake_bot',
+    'can_join_groups': False,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': False,
+}
+
+
+class FakeBotApi:
+    """HTTP-сервер, который ведет себя как api.telegram.org для одного бота"""
+
+    def __init__(self, keep_replies: bool = True):
+        # keep_replies=False — ответы бота не копятся (воспроизведение без проверки ответов)
+        self.keep_replies = keep_replies
+        self.updates: Deque[dict] = collections.deque()
+        self.replies: Dict[int, asyncio.Queue] = collections.defaultdict(asyncio.Queue)
+        self.calls = collections.Counter()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # ---------- сторона пользователей ----------
+
+    def push_message(self, user_id: int, text: str, first_name: str = 'Тест') -> None:
+        """Добавляет входящее сообщение от пользователя в очередь getUpdates"""
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': first_name},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': first_name, 'username': f'user{user_id}'},
+            'text': text,
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        self.updates.append({'update_id': next(self._update_ids), 'message': message})
+        self._new_updates.set()
+
+    async def next_reply(self, chat_id: int, timeout: float = 30) -> dict:
+        """Ждет следующий ответ бота в чате (сообщение или документ)"""
+        return await asyncio.wait_for(self.replies[chat_id].get(), timeout)
+
+    # ---------- методы Bot API ----------
+
+    async def get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+
+        # Подтвержденные обновления (id < offset) больше не отдаем
+        while self.updates and self.updates[0]['update_id'] < offset:
+            self.updates.popleft()
+
+        if not self.updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self.updates, limit))
+
+    def _bot_message(self, params: dict, **fields) -> dict:
+        chat_id = int(params['chat_id'])
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            **fields,
+        }
+        if self.keep_replies:
+            self.replies[chat_id].put_nowait(message)
+        return message
+
+    async def call(self, method: str, params: dict):
+        self.calls[method] += 1
+        if method == 'getUpdates':
+            return await self.get_updates(params)
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'sendMessage':
+            return self._bot_message(params, text=params.get('text', ''))
+        if method == 'sendDocument':
+            filename = params.get('filename', 'document')
+            return self._bot_message(params, caption=params.get('caption', ''), document={
+                'file_id': f'fake-{filename}', 'file_unique_id': filename, 'file_name': filename,
+            })
+        if method == 'editMessageText':
+            return self._bot_message(params, text=params.get('text', ''), edit_date=int(time.time()))
+        return True
+
+    # ---------- HTTP ----------
+
+    @staticmethod
+    def _parse_body(content_type: str, body: bytes) -> dict:
+        if not body:
+            return {}
+        if content_type.startswith('application/json'):
+            return json.loads(body)
+        if content_type.startswith('multipart/form-data'):
+            # Содержимое файлов не нужно, берем только обычные поля и имя файла
+            message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+            params = {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                if part.get_filename():
+                    params['filename'] = part.get_filename()
+                elif name:
+                    params[name] = part.get_content()
+            return params
+        return dict(parse_qsl(body.decode('utf-8')))
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line or line in (b'\r\n', b'\n'):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                path = request_line.decode('latin-1').split()[1]
+                method = path.rstrip('/').rsplit('/', 1)[-1]
+                params = self._parse_body(headers.get('content-type', ''), body)
+                result = await self.call(method, params)
+
+                payload = json.dumps({'ok': True, 'result': result}, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: ' + str(len(payload)).encode() + b'\r\n\r\n' + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # CancelledError — остановка сервера во время long polling
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8081) -> None:
+        self._server = await asyncio.start_server(self._handle_client, host, port)
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+
+
+async def serve(host: str, port: int) -> None:
+    api = FakeBotApi()
+    await api.start(host, port)
+    print(f"Фейковый Bot API слушает http://{host}:{port}")
+    while True:
+        await asyncio.sleep(3600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная замена Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Импорт броней из файла: разбор, проверка и вставка.
+
+Генерирует таблицу на --rows броней в раскладке выгрузки (XLSX и CSV),
+разбирает ее importer.read_bookings и вставляет booking.insert_bookings
+в пустую базу, затем повторяет импорт того же файла (все строки —
+конфликты). Для сравнения те же брони добавляются по одной через RESERVE,
+как при бронировании в диалоге.
+
+Пример:
+    python bench/import_bench.py --rows 10000
+"""
+import argparse
+import csv
+import datetime
+import io
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault('BOT_TOKEN', '123456:import-bench')
+
+from booking import connect, init_schema, insert_bookings, queries  # noqa: E402
+import importer  # noqa: E402
+import validators  # noqa: E402
+
+
+def generate_rows(count):
+    """Строки таблицы: по брони на каждый будущий рабочий день"""
+    day = datetime.date.today() + datetime.timedelta(days=1)
+    rows = []
+    while len(rows) < count:
+        if validators.is_working_day(day):
+            index = len(rows)
+            rows.append([None, None, None, None, f"ГБОУ Школа №{index % 3000} (корпус {index % 7})",
+                         f"{index % 11 + 1}А", 'нет', day, f"{10 + index % 6}:00",
+                         'Иванова Мария Петровна', '+7 (900) 123-45-67', index % 20 + 1])
+        day += datetime.timedelta(days=1)
+    return rows
+
+
+def to_xlsx(rows):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Бронирования')
+    sheet.append(importer.HEADERS)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def to_csv(rows):
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(importer.HEADERS)
+    for row in rows:
+        writer.writerow([value.strftime('%d.%m.%Y') if isinstance(value, datetime.date) else value
+                         for value in row])
+    return buffer.getvalue().encode('utf-8')
+
+
+def fresh_database(workdir, name):
+    path = os.path.join(workdir, name)
+    conn = connect(path)
+    try:
+        init_schema(conn)
+    finally:
+        conn.close()
+    return path
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def reserve_one_by_one(db_path, bookings):
+    conn = connect(db_path)
+    try:
+        for booking in bookings:
+            conn.execute(queries.RESERVE, queries.reserve_params(booking, 1))
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Импорт броней из файла')
+    parser.add_argument('--rows', type=int, default=10000, help='Броней в файле')
+    args = parser.parse_args()
+
+    rows = generate_rows(args.rows)
+    files = {'xlsx': to_xlsx(rows), 'csv': to_csv(rows)}
+
+    print(f"{'Файл':<6} {'Размер, КБ':>10} {'Разбор, с':>10} {'Вставка, с':>11} {'Повтор, с':>10} "
+          f"{'Добавлено':>10} {'Отказов при повторе':>20}")
+    with tempfile.TemporaryDirectory(prefix='import-bench-') as workdir:
+        for extension, data in files.items():
+            parsed, parse_time = timed(importer.read_bookings, data, f'bookings.{extension}', 1, 'bench')
+            db_path = fresh_database(workdir, f'{extension}.db')
+            reasons, insert_time = timed(insert_bookings, parsed.bookings, db_path, 1)
+            again, again_time = timed(insert_bookings, parsed.bookings, db_path, 1)
+            print(f"{extension:<6} {len(data) / 1024:>10.0f} {parse_time:>10.2f} {insert_time:>11.3f} "
+                  f"{again_time:>10.3f} {reasons.count(None):>10} {len(again) - again.count(None):>20}")
+
+        db_path = fresh_database(workdir, 'reserve.db')
+        _, reserve_time = timed(reserve_one_by_one, db_path, parsed.bookings)
+        print(f"\nПо одной через RESERVE (автокоммит): {reserve_time:.2f} с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+Миграция схемы на большой базе под нагрузкой.
+
+Строит базу в формате до версии 1 (дата и время экскурсии текстом) на
+--size записей и применяет к ее копии booking.migrations, пока в отдельном
+потоке бот с постоянным темпом создает и отменяет брони. Для сравнения —
+та же миграция одной транзакцией (--batch-sizes 0).
+После миграции проверяется, что на месте все строки, включая созданные
+и отмененные во время миграции, и что индекс поиска с ними совпадает.
+
+Пример:
+    python bench/migration_check.py --size 1000000 --batch-sizes 0,2000
+"""
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from booking import LATEST_VERSION, connect, from_day, from_minute, to_day, to_minute  # noqa: E402
+from booking import migrations, queries  # noqa: E402
+from db_bench import generate_rows  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Схема до версии 1 (user_version = 0)
+LEGACY_SCHEMA = '''
+    CREATE TABLE bookings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        username TEXT,
+        school_name TEXT NOT NULL,
+        class_number TEXT NOT NULL,
+        class_profile TEXT,
+        excursion_date DATE NOT NULL,
+        excursion_time TEXT NOT NULL,
+        contact_person TEXT NOT NULL,
+        contact_phone TEXT NOT NULL,
+        participants_count INTEGER NOT NULL,
+        booking_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(excursion_date, excursion_time)
+    );
+    CREATE INDEX idx_excursion_date ON bookings(excursion_date);
+    CREATE INDEX idx_bookings_date_id ON bookings(excursion_date, id);
+    CREATE INDEX idx_bookings_school ON bookings(school_name COLLATE NOCASE, excursion_date, id);
+    CREATE INDEX idx_bookings_user ON bookings(user_id, excursion_date);
+    CREATE TABLE bookings_archive (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        username TEXT,
+        school_name TEXT NOT NULL,
+        class_number TEXT NOT NULL,
+        class_profile TEXT,
+        excursion_date DATE NOT NULL,
+        excursion_time TEXT NOT NULL,
+        contact_person TEXT NOT NULL,
+        contact_phone TEXT NOT NULL,
+        participants_count INTEGER NOT NULL,
+        booking_date TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX idx_archive_date ON bookings_archive(excursion_date, id);
+    CREATE VIEW bookings_all AS
+        SELECT id, user_id, username, school_name, class_number, class_profile,
+               excursion_date, excursion_time, contact_person, contact_phone,
+               participants_count, booking_date
+        FROM bookings
+        UNION ALL
+        SELECT id, user_id, username, school_name, class_number, class_profile,
+               excursion_date, excursion_time, contact_person, contact_phone,
+               participants_count, booking_date
+        FROM bookings_archive;
+'''
+
+# Таблица броней еще в старом формате
+LEGACY_CHECK = "SELECT 1 FROM pragma_table_info('bookings') WHERE name = 'excursion_time' AND type = 'TEXT'"
+# Колонка ключа школы есть (миграция 4 началась): бот пишет ключ сам
+SCHOOL_KEY_CHECK = "SELECT 1 FROM pragma_table_info('bookings') WHERE name = 'school_key'"
+
+# RESERVE без перевода даты и времени (значения передаются как есть)
+LEGACY_RESERVE = '''
+    INSERT INTO bookings (
+        user_id, username, school_name, class_number, class_profile,
+        excursion_date, excursion_time, contact_person,
+        contact_phone, participants_count
+    )
+    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    WHERE (SELECT COUNT(*) FROM bookings WHERE excursion_date = ?) < ?
+'''
+
+# Доля самых старых броней, которые лежат в архиве
+ARCHIVED_SHARE = 0.1
+
+
+def legacy_rows(size, seed):
+    for row in generate_rows(size, seed):
+        row = list(row)
+        row[5], row[6] = from_day(row[5]).isoformat(), from_minute(row[6])
+        yield row
+
+
+def build_legacy_database(path, size, seed):
+    """База старого формата с size записями (если такой еще нет)"""
+    if os.path.exists(path):
+        return
+    print(f"Генерация {size} записей старого формата в {path}...")
+    started = time.perf_counter()
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.executescript(LEGACY_SCHEMA)
+        conn.execute('BEGIN')
+        conn.executemany('''
+            INSERT INTO bookings (user_id, username, school_name, class_number, class_profile,
+                                  excursion_date, excursion_time, contact_person, contact_phone,
+                                  participants_count, booking_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', legacy_rows(size, seed))
+        archived = int(size * ARCHIVED_SHARE)
+        conn.execute('''
+            INSERT INTO bookings_archive (id, user_id, username, school_name, class_number, class_profile,
+                                          excursion_date, excursion_time, contact_person, contact_phone,
+                                          participants_count, booking_date)
+            SELECT id, user_id, username, school_name, class_number, class_profile,
+                   excursion_date, excursion_time, contact_person, contact_phone,
+                   participants_count, booking_date
+            FROM bookings WHERE id <= ?
+        ''', (archived,))
+        conn.execute('DELETE FROM bookings WHERE id <= ?', (archived,))
+        conn.execute('COMMIT')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    print(f"  готово за {time.perf_counter() - started:.1f} с")
+
+
+class Writer(threading.Thread):
+    """
+    Бот во время миграции: бронирует уникальные даты далеко в будущем и
+    иногда отменяет брони. Пока таблица старая, пишет как старый бот
+    (дату и время текстом), после переключения — целыми, а с появлением
+    колонки school_key — как новый бот (queries.RESERVE с ключом).
+    """
+
+    def __init__(self, db_path, interval, seed):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.interval = interval
+        self.rng = random.Random(seed)
+        self.stop = threading.Event()
+        self.latencies = []
+        self.errors = 0
+        self.inserted = {}
+        self.deleted = set()
+
+    def reserve(self, conn, date_str):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute(SCHOOL_KEY_CHECK).fetchone() is not None:
+                cursor = conn.execute(queries.RESERVE, queries.reserve_params({
+                    'user_id': 1, 'username': 'bench', 'school_name': 'Школа', 'class_number': '10А',
+                    'class_profile': 'нет', 'excursion_date': date_str, 'excursion_time': '9:30',
+                    'contact_person': 'Иванов', 'contact_phone': '+79000000000', 'participants_count': 20,
+                }, 1))
+            else:
+                legacy = conn.execute(LEGACY_CHECK).fetchone() is not None
+                date_value, time_value = (date_str, '9:30') if legacy else (to_day(date_str), to_minute('9:30'))
+                cursor = conn.execute(LEGACY_RESERVE, (
+                    1, 'bench', 'Школа', '10А', 'нет', date_value, time_value,
+                    'Иванов', '+79000000000', 20, date_value, 1))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if cursor.rowcount:
+            self.inserted[cursor.lastrowid] = date_str
+
+    def run(self):
+        conn = connect(self.db_path)
+        max_id = conn.execute('SELECT MAX(id) FROM bookings').fetchone()[0]
+        day = datetime.date(2300, 1, 1)
+        try:
+            while not self.stop.is_set():
+                day += datetime.timedelta(days=1)
+                date_str = day.isoformat()
+                started = time.perf_counter()
+                try:
+                    if self.rng.random() < 0.2:
+                        booking_id = self.rng.randint(1, max_id)
+                        if conn.execute('DELETE FROM bookings WHERE id = ?', (booking_id,)).rowcount:
+                            self.deleted.add(booking_id)
+                    else:
+                        self.reserve(conn, date_str)
+                except sqlite3.OperationalError:
+                    self.errors += 1
+                self.latencies.append(time.perf_counter() - started)
+                time.sleep(self.interval)
+        finally:
+            conn.close()
+
+
+def percentile(values, p):
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def check(db_path, total_before, writer):
+    """Проверки после миграции; возвращает список проблем"""
+    problems = []
+    conn = connect(db_path)
+    try:
+        if conn.execute('PRAGMA user_version').fetchone()[0] != LATEST_VERSION:
+            problems.append('user_version')
+        total = conn.execute('SELECT COUNT(*) FROM bookings_all').fetchone()[0]
+        expected = total_before + len(writer.inserted) - len(writer.deleted)
+        if total != expected:
+            problems.append(f'строк {total}, ожидалось {expected}')
+        text_values = conn.execute('''
+            SELECT COUNT(*) FROM bookings_all
+            WHERE typeof(excursion_date) <> 'integer' OR typeof(excursion_time) <> 'integer'
+        ''').fetchone()[0]
+        if text_values:
+            problems.append(f'не переведено строк: {text_values}')
+        select = 'SELECT excursion_date, excursion_time FROM bookings WHERE id = ?'
+        wrong = [booking_id for booking_id, date_str in writer.inserted.items()
+                 if conn.execute(select, (booking_id,)).fetchone() != (to_day(date_str), to_minute('9:30'))]
+        if wrong:
+            problems.append(f'новые брони не перенесены: {len(wrong)}')
+        returned = [booking_id for booking_id in writer.deleted if conn.execute(select, (booking_id,)).fetchone()]
+        if returned:
+            problems.append(f'отмененные брони вернулись: {len(returned)}')
+        # Ключ школы есть и у броней, которые писатель добавил старым RESERVE
+        without_key = conn.execute('SELECT COUNT(*) FROM bookings WHERE school_key IS NULL').fetchone()[0]
+        if without_key:
+            problems.append(f'без ключа школы: {without_key}')
+        if conn.execute('PRAGMA quick_check').fetchone()[0] != 'ok':
+            problems.append('quick_check')
+        try:
+            # Индекс поиска совпадает с таблицей, включая брони, созданные во время заполнения
+            conn.execute("INSERT INTO bookings_fts(bookings_fts) VALUES ('integrity-check')")
+        except sqlite3.DatabaseError:
+            problems.append('индекс поиска')
+    finally:
+        conn.close()
+    return problems
+
+
+def run(source, batch_size, interval, seed):
+    with tempfile.TemporaryDirectory(prefix='migration-check-') as workdir:
+        db_path = os.path.join(workdir, 'excursions.db')
+        shutil.copyfile(source, db_path)
+        conn = connect(db_path)
+        total_before = conn.execute('SELECT COUNT(*) FROM bookings_all').fetchone()[0]
+
+        writer = Writer(db_path, interval, seed)
+        writer.start()
+        time.sleep(0.5)
+        started = time.perf_counter()
+        try:
+            # 0 — вся таблица одной пачкой (одной транзакцией)
+            migrations.migrate(conn, batch_size or total_before + 1)
+        finally:
+            elapsed = time.perf_counter() - started
+            writer.stop.set()
+            writer.join()
+            conn.close()
+
+        values = sorted(writer.latencies)
+        problems = check(db_path, total_before, writer)
+        label = 'одна транзакция' if not batch_size else f'пачки по {batch_size}'
+        print(f"{label:<20} {elapsed:>9.1f} {len(values):>8} {percentile(values, 50) * 1000:>9.2f} "
+              f"{percentile(values, 99) * 1000:>9.2f} {(values[-1] if values else 0) * 1000:>9.1f} "
+              f"{writer.errors:>7}  {'; '.join(problems) or 'ok'}")
+        return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Миграция схемы на большой базе под нагрузкой')
+    parser.add_argument('--size', type=int, default=1000000, help='Записей в базе')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора данных')
+    parser.add_argument('--batch-sizes', default='0,2000', help='Строк в пачке через запятую (0 — одна транзакция)')
+    parser.add_argument('--interval', type=float, default=0.005, help='Пауза между записями бота, с')
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'), help='Каталог для баз')
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    source = os.path.join(args.data_dir, f'legacy-{args.size}-{args.seed}.db')
+    build_legacy_database(source, args.size, args.seed)
+
+    print(f"\n{'Режим':<20} {'Время, с':>9} {'Записей':>8} {'p50, мс':>9} {'p99, мс':>9} "
+          f"{'Макс, мс':>9} {'Ошибок':>7}  Проверка")
+    ok = True
+    for batch_size in (int(value) for value in args.batch_sizes.split(',')):
+        ok = run(source, batch_size, args.interval, args.seed) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Воспроизведение записанных обновлений (recorder.py) на обработчиках бота.
+
+Обновления из сжатого JSONL подаются в Application из bot.py через
+process_update() — последовательно, как при обычной работе бота. Запросы
+к Bot API уходят в локальную замену (fake_bot_api.py), записи — во
+временную базу (по желанию — копию снимка через --db).
+
+Пример:
+    RECORD_UPDATES_PATH=updates.jsonl.gz python bot.py    # запись
+    python bench/replay.py updates.jsonl.gz --speed 10     # в 10 раз быстрее
+    python bench/replay.py updates.jsonl.gz --speed 0 --output before.json   # без пауз
+
+Выводит время по обработчикам и методам Database, задержку обработки
+обновлений и отставание от расписания записи.
+"""
+import argparse
+import asyncio
+import collections
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+from fake_bot_api import FakeBotApi
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Timings:
+    """Подменяет гистограмму metrics: сохраняет все замеры по значению метки"""
+
+    def __init__(self):
+        self.values = collections.defaultdict(list)
+
+    def observe(self, value, **labels):
+        self.values[next(iter(labels.values()), '')].append(value)
+
+
+def percentile(values, p):
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def load_capture(path, limit=0):
+    """Читает записи; незавершенный хвост файла (аварийная остановка) пропускается"""
+    records = []
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                records.append(json.loads(line))
+                if limit and len(records) >= limit:
+                    break
+    except (EOFError, zlib.error, gzip.BadGzipFile, json.JSONDecodeError) as e:
+        print(f"Запись оборвана после {len(records)} обновлений ({e}), воспроизводим прочитанное")
+    records.sort(key=lambda record: record['time'])
+    return records
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': (values[-1] if values else 0) * 1000,
+        'total_s': sum(values),
+    }
+
+
+def print_table(title, rows):
+    print(f"\n{title:<32} {'Вызовов':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'Макс, мс':>9} {'Всего, с':>9}")
+    for name, data in sorted(rows.items(), key=lambda item: -item[1]['total_s']):
+        print(f"{name:<32} {data['count']:>8} {data['p50_ms']:>9.2f} {data['p95_ms']:>9.2f} "
+              f"{data['p99_ms']:>9.2f} {data['max_ms']:>9.2f} {data['total_s']:>9.2f}")
+
+
+async def replay(records, speed, port):
+    api = FakeBotApi(keep_replies=False)
+    await api.start('127.0.0.1', port)
+
+    # Импорт после настройки окружения: config и database читают его при импорте
+    import bot
+    import metrics
+    from telegram import Update
+
+    handler_timings = Timings()
+    db_timings = Timings()
+    metrics.HANDLER_LATENCY = handler_timings
+    metrics.DB_LATENCY = db_timings
+
+    await bot.db.init_db()
+    application = bot.build_application()
+    await application.initialize()
+
+    update_latencies = []
+    max_lag = 0.0
+    first_time = records[0]['time']
+    started = time.perf_counter()
+    try:
+        for record in records:
+            if speed:
+                due = started + (record['time'] - first_time) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+
+            update = Update.de_json(record['update'], application.bot)
+            update_started = time.perf_counter()
+            await application.process_update(update)
+            update_latencies.append(time.perf_counter() - update_started)
+        elapsed = time.perf_counter() - started
+    finally:
+        await application.shutdown()
+        await bot.db.close()
+        api.close()
+
+    return {
+        'updates': len(records),
+        'elapsed_s': elapsed,
+        'updates_per_s': len(records) / elapsed if elapsed else 0.0,
+        'max_schedule_lag_ms': max_lag * 1000,
+        'update': summarize(update_latencies),
+        'handlers': {name: summarize(values) for name, values in handler_timings.values.items()},
+        'db': {name: summarize(values) for name, values in db_timings.values.items()},
+        'bot_api_calls': dict(api.calls),
+    }
+
+
+def prepare_workdir(workdir, records, seed_db, port, slots_per_day):
+    """Временная база, список админов из записи и окружение для bot.py"""
+    db_path = os.path.join(workdir, 'excursions.db')
+    if seed_db:
+        shutil.copyfile(seed_db, db_path)
+
+    admins = sorted({str(record['update']['message']['from']['id'])
+                     for record in records
+                     if record.get('admin') and record['update'].get('message', {}).get('from')})
+    with open(os.path.join(workdir, 'admins.json'), 'w', encoding='utf-8') as f:
+        json.dump(admins, f)
+
+    os.environ.setdefault('BOT_TOKEN', '123456:replay')
+    os.environ.update(
+        TELEGRAM_API_URL=f'http://127.0.0.1:{port}',
+        EXCURSIONS_DB_PATH=db_path,
+        LOG_FILE=os.path.join(workdir, 'bot.log'),
+        LOG_LEVEL=os.environ.get('LOG_LEVEL', 'ERROR'),
+        METRICS_PORT='0',
+        RECORD_UPDATES_PATH='',
+        # Время сжато (--speed), ведра токенов сработали бы не так, как при записи
+        FLOOD_RATE='0',
+    )
+    # Вместимость должна совпадать с ботом, который писал трафик
+    if slots_per_day:
+        os.environ['EXCURSIONS_SLOTS_PER_DAY'] = str(slots_per_day)
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение записанных обновлений')
+    parser.add_argument('capture', help='Файл записи (.jsonl.gz)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Множитель скорости: 1 — как в записи, 10 — в 10 раз быстрее, 0 — без пауз')
+    parser.add_argument('--db', default='', help='Снимок базы, с которого начать (копируется)')
+    parser.add_argument('--slots-per-day', type=int, default=0,
+                        help='Мест в день (по умолчанию EXCURSIONS_SLOTS_PER_DAY из окружения)')
+    parser.add_argument('--limit', type=int, default=0, help='Воспроизвести только первые N обновлений')
+    parser.add_argument('--port', type=int, default=8082, help='Порт фейкового Bot API')
+    parser.add_argument('--output', default='', help='Сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    capture = os.path.abspath(args.capture)
+    seed_db = os.path.abspath(args.db) if args.db else ''
+    output = os.path.abspath(args.output) if args.output else ''
+
+    records = load_capture(capture, args.limit)
+    if not records:
+        sys.exit('В записи нет обновлений')
+
+    with tempfile.TemporaryDirectory(prefix='bot-replay-') as workdir:
+        prepare_workdir(workdir, records, seed_db, args.port, args.slots_per_day)
+        result = asyncio.run(replay(records, args.speed, args.port))
+        os.chdir(REPO_DIR)
+
+    update = result['update']
+    print(f"Обновлений: {result['updates']} за {result['elapsed_s']:.1f} с "
+          f"({result['updates_per_s']:.1f}/с), скорость x{args.speed or 'max'}")
+    print(f"Обработка обновления: p50 {update['p50_ms']:.2f} мс, p99 {update['p99_ms']:.2f} мс, "
+          f"макс {update['max_ms']:.2f} мс; отставание от записи до {result['max_schedule_lag_ms']:.0f} мс")
+    print_table('Обработчик', result['handlers'])
+    print_table('Метод Database', result['db'])
+    print(f"\nВызовы Bot API: {result['bot_api_calls']}")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Подсказки названия школы: построение справочника и время подсказки.
+
+Генерирует справочник на --schools школ (названия как в db_bench.py, у
+части школ по несколько написаний) или читает таблицу schools готовой
+базы (--db, недостающие миграции применяются), строит SchoolIndex и
+замеряет подсказки для типичных вводов: начало одного слова, вид школы и
+номер («лиц 15»), полное название, несколько частых слов, промах.
+
+Пример:
+    python bench/school_bench.py --schools 50000
+    python bench/school_bench.py --db bench/data/bookings-1000000-42.db
+"""
+import argparse
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from booking import connect, init_schema  # noqa: E402
+from booking.schools import SCHOOLS_SINCE, SchoolIndex, school_key  # noqa: E402
+from db_bench import SCHOOL_KINDS, STREETS  # noqa: E402
+
+SUGGESTIONS = 5
+
+
+def generate_rows(count, seed):
+    """Строки таблицы schools: (id, название, броней); часть школ записана по-разному"""
+    rng = random.Random(seed)
+    rows = []
+    for school in range(1, count + 1):
+        name = (f'{SCHOOL_KINDS[school % len(SCHOOL_KINDS)]} №{school}, '
+                f'{STREETS[school % len(STREETS)]}, д. {school % 150 + 1}')
+        rows.append((len(rows) + 1, name, int(rng.paretovariate(1.2))))
+        if school % 4 == 0:
+            rows.append((len(rows) + 1, name.lower().replace('№', '№ '), 1))
+    return rows
+
+
+def read_rows(db_path):
+    conn = connect(db_path)
+    try:
+        init_schema(conn)
+        return conn.execute(SCHOOLS_SINCE, (0, '[]')).fetchall()
+    finally:
+        conn.close()
+
+
+def queries(rows, count, seed):
+    """Вводы пользователя по видам"""
+    rng = random.Random(seed)
+    names = [name for _, name, _ in rows]
+
+    def word_prefix():
+        words = school_key(rng.choice(names)).split()
+        word = rng.choice([word for word in words if len(word) >= 3] or words)
+        return word[:rng.randint(3, max(3, len(word)))]
+
+    def kind_and_number():
+        words = school_key(rng.choice(names)).split()
+        number = next((word for word in words if word.isdigit()), words[-1])
+        return f'{words[1][:3] if len(words) > 1 else words[0]} {number[:rng.randint(1, len(number))]}'
+
+    return {
+        'начало слова': [word_prefix() for _ in range(count)],
+        'вид и номер': [kind_and_number() for _ in range(count)],
+        'полное название': [rng.choice(names) for _ in range(count)],
+        'частые слова': [rng.choice(['гбоу шк', 'школа ул', 'гбоу лицей д', 'шко про 1']) for _ in range(count)],
+        'промах': [f'zz{index}' for index in range(count)],
+    }
+
+
+def timed_us(function, inputs):
+    # Сборщик мусора выключен, как в timeit: его паузы — не время подсказки
+    times = []
+    gc.disable()
+    try:
+        for text in inputs:
+            started = time.perf_counter()
+            function(text)
+            times.append((time.perf_counter() - started) * 1e6)
+    finally:
+        gc.enable()
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99) - 1], times[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Подсказки названия школы')
+    parser.add_argument('--schools', type=int, default=50000, help='Школ в справочнике')
+    parser.add_argument('--db', default='', help='Взять справочник из базы вместо генерации')
+    parser.add_argument('--queries', type=int, default=2000, help='Подсказок каждого вида')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = read_rows(args.db) if args.db else generate_rows(args.schools, args.seed)
+    read_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = SchoolIndex.from_rows(rows)
+    build_time = time.perf_counter() - started
+    # Память — отдельным построением: под tracemalloc оно в разы медленнее
+    tracemalloc.start()
+    copy = SchoolIndex.from_rows(rows)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del copy
+
+    print(f"Названий {len(rows)}, школ {len(index)}: чтение {read_time:.2f} с, "
+          f"построение {build_time:.2f} с, память {memory / 1024 / 1024:.1f} МиБ")
+    print(f"\n{'Ввод':<18} {'Медиана, мкс':>13} {'p99, мкс':>10} {'Макс, мкс':>10}")
+    for kind, inputs in queries(rows, args.queries, args.seed).items():
+        median, p99, worst = timed_us(lambda text: index.suggest(text, SUGGESTIONS), inputs)
+        print(f"{kind:<18} {median:>13.1f} {p99:>10.1f} {worst:>10.1f}")
+    median, p99, worst = timed_us(index.canonical, [name for _, name, _ in rows[:args.queries]])
+    print(f"{'canonical':<18} {median:>13.1f} {p99:>10.1f} {worst:>10.1f}")
+
+    # Новая школа после брони: счетчики в узлах всех начал ее слов
+    started = time.perf_counter()
+    for number in range(args.queries):
+        index.update(f'Новая школа №{number}, ул. Тестовая, д. 1', 1, 0)
+    print(f"\nДобавление школы: {(time.perf_counter() - started) / args.queries * 1e6:.1f} мкс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Проверка бюджета времени запуска бота.
+
+Несколько раз запускает bot.py во временном каталоге против локальной
+замены Bot API (fake_bot_api.py). Сообщение /start кладется в очередь
+сразу после старта процесса, поэтому замеряется полное время от запуска
+до первого ответа пользователю: импорты, post_init, первый getUpdates
+и обработка обновления.
+
+Пример:
+    python bench/startup_check.py --runs 5 --budget 3
+
+Код выхода 1, если самый долгий запуск превышает бюджет.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+
+from bot_load import USER_ID_BASE, spawn_bot
+from fake_bot_api import FakeBotApi
+
+
+async def measure_once(host, port):
+    """Секунды от запуска процесса до первого ответа на /start"""
+    api = FakeBotApi()
+    await api.start(host, port)
+    with tempfile.TemporaryDirectory(prefix='bot-startup-') as workdir:
+        started = time.perf_counter()
+        bot_process = spawn_bot(workdir, f'http://{host}:{port}', admins=1, slots_per_day=100)
+        try:
+            api.push_message(USER_ID_BASE, '/start')
+            await api.next_reply(USER_ID_BASE, timeout=60)
+            return time.perf_counter() - started
+        finally:
+            bot_process.terminate()
+            bot_process.wait()
+            api.close()
+
+
+async def main_async(args):
+    timings = []
+    for run in range(1, args.runs + 1):
+        elapsed = await measure_once(args.host, args.port)
+        timings.append(elapsed)
+        print(f"Запуск {run}: первый ответ через {elapsed:.3f} с")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Время от запуска бота до первого ответа')
+    parser.add_argument('--runs', type=int, default=5, help='Количество запусков')
+    parser.add_argument('--budget', type=float, default=3.0, help='Бюджет, секунды')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8083, help='Порт фейкового Bot API')
+    args = parser.parse_args()
+
+    timings = asyncio.run(main_async(args))
+    median, worst = statistics.median(timings), max(timings)
+    print(f"\nМедиана {median:.3f} с, максимум {worst:.3f} с, бюджет {args.budget:.1f} с")
+    if worst > args.budget:
+        print("Бюджет запуска превышен")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
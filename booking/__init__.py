@@ -0,0 +1,43 @@
+"""
+Общий сервис бронирований для бота и сайта.
+
+Одна схема (с версиями и миграциями), одни настройки подключения,
+один кеш доступности, атомарное бронирование, массовый импорт и архив
+прошедших экскурсий. Бот работает через AsyncBookingService, сайт —
+через BookingService.
+"""
+from .aio import AsyncBookingService
+from .archive import archive_past, archive_past_async
+from .bulk import insert_bookings, insert_bookings_async
+from .cache import AvailabilityCache
+from .connection import ConnectionPool, connect, connect_async
+from .dates import from_day, from_minute, to_day, to_minute
+from .migrations import LATEST_VERSION, init_schema, init_schema_async, migrate_database
+from .service import BookingService
+from .settings import DB_PATH, SLOTS_PER_DAY
+from .snapshot import ReadSnapshot, read_snapshot
+
+__all__ = [
+    'AsyncBookingService',
+    'AvailabilityCache',
+    'BookingService',
+    'ConnectionPool',
+    'DB_PATH',
+    'LATEST_VERSION',
+    'ReadSnapshot',
+    'SLOTS_PER_DAY',
+    'archive_past',
+    'archive_past_async',
+    'connect',
+    'connect_async',
+    'from_day',
+    'from_minute',
+    'init_schema',
+    'init_schema_async',
+    'insert_bookings',
+    'insert_bookings_async',
+    'migrate_database',
+    'read_snapshot',
+    'to_day',
+    'to_minute',
+]
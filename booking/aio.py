@@ -0,0 +1,163 @@
+"""Асинхронный сервис бронирований (для Telegram-бота)"""
+import asyncio
+import contextlib
+import copy
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+import aiosqlite
+
+from . import queries
+from .archive import archive_past_async
+from .bulk import insert_bookings_async
+from .cache import AvailabilityCache
+from .connection import connect_async
+from .migrations import init_schema_async
+from .settings import DB_PATH, SLOTS_PER_DAY
+from .snapshot import read_snapshot_async
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBookingService:
+    """
+    То же, что BookingService, но на одном долгоживущем aiosqlite-подключении.
+    Подключение работает в режиме автокоммита; операции из нескольких
+    операторов выполняются под write_lock.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, capacity: int = SLOTS_PER_DAY):
+        self.db_path = db_path
+        self.capacity = capacity
+        self.cache = AvailabilityCache()
+        self.write_lock = asyncio.Lock()
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._data_version: Optional[int] = None
+        self._connect_lock = asyncio.Lock()
+        # Отдельное подключение для отчетов (см. snapshot)
+        self._reader: Optional[aiosqlite.Connection] = None
+        self._reader_lock = asyncio.Lock()
+        # Время снимка у копии, которую отдает snapshot(); у самого сервиса — None
+        self.taken_at = None
+
+    async def connection(self) -> aiosqlite.Connection:
+        """Общее подключение (открывается при первом обращении)"""
+        if self._conn is None:
+            async with self._connect_lock:
+                if self._conn is None:
+                    self._conn = await connect_async(self.db_path)
+        return self._conn
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+        if self._reader is not None:
+            await self._reader.close()
+            self._reader = None
+
+    @contextlib.asynccontextmanager
+    async def snapshot(self) -> AsyncIterator['AsyncBookingService']:
+        """
+        Согласованный снимок для тяжелых отчетов: копия сервиса, методы
+        которой читают через отдельное подключение в одной транзакции чтения.
+        Запросы бронирования на общем подключении отчет не ждут.
+        Время снимка — в taken_at. Отчеты выполняются по одному.
+        """
+        async with self._reader_lock:
+            if self._reader is None:
+                self._reader = await connect_async(self.db_path)
+            async with read_snapshot_async(self._reader) as taken_at:
+                view = copy.copy(self)
+                view._conn = self._reader
+                # Данные снимка не должны попасть в общий кеш доступности
+                view.cache = AvailabilityCache()
+                view.taken_at = taken_at
+                yield view
+
+    async def init_db(self) -> None:
+        """Создает таблицы и индексы, применяет недостающие миграции (в отдельном потоке)"""
+        await init_schema_async(self.db_path)
+        logger.info("База данных инициализирована")
+
+    async def warm_up(self) -> None:
+        """
+        Прогрев перед приемом запросов: заполняет кеш доступности и
+        компилирует RESERVE в кеш подготовленных запросов подключения.
+        С вместимостью 0 условие вставки ложно, и строка не добавляется.
+        """
+        await self.counts_by_date()
+        conn = await self.connection()
+        probe = dict.fromkeys(queries.RESERVE_FIELDS, '')
+        probe.update(excursion_date=0, excursion_time=0)
+        await conn.execute(queries.RESERVE, queries.reserve_params(probe, 0))
+
+    async def recent_bookings(self, minutes: int = 10) -> int:
+        """Сколько броней создано за последние minutes минут"""
+        conn = await self.connection()
+        cursor = await conn.execute(queries.RECENT_BOOKINGS, (f'-{int(minutes)} minutes',))
+        return (await cursor.fetchone())[0]
+
+    async def archive_past(self, keep_days: int = 0) -> int:
+        """Переносит прошедшие брони в архив (на отдельном подключении)"""
+        return await archive_past_async(self.db_path, keep_days)
+
+    async def import_bookings(self, bookings: Sequence[dict]) -> List[Optional[str]]:
+        """
+        Добавляет брони одной транзакцией (в отдельном потоке, см. booking/bulk.py).
+        Для каждой брони возвращает None (добавлена) или причину отказа
+        """
+        try:
+            return await insert_bookings_async(bookings, self.db_path, self.capacity)
+        finally:
+            self.cache.invalidate()
+
+    async def _check_external_writes(self, conn: aiosqlite.Connection) -> None:
+        """Сбрасывает кеш, если в базу писал кто-то еще (например, сайт)"""
+        cursor = await conn.execute('PRAGMA data_version')
+        version = (await cursor.fetchone())[0]
+        if version != self._data_version:
+            self._data_version = version
+            self.cache.invalidate()
+
+    async def counts_by_date(self) -> Dict[str, int]:
+        """Количество броней по будущим датам (из кеша, если он актуален)"""
+        conn = await self.connection()
+        await self._check_external_writes(conn)
+
+        counts = self.cache.get()
+        if counts is None:
+            generation = self.cache.generation
+            cursor = await conn.execute(queries.COUNTS_BY_DATE)
+            counts = queries.date_counts(await cursor.fetchall())
+            self.cache.set(counts, generation)
+        return counts
+
+    async def available_slots(self, date_str: str) -> int:
+        """Сколько мест осталось на дату"""
+        counts = await self.counts_by_date()
+        return max(0, self.capacity - counts.get(date_str, 0))
+
+    async def is_date_available(self, date_str: str) -> bool:
+        """Проверяет, есть ли на дату свободные места"""
+        return await self.available_slots(date_str) > 0
+
+    async def reserve(self, **booking) -> bool:
+        """
+        Бронирует место на дату.
+        Возвращает False, если мест нет или это время на дату уже занято.
+        """
+        conn = await self.connection()
+        try:
+            cursor = await conn.execute(queries.RESERVE, queries.reserve_params(booking, self.capacity))
+        except aiosqlite.IntegrityError:
+            logger.warning("Попытка добавить дублирующую бронь на %s %s", booking['excursion_date'], booking['excursion_time'])
+            return False
+        finally:
+            self.cache.invalidate()
+
+        if cursor.rowcount == 0:
+            return False
+
+        logger.info("Добавлена новая бронь от пользователя %s на %s %s", booking['username'], booking['excursion_date'], booking['excursion_time'])
+        return True
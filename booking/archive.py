@@ -0,0 +1,77 @@
+"""
+Перенос прошедших экскурсий в архив.
+
+Все запросы бота и сайта работают с будущими датами, поэтому прошедшие
+брони переезжают из bookings в bookings_archive (тот же файл базы), а
+статистика и выгрузки по всей истории читают представление bookings_all.
+
+Перенос идет пачками: каждая пачка — отдельная короткая транзакция на
+собственном подключении, так что бронирования ждут не дольше одной пачки.
+"""
+import asyncio
+import logging
+
+from . import queries
+from .connection import connect, connect_async
+from .settings import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Строк в одной транзакции переноса
+ARCHIVE_BATCH_SIZE = 500
+
+
+def archive_past(db_path: str = DB_PATH, keep_days: int = 0, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Переносит прошедшие брони в архив; возвращает число перенесенных строк.
+    Архивируются даты раньше сегодняшней минус keep_days.
+    """
+    keep_days = int(keep_days)
+    conn = connect(db_path)
+    moved = 0
+    try:
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                copied = conn.execute(queries.ARCHIVE_COPY, (keep_days, batch_size)).rowcount
+                conn.execute(queries.ARCHIVE_DELETE, (keep_days, batch_size))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            moved += copied
+            if copied < batch_size:
+                break
+    finally:
+        conn.close()
+    if moved:
+        logger.info("В архив перенесено броней: %s", moved)
+    return moved
+
+
+async def archive_past_async(db_path: str = DB_PATH, keep_days: int = 0,
+                             batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """То же на aiosqlite; между пачками цикл событий обслуживает другие задачи"""
+    keep_days = int(keep_days)
+    conn = await connect_async(db_path)
+    moved = 0
+    try:
+        while True:
+            await conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = await conn.execute(queries.ARCHIVE_COPY, (keep_days, batch_size))
+                copied = cursor.rowcount
+                await conn.execute(queries.ARCHIVE_DELETE, (keep_days, batch_size))
+                await conn.execute('COMMIT')
+            except Exception:
+                await conn.execute('ROLLBACK')
+                raise
+            moved += copied
+            if copied < batch_size:
+                break
+            await asyncio.sleep(0)
+    finally:
+        await conn.close()
+    if moved:
+        logger.info("В архив перенесено броней: %s", moved)
+    return moved
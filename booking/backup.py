@@ -0,0 +1,227 @@
+"""
+Резервные копии базы через SQLite backup API.
+
+Копия снимается с работающей базы по несколько страниц за шаг, между
+шагами блокировка отпускается, и бронирования продолжают записываться.
+Готовая копия проверяется (PRAGMA integrity_check), сжимается gzip и
+сохраняется вместе с SHA-256 несжатого файла; старые копии удаляются.
+
+Восстановление (бот лучше остановить):
+    python -m booking.backup list backups/
+    python -m booking.backup verify backups/excursions-20260101-033000.db.gz
+    python -m booking.backup restore backups/excursions-20260101-033000.db.gz
+"""
+import argparse
+import datetime
+import glob
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import List, Optional
+
+from .connection import connect
+from .settings import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Страниц за шаг и пауза между шагами (с): при 4 КБ на страницу — 256 КБ за шаг
+PAGES_PER_STEP = 64
+STEP_SLEEP = 0.005
+# Сколько копий хранить
+KEEP_BACKUPS = 14
+# Сколько раз пошаговое копирование может начаться заново из-за записи
+# в базу, прежде чем копия будет снята за один шаг
+MAX_RESTARTS = 3
+
+SNAPSHOT_SUFFIX = '.db.gz'
+CHECKSUM_SUFFIX = '.sha256'
+
+
+class BackupError(Exception):
+    """Копия повреждена или не прошла проверку"""
+
+
+class _Restarted(Exception):
+    """Пошаговое копирование начиналось заново слишком часто"""
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_integrity(path: str) -> None:
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    finally:
+        conn.close()
+    if result != 'ok':
+        raise BackupError(f"integrity_check: {result}")
+
+
+def list_backups(backup_dir: str) -> List[str]:
+    """Копии в каталоге, от новых к старым"""
+    paths = glob.glob(os.path.join(backup_dir, '*' + SNAPSHOT_SUFFIX))
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def _copy(db_path: str, raw_path: str, pages: int, progress) -> None:
+    source = connect(db_path)
+    destination = sqlite3.connect(raw_path)
+    try:
+        source.backup(destination, pages=pages, progress=progress)
+    finally:
+        destination.close()
+        source.close()
+
+
+def backup(db_path: str = DB_PATH, backup_dir: str = 'backups', pages: int = PAGES_PER_STEP,
+           sleep: float = STEP_SLEEP, keep: int = KEEP_BACKUPS) -> str:
+    """
+    Снимает копию базы и возвращает путь к сжатому файлу.
+    Блокирующая функция: в боте вызывается через asyncio.to_thread.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    target = os.path.join(backup_dir, f'{name}-{stamp}{SNAPSHOT_SUFFIX}')
+
+    fd, raw_path = tempfile.mkstemp(suffix='.db', dir=backup_dir)
+    os.close(fd)
+    try:
+        stats = {'steps': 0, 'restarts': 0, 'remaining': None}
+
+        def progress(status, remaining, total):
+            # Запись в базу через другое подключение начинает копирование заново
+            if stats['remaining'] is not None and remaining > stats['remaining']:
+                stats['restarts'] += 1
+                if stats['restarts'] > MAX_RESTARTS:
+                    raise _Restarted
+            stats['remaining'] = remaining
+            stats['steps'] += 1
+            # sqlite3 сам ждет только при SQLITE_BUSY, пауза между успешными
+            # шагами — здесь: в это время источник не заблокирован
+            if remaining:
+                time.sleep(sleep)
+
+        try:
+            _copy(db_path, raw_path, pages, progress)
+        except _Restarted:
+            # Запись идет постоянно. В режиме WAL чтение не мешает писателям,
+            # поэтому копия снимается одним шагом (одна транзакция чтения)
+            logger.info("Копирование начиналось заново %s раз, снимаем за один шаг", MAX_RESTARTS)
+            _copy(db_path, raw_path, -1, None)
+
+        _check_integrity(raw_path)
+        checksum = _sha256(raw_path)
+        with open(raw_path, 'rb') as src, gzip.open(target + '.tmp', 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(target + '.tmp', target)
+        with open(target + CHECKSUM_SUFFIX, 'w', encoding='ascii') as f:
+            f.write(checksum + '\n')
+    finally:
+        os.remove(raw_path)
+
+    logger.info("Резервная копия %s (%s шагов, %s перезапусков, %s байт)",
+                target, stats['steps'], stats['restarts'], os.path.getsize(target))
+    prune(backup_dir, keep)
+    return target
+
+
+def prune(backup_dir: str, keep: int = KEEP_BACKUPS) -> None:
+    """Удаляет копии сверх keep самых новых"""
+    for path in list_backups(backup_dir)[keep:]:
+        for stale in (path, path + CHECKSUM_SUFFIX):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+
+def _unpack(snapshot: str, directory: Optional[str] = None) -> str:
+    """Распаковывает копию во временный файл и проверяет ее; возвращает путь"""
+    fd, raw_path = tempfile.mkstemp(suffix='.db', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as dst, gzip.open(snapshot, 'rb') as src:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        checksum_path = snapshot + CHECKSUM_SUFFIX
+        if os.path.exists(checksum_path):
+            with open(checksum_path, encoding='ascii') as f:
+                expected = f.read().strip()
+            if _sha256(raw_path) != expected:
+                raise BackupError("контрольная сумма не совпадает")
+        _check_integrity(raw_path)
+    except (OSError, EOFError, sqlite3.DatabaseError) as e:
+        os.remove(raw_path)
+        raise BackupError(str(e)) from e
+    except BackupError:
+        os.remove(raw_path)
+        raise
+    return raw_path
+
+
+def verify(snapshot: str) -> None:
+    """Проверяет копию; BackupError, если она повреждена"""
+    os.remove(_unpack(snapshot))
+
+
+def restore(snapshot: str, db_path: str = DB_PATH) -> None:
+    """
+    Восстанавливает базу из копии. Копия сначала проверяется, затем
+    записывается в базу через backup API, так что открытые подключения
+    (если бот не остановлен) увидят восстановленные данные.
+    """
+    raw_path = _unpack(snapshot, os.path.dirname(os.path.abspath(db_path)))
+    try:
+        source = sqlite3.connect(raw_path)
+        destination = connect(db_path)
+        try:
+            source.backup(destination)
+        finally:
+            destination.close()
+            source.close()
+    finally:
+        os.remove(raw_path)
+    logger.info("База %s восстановлена из %s", db_path, snapshot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Резервные копии базы бронирований')
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help='Снять копию')
+    create.add_argument('backup_dir', nargs='?', default='backups')
+    show = commands.add_parser('list', help='Список копий')
+    show.add_argument('backup_dir', nargs='?', default='backups')
+    check = commands.add_parser('verify', help='Проверить копию')
+    check.add_argument('snapshot')
+    back = commands.add_parser('restore', help='Восстановить базу из копии')
+    back.add_argument('snapshot')
+    parser.add_argument('--db', default=DB_PATH, help='Файл базы')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    try:
+        if args.command == 'create':
+            print(backup(args.db, args.backup_dir))
+        elif args.command == 'list':
+            for path in list_backups(args.backup_dir):
+                stamp = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+                print(f"{stamp:%d.%m.%Y %H:%M}  {os.path.getsize(path):>12}  {path}")
+        elif args.command == 'verify':
+            verify(args.snapshot)
+            print("Копия в порядке")
+        else:
+            restore(args.snapshot, args.db)
+    except BackupError as e:
+        raise SystemExit(f"Копия повреждена: {e}")
+
+
+if __name__ == '__main__':
+    main()
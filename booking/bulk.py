@@ -0,0 +1,77 @@
+"""
+Массовое добавление броней (импорт расписаний из файла).
+
+Все брони вставляются одним executemany в одной транзакции BEGIN IMMEDIATE.
+Места проверяются под той же блокировкой записи, по тем же правилам, что
+и в RESERVE: не больше capacity броней на дату и одно время на дату один
+раз. Брони, которые не проходят проверку, не вставляются; для каждой из
+них возвращается причина, остальные добавляются.
+"""
+import asyncio
+import json
+import logging
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from . import queries
+from .connection import connect
+from .dates import from_minute
+from .settings import DB_PATH, SLOTS_PER_DAY
+
+logger = logging.getLogger(__name__)
+
+_DATE_AT = queries.RESERVE_FIELDS.index('excursion_date')
+_TIME_AT = queries.RESERVE_FIELDS.index('excursion_time')
+
+
+def _conflicts(params: Sequence[tuple], booked: Sequence[Tuple[int, int]], capacity: int) -> List[Optional[str]]:
+    """Причина отказа для каждой брони (None — место есть) с учетом броней выше в том же списке"""
+    counts: Dict[int, int] = {}
+    for day, _ in booked:
+        counts[day] = counts.get(day, 0) + 1
+    taken: Set[Tuple[int, int]] = set(booked)
+    added: Set[Tuple[int, int]] = set()
+    reasons: List[Optional[str]] = []
+    for row in params:
+        slot = (row[_DATE_AT], row[_TIME_AT])
+        if slot in taken:
+            reasons.append(f"время {from_minute(slot[1])} на эту дату уже занято"
+                           + (" бронью выше в списке" if slot in added else ""))
+        elif counts.get(slot[0], 0) >= capacity:
+            reasons.append("на эту дату мест нет")
+        else:
+            reasons.append(None)
+            counts[slot[0]] = counts.get(slot[0], 0) + 1
+            taken.add(slot)
+            added.add(slot)
+    return reasons
+
+
+def insert_bookings(bookings: Sequence[dict], db_path: str = DB_PATH,
+                    capacity: int = SLOTS_PER_DAY) -> List[Optional[str]]:
+    """
+    Добавляет брони (словари с полями RESERVE_FIELDS) одной транзакцией.
+    Возвращает для каждой брони None (добавлена) или причину отказа.
+    """
+    params = [queries.insert_params(booking) for booking in bookings]
+    days: Set[int] = {row[_DATE_AT] for row in params}
+    conn = connect(db_path)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            booked = conn.execute(queries.SLOTS_FOR_DAYS, (json.dumps(sorted(days)),)).fetchall()
+            reasons = _conflicts(params, booked, capacity)
+            conn.executemany(queries.INSERT, (row for row, reason in zip(params, reasons) if reason is None))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+    logger.info("Импорт броней: добавлено %s из %s", reasons.count(None), len(params))
+    return reasons
+
+
+async def insert_bookings_async(bookings: Sequence[dict], db_path: str = DB_PATH,
+                                capacity: int = SLOTS_PER_DAY) -> List[Optional[str]]:
+    """То же в отдельном потоке: цикл событий бота не ждет транзакцию"""
+    return await asyncio.to_thread(insert_bookings, bookings, db_path, capacity)
@@ -0,0 +1,38 @@
+"""Кеш количества броней по датам"""
+import threading
+from typing import Dict, Optional
+
+
+class AvailabilityCache:
+    """
+    Хранит количество броней по будущим датам.
+    Сбрасывается при собственной записи и при обнаружении чужой записи
+    (по PRAGMA data_version), поэтому проверки доступности не ходят в базу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Optional[Dict[str, int]] = None
+        # Номер поколения растет при каждом сбросе: данные, прочитанные
+        # до сброса, уже нельзя класть в кеш
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self) -> Optional[Dict[str, int]]:
+        """Текущие данные или None, если кеш пуст"""
+        with self._lock:
+            return self._counts
+
+    def set(self, counts: Dict[str, int], generation: int) -> None:
+        """Сохраняет данные, если с момента начала чтения не было сброса"""
+        with self._lock:
+            if generation == self._generation:
+                self._counts = counts
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._counts = None
@@ -0,0 +1,67 @@
+"""Подключения к базе данных с общими настройками"""
+import os
+import sqlite3
+import threading
+
+import aiosqlite
+
+from .settings import BUSY_TIMEOUT_MS, DB_PATH
+
+# Настройки, которые применяются к каждому подключению
+CONNECTION_PRAGMAS = (
+    f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}',
+    # В режиме WAL синхронизации NORMAL достаточно для сохранности данных
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA foreign_keys = ON',
+)
+
+
+def connect(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """
+    Открывает sqlite3-подключение в режиме автокоммита.
+    Одиночные операторы фиксируются сразу, транзакции из нескольких
+    операторов открываются явно через BEGIN.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                           isolation_level=None, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+async def connect_async(db_path: str = DB_PATH) -> aiosqlite.Connection:
+    """Открывает aiosqlite-подключение с теми же настройками"""
+    conn = await aiosqlite.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    for pragma in CONNECTION_PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Одно долгоживущее подключение на поток.
+    После fork (воркеры gunicorn) подключения открываются заново.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = connect(self.db_path)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.data_version = None
+        return conn
+
+    def data_version_changed(self, conn: sqlite3.Connection) -> bool:
+        """
+        Проверяет, писал ли кто-то в базу через другие подключения
+        с момента прошлой проверки на этом подключении.
+        """
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        changed = version != self._local.data_version
+        self._local.data_version = version
+        return changed
@@ -0,0 +1,60 @@
+"""
+Хранение даты и времени экскурсии целыми числами.
+
+Дата — номер дня от 1970-01-01 (как unixepoch / 86400), время — минуты
+от полуночи. Ключи индексов получаются в 2-3 байта вместо 10 и 5 байт
+текста, сравнения — целочисленные. В базу значения переводятся при
+записи и в условиях запросов, обратно — в row_factory при чтении: бот и
+сайт получают datetime.date и строку 'ЧЧ:ММ' и ничего не разбирают сами.
+"""
+import datetime
+from typing import Union
+
+EPOCH = datetime.date(1970, 1, 1)
+_EPOCH_ORDINAL = EPOCH.toordinal()
+
+# Сегодняшний номер дня (UTC, как прежнее date('now')) — для подстановки в SQL
+TODAY_SQL = "(CAST(strftime('%s', 'now') AS INTEGER) / 86400)"
+
+DateLike = Union[datetime.date, str, int]
+TimeLike = Union[datetime.time, str, int]
+
+
+def to_day(value: DateLike) -> int:
+    """Номер дня из datetime.date или строки 'ГГГГ-ММ-ДД' (число возвращается как есть)"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value)
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+def from_day(day: int) -> datetime.date:
+    return datetime.date.fromordinal(day + _EPOCH_ORDINAL)
+
+
+def to_minute(value: TimeLike) -> int:
+    """Минуты от полуночи из datetime.time или строки 'ЧЧ:ММ' (число возвращается как есть)"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        hours, minutes = value.split(':')
+        return int(hours) * 60 + int(minutes)
+    return value.hour * 60 + value.minute
+
+
+def from_minute(minute: int) -> str:
+    return f'{minute // 60:02d}:{minute % 60:02d}'
+
+
+def row_factory(cursor, row) -> dict:
+    """
+    row_factory для sqlite3: строка — словарь по именам колонок,
+    дата и время экскурсии уже переведены в datetime.date и 'ЧЧ:ММ'
+    """
+    record = {column[0]: value for column, value in zip(cursor.description, row)}
+    if record.get('excursion_date') is not None:
+        record['excursion_date'] = from_day(record['excursion_date'])
+    if record.get('excursion_time') is not None:
+        record['excursion_time'] = from_minute(record['excursion_time'])
+    return record
@@ -0,0 +1,69 @@
+"""
+Обслуживание файла базы: статистика планировщика, возврат свободных
+страниц и усечение WAL.
+
+Операции выполняются на отдельном подключении, как и перенос в архив.
+Расписание и проверка нагрузки — в scheduler.py бота.
+"""
+import logging
+
+from .connection import connect_async
+from .settings import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк индекса просматривает ANALYZE внутри PRAGMA optimize
+ANALYSIS_LIMIT = 1000
+# Сколько свободных страниц возвращать системе за один запуск
+VACUUM_PAGES = 2000
+
+# Режимы PRAGMA auto_vacuum
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+async def optimize(db_path: str = DB_PATH) -> None:
+    """PRAGMA optimize: пересчитывает статистику (ANALYZE) только там, где она устарела"""
+    conn = await connect_async(db_path)
+    try:
+        await conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+        await conn.execute('PRAGMA optimize')
+    finally:
+        await conn.close()
+
+
+async def incremental_vacuum(db_path: str = DB_PATH, pages: int = VACUUM_PAGES) -> int:
+    """
+    Возвращает системе до pages свободных страниц; результат — сколько
+    свободных страниц было. База, созданная без auto_vacuum, один раз
+    переводится в режим INCREMENTAL полным VACUUM (поэтому только в тихие часы).
+    """
+    conn = await connect_async(db_path)
+    try:
+        cursor = await conn.execute('PRAGMA auto_vacuum')
+        mode = (await cursor.fetchone())[0]
+        cursor = await conn.execute('PRAGMA freelist_count')
+        free_pages = (await cursor.fetchone())[0]
+        if mode != AUTO_VACUUM_INCREMENTAL:
+            logger.info("Перевод базы в режим auto_vacuum = INCREMENTAL (полный VACUUM)")
+            await conn.execute(f'PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}')
+            await conn.execute('VACUUM')
+        elif free_pages:
+            cursor = await conn.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+            await cursor.fetchall()
+        return free_pages
+    finally:
+        await conn.close()
+
+
+async def checkpoint(db_path: str = DB_PATH) -> tuple:
+    """
+    Переносит WAL в основной файл и усекает его до нуля.
+    Возвращает (busy, страниц в WAL, перенесено страниц); busy=1 — помешали читатели.
+    """
+    conn = await connect_async(db_path)
+    try:
+        cursor = await conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return tuple(await cursor.fetchone())
+    finally:
+        await conn.close()
+
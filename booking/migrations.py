@@ -0,0 +1,442 @@
+"""
+Версии схемы базы и их применение.
+
+Номер версии хранится в PRAGMA user_version. Миграции применяются по
+порядку, каждый шаг — в своей короткой транзакции BEGIN IMMEDIATE.
+Большие таблицы перестраиваются без остановки бота: новая таблица
+заполняется пачками по диапазонам id, изменения, которые тем временем
+вносят бот и сайт, переносятся в нее триггерами, а в конце таблицы
+меняются местами. Блокировка записи держится не дольше одной пачки.
+Прерванная миграция продолжается при следующем запуске.
+
+Миграции выполняются при init_db бота и сайта; большую базу удобнее
+обновить заранее, не останавливая бота:
+    python -m booking.migrations status
+    python -m booking.migrations migrate
+"""
+import argparse
+import asyncio
+import contextlib
+import logging
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from .connection import connect
+from .schema import (
+    ARCHIVE_TABLE, BOOKING_COLUMNS, BOOKINGS_ALL_VIEW, BOOKINGS_FTS_TABLE, BOOKINGS_FTS_TRIGGER_NAMES,
+    BOOKINGS_TABLE, INDEXES, SCHOOLS_TABLE, SCHOOLS_TRIGGER_NAME, SEARCH_COLUMNS, bookings_fts_triggers,
+    index_sql, schools_trigger,
+)
+from .schools import school_key
+from .settings import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Строк в одной транзакции дозаполнения и пауза между пачками (с):
+# в паузу блокировку записи успевают взять бот и сайт
+BATCH_SIZE = 2000
+BATCH_PAUSE = 0.01
+# Как часто писать в лог прогресс дозаполнения (пачек)
+PROGRESS_EVERY = 100
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[['Migrator'], None]
+
+
+class Migrator:
+    """Шаги миграций на sqlite3-подключении в режиме автокоммита (блокирующий код)"""
+
+    def __init__(self, conn: sqlite3.Connection, batch_size: int = BATCH_SIZE, pause: float = BATCH_PAUSE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pause = pause
+
+    @property
+    def version(self) -> int:
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    @contextlib.contextmanager
+    def transaction(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.conn
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def execute_all(self, statements: Iterable[str]) -> None:
+        """Операторы одной транзакцией"""
+        with self.transaction() as conn:
+            for statement in statements:
+                conn.execute(statement)
+
+    def exists(self, name: str) -> bool:
+        return self.conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (name,)).fetchone() is not None
+
+    def column_type(self, table: str, column: str) -> Optional[str]:
+        row = self.conn.execute('SELECT type FROM pragma_table_info(?) WHERE name = ?', (table, column)).fetchone()
+        return row[0].upper() if row else None
+
+    def backfill(self, table: str, statements: Sequence[str], still_needed: Callable[[], bool]) -> int:
+        """
+        Выполняет statements по диапазонам id таблицы table, по batch_size
+        строк за транзакцию; параметры операторов — (после id, до id включительно).
+        still_needed() проверяется под блокировкой перед каждой пачкой: если
+        работу уже закончил другой процесс, дозаполнение прекращается.
+        Возвращает число обработанных строк.
+        """
+        after = self.conn.execute(f'SELECT MIN(id) - 1 FROM {table}').fetchone()[0]
+        done = batches = 0
+        while after is not None:
+            upto, count = self.conn.execute(
+                f'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)',
+                (after, self.batch_size)).fetchone()
+            if not count:
+                break
+            with self.transaction() as conn:
+                if not still_needed():
+                    break
+                for statement in statements:
+                    conn.execute(statement, (after, upto))
+            after = upto
+            done += count
+            batches += 1
+            if batches % PROGRESS_EVERY == 0:
+                logger.info("%s: обработано %s строк", table, done)
+            time.sleep(self.pause)
+        return done
+
+    def rebuild(self, table: str, create_sql: str, columns: Sequence[str],
+                convert: Dict[str, str], needed: Callable[[], bool]) -> None:
+        """
+        Перестраивает таблицу (тип колонки в SQLite иначе не поменять).
+        create_sql — CREATE TABLE с {name}; convert — выражения для
+        изменяемых колонок с {row} на месте префикса строки (NEW. в триггерах).
+        needed() — нужна ли еще перестройка (проверяется под блокировкой).
+        """
+        new = f'{table}_new'
+        names = ', '.join(columns)
+
+        def values(row: str) -> str:
+            return ', '.join(convert[column].format(row=row) if column in convert else row + column
+                             for column in columns)
+
+        with self.transaction() as conn:
+            if not needed():
+                return
+            conn.execute(create_sql.format(name=new))
+            # Индексы переходят к новой таблице под теми же именами; до конца
+            # перестройки живой таблице хватает автоиндексов (UNIQUE и id)
+            old_indexes = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                (table,)).fetchall()
+            for (name,) in old_indexes:
+                conn.execute(f'DROP INDEX {name}')
+            for name, index_table, index_columns in INDEXES:
+                if index_table == table:
+                    conn.execute(index_sql(name, new, index_columns))
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_mirror_insert AFTER INSERT ON {table} BEGIN
+                    DELETE FROM {new} WHERE id = NEW.id;
+                    INSERT INTO {new} ({names}) VALUES ({values('NEW.')});
+                END''')
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_mirror_update AFTER UPDATE ON {table} BEGIN
+                    DELETE FROM {new} WHERE id = OLD.id;
+                    INSERT INTO {new} ({names}) VALUES ({values('NEW.')});
+                END''')
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_mirror_delete AFTER DELETE ON {table} BEGIN
+                    DELETE FROM {new} WHERE id = OLD.id;
+                END''')
+
+        copied = self.backfill(table, (
+            f'DELETE FROM {new} WHERE id > ? AND id <= ?',
+            f'INSERT INTO {new} ({names}) SELECT {values("")} FROM {table} WHERE id > ? AND id <= ?',
+        ), lambda: self.exists(new))
+
+        with self.transaction() as conn:
+            if not self.exists(new):
+                return
+            for event in ('insert', 'update', 'delete'):
+                conn.execute(f'DROP TRIGGER IF EXISTS {table}_mirror_{event}')
+            # Представления пересоздаются: переименование проверяет их ссылки
+            views = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view'").fetchall()
+            for name, _ in views:
+                conn.execute(f'DROP VIEW {name}')
+            # Счетчик AUTOINCREMENT переносится, чтобы id из архива не выдавались снова
+            conn.execute('DELETE FROM sqlite_sequence WHERE name = ?', (new,))
+            conn.execute('INSERT INTO sqlite_sequence (name, seq) SELECT ?, seq FROM sqlite_sequence WHERE name = ?',
+                         (new, table))
+            conn.execute(f'DROP TABLE {table}')
+            conn.execute(f'ALTER TABLE {new} RENAME TO {table}')
+            for _, sql in views:
+                conn.execute(sql)
+        logger.info("Таблица %s перестроена, скопировано строк: %s", table, copied)
+
+
+# ==================== МИГРАЦИИ ====================
+
+def _index_statements(m: Migrator) -> List[str]:
+    """
+    CREATE INDEX для INDEXES, кроме индексов по колонкам, которых в таблице
+    еще нет: их создаст миграция, которая добавляет колонку
+    """
+    return [index_sql(name, table, columns) for name, table, columns in INDEXES
+            if all(m.column_type(table, column.split()[0]) is not None for column in columns.split(','))]
+
+
+# Дата 'ГГГГ-ММ-ДД' и время 'ЧЧ:ММ' текстом -> номер дня и минуты.
+# Уже целые значения (запись новым кодом во время перестройки) не меняются
+_DATE_CONVERSIONS = {
+    'excursion_date': ("CASE WHEN typeof({row}excursion_date) = 'integer' THEN {row}excursion_date"
+                       " ELSE CAST(strftime('%s', {row}excursion_date) AS INTEGER) / 86400 END"),
+    'excursion_time': ("CASE WHEN instr({row}excursion_time, ':') > 0"
+                       " THEN CAST(substr({row}excursion_time, 1, instr({row}excursion_time, ':') - 1) AS INTEGER) * 60"
+                       " + CAST(substr({row}excursion_time, instr({row}excursion_time, ':') + 1) AS INTEGER)"
+                       " ELSE CAST({row}excursion_time AS INTEGER) END"),
+}
+
+
+def _integer_dates(m: Migrator) -> None:
+    """Таблицы броней и архива с целыми датой и временем (новая база — сразу)"""
+    m.execute_all((BOOKINGS_TABLE.format(name='bookings'), ARCHIVE_TABLE.format(name='bookings_archive')))
+    for table, create_sql, columns in (
+            ('bookings', BOOKINGS_TABLE, BOOKING_COLUMNS),
+            ('bookings_archive', ARCHIVE_TABLE, BOOKING_COLUMNS + ('archived_at',))):
+        m.rebuild(table, create_sql, columns, _DATE_CONVERSIONS,
+                  lambda table=table: m.column_type(table, 'excursion_time') != 'INTEGER')
+    m.execute_all(_index_statements(m) + [BOOKINGS_ALL_VIEW])
+
+
+# Пока bookings_fts заполняется, в индексе строки с id до done и новые строки
+# (после last, максимального id на момент создания индекса)
+_FTS_INDEXED = ('{row}.id <= (SELECT done FROM bookings_fts_fill)'
+                ' OR {row}.id > (SELECT last FROM bookings_fts_fill)')
+
+_FTS_FILL = f'''
+    INSERT INTO bookings_fts (rowid, {', '.join(SEARCH_COLUMNS)})
+    SELECT id, {', '.join(SEARCH_COLUMNS)} FROM bookings
+    WHERE id > ? AND id <= ?
+      AND id > (SELECT done FROM bookings_fts_fill) AND id <= (SELECT last FROM bookings_fts_fill)
+'''
+
+
+def _search_index(m: Migrator) -> None:
+    """
+    Полнотекстовый индекс броней. Триггеры включаются сразу, существующие
+    строки попадают в индекс пачками; прогресс — в таблице bookings_fts_fill
+    """
+    with m.transaction() as conn:
+        if not m.exists('bookings_fts'):
+            conn.execute(BOOKINGS_FTS_TABLE)
+            conn.execute('CREATE TABLE bookings_fts_fill (done INTEGER NOT NULL, last INTEGER NOT NULL)')
+            conn.execute('INSERT INTO bookings_fts_fill SELECT 0, COALESCE(MAX(id), 0) FROM bookings')
+            for trigger in bookings_fts_triggers(_FTS_INDEXED):
+                conn.execute(trigger)
+    if not m.exists('bookings_fts_fill'):
+        return
+
+    filled = m.backfill('bookings', (_FTS_FILL, 'UPDATE bookings_fts_fill SET done = ?2'),
+                        lambda: m.exists('bookings_fts_fill'))
+    with m.transaction() as conn:
+        if not m.exists('bookings_fts_fill'):
+            return
+        # Индекс заполнен: триггеры без условия
+        for name in BOOKINGS_FTS_TRIGGER_NAMES:
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        for trigger in bookings_fts_triggers():
+            conn.execute(trigger)
+        conn.execute('DROP TABLE bookings_fts_fill')
+    logger.info("Поисковый индекс заполнен, строк: %s", filled)
+
+
+# Пока справочник школ заполняется, триггер считает только брони после last
+# (максимального id на момент создания справочника); остальные — дозаполнение
+_SCHOOLS_FILL = '''
+    INSERT INTO schools (name, bookings)
+    SELECT school_name, COUNT(*) FROM {table}
+    WHERE id > ?1 AND id <= ?2
+      AND id > (SELECT {table}_done FROM schools_fill) AND id <= (SELECT last FROM schools_fill)
+    GROUP BY school_name
+    ON CONFLICT (name) DO UPDATE SET bookings = bookings + excluded.bookings
+'''
+
+
+# Бронь, которую архивация переносит во время заполнения: проход по архиву
+# ее id уже миновал, а проход по bookings ее больше не увидит
+_SCHOOLS_FILL_ARCHIVE_TRIGGER = '''
+    CREATE TRIGGER schools_fill_archive AFTER INSERT ON bookings_archive
+    WHEN NEW.id <= (SELECT bookings_archive_done FROM schools_fill)
+     AND NEW.id > (SELECT bookings_done FROM schools_fill)
+    BEGIN
+        INSERT INTO schools (name, bookings) VALUES (NEW.school_name, 1)
+        ON CONFLICT (name) DO UPDATE SET bookings = bookings + 1;
+    END'''
+
+
+def _school_directory(m: Migrator) -> None:
+    """
+    Справочник школ из всех прошлых броней и индекс архива по пользователю.
+    Архив заполняется раньше действующих броней, прогресс — в таблице
+    schools_fill. Бронь, которую архивация переносит во время заполнения,
+    считается один раз: с id дальше прохода по архиву ее посчитает этот
+    проход, уже посчитанную проходом по bookings — никто, остальные —
+    триггер schools_fill_archive. Брони после last считает триггер справочника
+    """
+    with m.transaction() as conn:
+        if not m.exists('schools'):
+            conn.execute(SCHOOLS_TABLE)
+            conn.execute('''
+                CREATE TABLE schools_fill (
+                    last INTEGER NOT NULL, bookings_archive_done INTEGER NOT NULL, bookings_done INTEGER NOT NULL
+                )''')
+            conn.execute('INSERT INTO schools_fill SELECT COALESCE(MAX(id), 0), 0, 0 FROM bookings_all')
+            conn.execute(schools_trigger('NEW.id > (SELECT last FROM schools_fill)'))
+            conn.execute(_SCHOOLS_FILL_ARCHIVE_TRIGGER)
+            for statement in _index_statements(m):
+                conn.execute(statement)
+    if not m.exists('schools_fill'):
+        return
+
+    for table in ('bookings_archive', 'bookings'):
+        fill = _SCHOOLS_FILL.format(table=table)
+        m.backfill(table, (fill, f'UPDATE schools_fill SET {table}_done = ?2'), lambda: m.exists('schools_fill'))
+        with m.transaction() as conn:
+            if not m.exists('schools_fill'):
+                return
+            # Строки, появившиеся после последней пачки, и отметка, что таблица
+            # пройдена до last, — под одной блокировкой записи
+            last = conn.execute('SELECT last FROM schools_fill').fetchone()[0]
+            conn.execute(fill, (0, last))
+            conn.execute(f'UPDATE schools_fill SET {table}_done = last')
+    with m.transaction() as conn:
+        if not m.exists('schools_fill'):
+            return
+        conn.execute(f'DROP TRIGGER IF EXISTS {SCHOOLS_TRIGGER_NAME}')
+        conn.execute(schools_trigger())
+        conn.execute('DROP TRIGGER IF EXISTS schools_fill_archive')
+        conn.execute('DROP TABLE schools_fill')
+    count = m.conn.execute('SELECT COUNT(*) FROM schools').fetchone()[0]
+    logger.info("Справочник школ заполнен, названий: %s", count)
+
+
+# Ключ вычисляет функция Python school_key, она есть только у подключения миграции
+_SCHOOL_KEY_FILL = '''
+    UPDATE bookings SET school_key = school_key(school_name)
+    WHERE id > ? AND id <= ? AND school_key IS NULL
+'''
+
+
+def _school_keys(m: Migrator) -> None:
+    """
+    Ключ названия школы для фильтра админ-панели сайта. Новые брони бот и
+    сайт записывают уже с ключом, старые дозаполняются пачками. Индекс по
+    ключу создается сразу: по нему находятся брони без ключа, в том числе
+    добавленные во время миграции процессом со старым кодом
+    """
+    with m.transaction() as conn:
+        if m.column_type('bookings', 'school_key') is None:
+            conn.execute('ALTER TABLE bookings ADD COLUMN school_key TEXT')
+        conn.execute('DROP INDEX IF EXISTS idx_bookings_school')
+        for statement in _index_statements(m):
+            conn.execute(statement)
+    m.conn.create_function('school_key', 1, school_key, deterministic=True)
+
+    def without_key() -> bool:
+        return m.conn.execute('SELECT 1 FROM bookings WHERE school_key IS NULL LIMIT 1').fetchone() is not None
+
+    checked = m.backfill('bookings', (_SCHOOL_KEY_FILL,), without_key)
+    with m.transaction() as conn:
+        # Брони без ключа, добавленные после последней пачки
+        conn.execute('UPDATE bookings SET school_key = school_key(school_name) WHERE school_key IS NULL')
+    logger.info("Ключи названий школ заполнены, проверено строк: %s", checked)
+
+
+MIGRATIONS = (
+    Migration(1, 'целые дата и время экскурсии, архив прошедших броней', _integer_dates),
+    Migration(2, 'полнотекстовый поиск броней (FTS5)', _search_index),
+    Migration(3, 'справочник школ для подсказок названия', _school_directory),
+    Migration(4, 'ключ названия школы для фильтра админ-панели', _school_keys),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def pending(conn: sqlite3.Connection) -> List[Migration]:
+    """Миграции, которые еще не применены"""
+    version = Migrator(conn).version
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+def migrate(conn: sqlite3.Connection, batch_size: int = BATCH_SIZE, pause: float = BATCH_PAUSE) -> List[int]:
+    """Применяет недостающие миграции по порядку; возвращает их номера"""
+    migrator = Migrator(conn, batch_size, pause)
+    if migrator.version > LATEST_VERSION:
+        logger.warning("Версия схемы базы %s новее, чем знает код (%s)", migrator.version, LATEST_VERSION)
+    applied = []
+    for migration in pending(conn):
+        started = time.perf_counter()
+        logger.info("Миграция схемы %s: %s", migration.version, migration.description)
+        migration.apply(migrator)
+        with migrator.transaction() as c:
+            # Другой процесс (бот или сайт) мог успеть раньше
+            if migrator.version < migration.version:
+                c.execute(f'PRAGMA user_version = {migration.version}')
+        logger.info("Миграция схемы %s применена за %.1f с", migration.version, time.perf_counter() - started)
+        applied.append(migration.version)
+    return applied
+
+
+def init_schema(conn: sqlite3.Connection) -> List[int]:
+    """Создает или обновляет схему (sqlite3-подключение в режиме автокоммита)"""
+    # Новые базы сразу создаются с инкрементальной очисткой (до первой таблицы)
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    # WAL позволяет читателям не блокировать запись (режим сохраняется в файле БД)
+    conn.execute('PRAGMA journal_mode = WAL')
+    return migrate(conn)
+
+
+def migrate_database(db_path: str = DB_PATH) -> List[int]:
+    """init_schema на отдельном подключении"""
+    conn = connect(db_path)
+    try:
+        return init_schema(conn)
+    finally:
+        conn.close()
+
+
+async def init_schema_async(db_path: str = DB_PATH) -> List[int]:
+    """То же для бота: в отдельном потоке, цикл событий продолжает обслуживать обновления"""
+    return await asyncio.to_thread(migrate_database, db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Миграции схемы базы бронирований')
+    parser.add_argument('command', choices=('status', 'migrate'))
+    parser.add_argument('--db', default=DB_PATH, help='Файл базы')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Строк в одной транзакции')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    conn = connect(args.db)
+    try:
+        if args.command == 'status':
+            print(f"Версия схемы: {Migrator(conn).version} (последняя {LATEST_VERSION})")
+            for migration in pending(conn):
+                print(f"  не применена {migration.version}: {migration.description}")
+        else:
+            conn.execute('PRAGMA journal_mode = WAL')
+            applied = migrate(conn, args.batch_size)
+            print(f"Применено миграций: {len(applied)}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
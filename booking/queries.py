@@ -0,0 +1,103 @@
+"""
+SQL-запросы, общие для синхронного и асинхронного сервиса.
+Дата и время в параметрах и результатах — целые числа (booking/dates.py).
+"""
+from .dates import TODAY_SQL, from_day, to_day, to_minute
+from .schools import school_key
+
+# Количество броней по датам, начиная с сегодняшней
+COUNTS_BY_DATE = f'''
+    SELECT excursion_date, COUNT(*) FROM bookings
+    WHERE excursion_date >= {TODAY_SQL}
+    GROUP BY excursion_date
+'''
+
+# Количество броней на одну дату
+COUNT_FOR_DATE = 'SELECT COUNT(*) FROM bookings WHERE excursion_date = ?'
+
+# Атомарное бронирование: строка вставляется, только если на дату еще есть места.
+# Проверка и вставка — один оператор, поэтому между ними никто не вклинится
+RESERVE = '''
+    INSERT INTO bookings (
+        user_id, username, school_name, class_number, class_profile,
+        excursion_date, excursion_time, contact_person,
+        contact_phone, participants_count, school_key
+    )
+    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    WHERE (SELECT COUNT(*) FROM bookings WHERE excursion_date = ?) < ?
+'''
+
+# Вставка без проверки мест: массовый импорт проверяет места сам, под той же
+# блокировкой записи (booking/bulk.py)
+INSERT = '''
+    INSERT INTO bookings (
+        user_id, username, school_name, class_number, class_profile,
+        excursion_date, excursion_time, contact_person,
+        contact_phone, participants_count, school_key
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Занятые слоты на список дат (параметр — JSON-массив номеров дней)
+SLOTS_FOR_DAYS = '''
+    SELECT excursion_date, excursion_time FROM bookings
+    WHERE excursion_date IN (SELECT value FROM json_each(?))
+'''
+
+# Перенос пачки прошедших броней в архив. Оба оператора выбирают одни и те же
+# строки (одинаковые условие, порядок и LIMIT) и выполняются в одной транзакции.
+# Первый параметр — сколько дней до сегодняшнего еще не архивировать
+ARCHIVE_COPY = f'''
+    INSERT INTO bookings_archive (
+        id, user_id, username, school_name, class_number, class_profile,
+        excursion_date, excursion_time, contact_person, contact_phone,
+        participants_count, booking_date
+    )
+    SELECT id, user_id, username, school_name, class_number, class_profile,
+           excursion_date, excursion_time, contact_person, contact_phone,
+           participants_count, booking_date
+    FROM bookings
+    WHERE excursion_date < {TODAY_SQL} - ?
+    ORDER BY excursion_date, id
+    LIMIT ?
+'''
+
+ARCHIVE_DELETE = f'''
+    DELETE FROM bookings WHERE id IN (
+        SELECT id FROM bookings
+        WHERE excursion_date < {TODAY_SQL} - ?
+        ORDER BY excursion_date, id
+        LIMIT ?
+    )
+'''
+
+# Брони, созданные за последние N минут (признак наплыва бронирований)
+RECENT_BOOKINGS = "SELECT COUNT(*) FROM bookings WHERE booking_date >= datetime('now', ?)"
+
+RESERVE_FIELDS = (
+    'user_id', 'username', 'school_name', 'class_number', 'class_profile',
+    'excursion_date', 'excursion_time', 'contact_person',
+    'contact_phone', 'participants_count',
+)
+
+
+def date_counts(rows) -> dict:
+    """Результат COUNTS_BY_DATE в виде {'ГГГГ-ММ-ДД': количество} (ключи кеша доступности)"""
+    return {from_day(day).isoformat(): count for day, count in rows}
+
+
+def insert_params(booking: dict) -> tuple:
+    """
+    Параметры запроса INSERT из словаря с полями брони
+    (дата — 'ГГГГ-ММ-ДД' или datetime.date, время — 'ЧЧ:ММ');
+    последний — ключ названия школы
+    """
+    values = dict(booking, excursion_date=to_day(booking['excursion_date']),
+                  excursion_time=to_minute(booking['excursion_time']))
+    return tuple(values[field] for field in RESERVE_FIELDS) + (school_key(booking['school_name']),)
+
+
+def reserve_params(booking: dict, capacity: int) -> tuple:
+    """Параметры запроса RESERVE (поля — как в insert_params)"""
+    params = insert_params(booking)
+    return params + (params[RESERVE_FIELDS.index('excursion_date')], capacity)
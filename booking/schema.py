@@ -0,0 +1,152 @@
+"""
+Схема базы данных бронирований (последняя версия).
+
+Дата экскурсии хранится номером дня, время — минутами от полуночи
+(см. booking/dates.py). Создание и изменение схемы — booking/migrations.py.
+"""
+
+# Колонки брони в порядке таблицы (без school_key действующих броней и archived_at архива)
+BOOKING_COLUMNS = (
+    'id', 'user_id', 'username', 'school_name', 'class_number', 'class_profile',
+    'excursion_date', 'excursion_time', 'contact_person', 'contact_phone',
+    'participants_count', 'booking_date',
+)
+
+BOOKINGS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        username TEXT,
+        school_name TEXT NOT NULL,
+        class_number TEXT NOT NULL,
+        class_profile TEXT,
+        excursion_date INTEGER NOT NULL,  -- номер дня от 1970-01-01
+        excursion_time INTEGER NOT NULL,  -- минуты от полуночи
+        contact_person TEXT NOT NULL,
+        contact_phone TEXT NOT NULL,
+        participants_count INTEGER NOT NULL,
+        booking_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        school_key TEXT,  -- booking.schools.school_key(school_name), пишет код при вставке
+        UNIQUE(excursion_date, excursion_time)
+    )
+'''
+
+# Архив прошедших экскурсий (переносятся из bookings, см. booking/archive.py).
+# id сохраняются: AUTOINCREMENT в bookings не выдает их повторно
+ARCHIVE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        username TEXT,
+        school_name TEXT NOT NULL,
+        class_number TEXT NOT NULL,
+        class_profile TEXT,
+        excursion_date INTEGER NOT NULL,
+        excursion_time INTEGER NOT NULL,
+        contact_person TEXT NOT NULL,
+        contact_phone TEXT NOT NULL,
+        participants_count INTEGER NOT NULL,
+        booking_date TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Индексы: (имя, таблица, колонки). Каждый индекс хранит rowid (= id), поэтому
+# все запросы по дате (подсчет мест, занятое время, RESERVE) покрываются
+# автоиндексом UNIQUE (excursion_date, excursion_time) и не читают саму таблицу
+INDEXES = (
+    # Постраничный вывод в админ-панели сайта (keyset-пагинация)
+    ('idx_bookings_date_id', 'bookings', 'excursion_date, id'),
+    # Фильтр по названию школы: префикс ключа названия (COLLATE NOCASE
+    # не различает регистр только у латиницы)
+    ('idx_bookings_school_key', 'bookings', 'school_key, excursion_date, id'),
+    # Бронирования пользователя (/mybookings, отмена): сразу в нужном порядке
+    ('idx_bookings_user', 'bookings', 'user_id, excursion_date, excursion_time'),
+    ('idx_archive_date', 'bookings_archive', 'excursion_date, id'),
+    # Школы из прошлых броней пользователя (подсказка в начале диалога)
+    ('idx_archive_user', 'bookings_archive', 'user_id'),
+)
+
+
+def index_sql(name: str, table: str, columns: str) -> str:
+    return f'CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})'
+
+
+# Вся история: действующие брони и архив (статистика и выгрузки по запросу)
+BOOKINGS_ALL_VIEW = f'''
+    CREATE VIEW IF NOT EXISTS bookings_all AS
+        SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings
+        UNION ALL
+        SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings_archive
+'''
+
+
+# Полнотекстовый поиск броней (booking/search.py). Индекс внешнего содержания:
+# хранит только токены, строки читаются из bookings по rowid (= id).
+# unicode61 без диакритики не различает регистр и «ё»; префиксные индексы
+# на 2 и 3 символа ускоряют короткие запросы вида «ив*»
+SEARCH_COLUMNS = ('school_name', 'contact_person', 'class_profile', 'username')
+
+BOOKINGS_FTS_TABLE = f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts USING fts5(
+        {', '.join(SEARCH_COLUMNS)},
+        content='bookings', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+'''
+
+BOOKINGS_FTS_TRIGGER_NAMES = ('bookings_fts_insert', 'bookings_fts_delete', 'bookings_fts_update')
+
+
+def bookings_fts_triggers(only_indexed: str = '') -> tuple:
+    """
+    Триггеры, которые поддерживают bookings_fts в актуальном состоянии.
+    only_indexed — условие на id строки ({row} — NEW или OLD): триггеры
+    срабатывают только для строк, которые уже есть в индексе
+    (пока индекс заполняется миграцией)
+    """
+    def when(row):
+        return f'WHEN {only_indexed.format(row=row)}' if only_indexed else ''
+
+    def values(row):
+        return ', '.join(f'{row}.{column}' for column in SEARCH_COLUMNS)
+
+    columns = ', '.join(SEARCH_COLUMNS)
+    insert = f'INSERT INTO bookings_fts (rowid, {columns}) VALUES (NEW.id, {values("NEW")});'
+    delete = (f"INSERT INTO bookings_fts (bookings_fts, rowid, {columns}) "
+              f"VALUES ('delete', OLD.id, {values('OLD')});")
+    return (
+        f'CREATE TRIGGER bookings_fts_insert AFTER INSERT ON bookings {when("NEW")} BEGIN {insert} END',
+        f'CREATE TRIGGER bookings_fts_delete AFTER DELETE ON bookings {when("OLD")} BEGIN {delete} END',
+        f'CREATE TRIGGER bookings_fts_update AFTER UPDATE OF {columns} ON bookings {when("OLD")} '
+        f'BEGIN {delete} {insert} END',
+    )
+
+
+# Справочник школ из прошлых броней (подсказки названия в диалоге, booking/schools.py).
+# Одна строка на каждое написание названия и сколько раз его бронировали;
+# написания одной школы сводятся вместе в памяти. id не меняется при
+# обновлении счетчика: по нему бот дочитывает новые названия
+SCHOOLS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schools (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        bookings INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+SCHOOLS_TRIGGER_NAME = 'schools_count_booking'
+
+
+def schools_trigger(only_new: str = '') -> str:
+    """
+    Триггер, который добавляет в справочник каждую новую бронь (в том числе
+    с сайта и из импорта). only_new — условие на NEW.id, пока справочник
+    заполняется миграцией
+    """
+    when = f'WHEN {only_new}' if only_new else ''
+    return f'''
+        CREATE TRIGGER {SCHOOLS_TRIGGER_NAME} AFTER INSERT ON bookings {when} BEGIN
+            INSERT INTO schools (name, bookings) VALUES (NEW.school_name, 1)
+            ON CONFLICT (name) DO UPDATE SET bookings = bookings + 1;
+        END'''
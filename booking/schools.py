@@ -0,0 +1,257 @@
+"""
+Справочник школ для подсказок названия в диалоге бронирования.
+
+Названия берутся из прошлых броней (таблица schools, миграция 3) и
+сводятся по ключу: регистр, «ё» и знаки препинания не важны, поэтому
+«ГБОУ Школа № 15,» и «гбоу школа №15» — одна школа. Показывается самое
+частое написание, выше — школы, которые бронировали чаще.
+
+В памяти справочник — префиксное дерево по словам названий. В каждом
+узле хранятся лучшие школы, у которых есть слово с этим началом, так что
+подсказка по одному слову — проход по дереву на длину слова. Для
+нескольких слов выше идут школы, где все слова есть целиком («лицей 15» —
+Лицей №15 раньше Лицея №1501), затем по началу слов.
+"""
+import heapq
+import itertools
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Сколько лучших школ хранится в каждом узле дерева
+TOP_PER_PREFIX = 16
+# Больше школ подсказка по нескольким словам не перебирает по одной
+MAX_SCAN = 1000
+# Слово запроса, с которого начинается больше слов, проверяется по школам,
+# а не пересечением множеств
+MAX_SETS = 64
+
+# Новые названия после id (бот дочитывает справочник) и названия из списка
+# (JSON-массив): счетчики броней, сделанных самим ботом
+SCHOOLS_SINCE = '''
+    SELECT id, name, bookings FROM schools
+    WHERE id > ? OR name IN (SELECT value FROM json_each(?))
+    ORDER BY id
+'''
+
+_WORD = re.compile(r'\w+')
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall((text or '').casefold().replace('ё', 'е'))
+
+
+def school_key(name: str) -> str:
+    """Ключ названия: слова в нижнем регистре через пробел"""
+    return ' '.join(_words(name))
+
+
+class _Node:
+    __slots__ = ('children', 'top', 'schools', 'size')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        # Лучшие школы со словом, которое начинается так
+        self.top: List[int] = []
+        # Школы, где слово на этом узле кончается
+        self.schools: Optional[set] = None
+        # Сколько слов школ начинается так (оценка числа школ сверху)
+        self.size = 0
+
+
+class SchoolIndex:
+    """
+    Справочник в памяти. Школы нумеруются по порядку добавления (from_rows
+    добавляет их от частых к редким); изменяется только из цикла событий
+    бота, построение — from_rows в отдельном потоке
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._keys: Dict[str, int] = {}
+        self._names: List[str] = []
+        # Ключ с пробелом в начале: « слово» в нем — начало слова
+        self._texts: List[str] = []
+        self._counts: List[int] = []
+        self._spellings: List[Dict[str, int]] = []
+        # Последний прочитанный id таблицы schools
+        self.last_id = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, str, int]]) -> 'SchoolIndex':
+        """Строит справочник из строк (id, название, броней) таблицы schools"""
+        index = cls()
+        grouped: Dict[str, Dict[str, int]] = {}
+        for row_id, name, bookings in rows:
+            key = school_key(name)
+            if key:
+                grouped.setdefault(key, {})[name] = bookings
+            index.last_id = max(index.last_id, row_id)
+        for key in sorted(grouped, key=lambda key: -sum(grouped[key].values())):
+            school = index._add(key)
+            for name, bookings in grouped[key].items():
+                index._count(school, name, bookings)
+        index._fill_top(index._root)
+        return index
+
+    def _rank(self, school: int) -> Tuple[int, int]:
+        return -self._counts[school], school
+
+    def _add(self, key: str) -> int:
+        """Новая школа без счетчиков; слова названия — в дерево"""
+        school = len(self._names)
+        self._keys[key] = school
+        self._names.append(key)
+        self._texts.append(' ' + key)
+        self._counts.append(0)
+        self._spellings.append({})
+        for word in dict.fromkeys(key.split()):
+            node = self._root
+            for char in word:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                node = child
+                node.size += 1
+            if node.schools is None:
+                node.schools = set()
+            node.schools.add(school)
+        return school
+
+    def _count(self, school: int, name: str, bookings: int) -> None:
+        spellings = self._spellings[school]
+        self._counts[school] += bookings - spellings.get(name, 0)
+        spellings[name] = bookings
+        self._names[school] = max(spellings, key=spellings.get)
+
+    def _fill_top(self, node: _Node) -> None:
+        # При построении номер школы и есть ее место по числу броней
+        candidates = set(node.schools or ())
+        for child in node.children.values():
+            self._fill_top(child)
+            candidates.update(child.top)
+        node.top = heapq.nsmallest(TOP_PER_PREFIX, candidates)
+
+    def update(self, name: str, bookings: int, row_id: int = 0) -> None:
+        """Число броней написания name (строка таблицы schools)"""
+        key = school_key(name)
+        if not key:
+            return
+        school = self._keys.get(key)
+        if school is None:
+            school = self._add(key)
+        self._count(school, name, bookings)
+        self.last_id = max(self.last_id, row_id)
+
+        # Школа могла подняться в лучшие по каждому началу своих слов
+        rank = self._rank
+        for word in dict.fromkeys(key.split()):
+            node = self._root
+            for char in word:
+                node = node.children[char]
+                top = node.top
+                if school in top:
+                    top.sort(key=rank)
+                elif len(top) < TOP_PER_PREFIX or rank(school) < rank(top[-1]):
+                    top.append(school)
+                    top.sort(key=rank)
+                    del top[TOP_PER_PREFIX:]
+
+    def canonical(self, text: str) -> Optional[str]:
+        """Название из справочника, если text — та же школа в другом написании"""
+        school = self._keys.get(school_key(text))
+        return None if school is None else self._names[school]
+
+    def _find(self, prefix: str) -> Optional[_Node]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _whole_words(self, nodes: List[_Node], limit: int) -> List[int]:
+        """Лучшие школы, где есть все слова целиком"""
+        sets = [node.schools for node in nodes]
+        if not all(sets):
+            return []
+        smallest = min(sets, key=len)
+        if len(smallest) > MAX_SCAN:
+            return []
+        found = [school for school in smallest if all(school in other for other in sets)]
+        return heapq.nsmallest(limit, found, key=self._rank)
+
+    def _prefix_sets(self, node: _Node, limit: int) -> Optional[List[set]]:
+        """Множества школ для всех слов с началом node; None, если слов больше limit"""
+        sets, stack = [], [node]
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children.values())
+            if node.schools:
+                sets.append(node.schools)
+                if len(sets) > limit:
+                    return None
+        return sets
+
+    def _by_prefixes(self, words: List[str], nodes: List[_Node], limit: int) -> List[int]:
+        """Лучшие школы, где каждое слово запроса — начало какого-нибудь слова"""
+        prefixes = [' ' + word for word in words]
+        texts = self._texts
+
+        def matches(school):
+            return all(prefix in texts[school] for prefix in prefixes)
+
+        for node in nodes:
+            found = [school for school in node.top if matches(school)]
+            # Лучших в узле хватило или в узле вообще все школы с этим началом
+            if len(found) >= limit or len(node.top) < TOP_PER_PREFIX:
+                return found[:limit]
+
+        # Частые слова: подходящих школ много, они найдутся среди первых
+        # MAX_SCAN школ (почти по порядку числа броней)
+        total = len(texts)
+        share = 1.0
+        for node in nodes:
+            share *= min(1.0, node.size / total)
+        if share * MAX_SCAN >= 2 * limit:
+            found = list(itertools.islice(filter(matches, range(min(total, MAX_SCAN))), limit))
+            if len(found) == limit:
+                return sorted(found, key=self._rank)
+
+        # Редкие сочетания: все школы с самым редким началом, остальные слова —
+        # пересечением множеств (если слов с таким началом немного) или проверкой
+        narrow = min(nodes, key=lambda node: node.size)
+        sets = self._prefix_sets(narrow, total)
+        if sets is None:
+            # Разных слов с этим началом больше, чем школ: проверка каждой школы
+            prefix = prefixes[nodes.index(narrow)]
+            candidates = {school for school in range(total) if prefix in texts[school]}
+        else:
+            candidates = set().union(*sets)
+        for node, prefix in zip(nodes, prefixes):
+            if node is narrow:
+                continue
+            sets = self._prefix_sets(node, MAX_SETS)
+            if sets is None:
+                candidates = {school for school in candidates if prefix in texts[school]}
+            else:
+                candidates = set().union(*(candidates & other for other in sets))
+        if len(candidates) > MAX_SCAN:
+            # Номер школы — ее место по числу броней на момент загрузки
+            candidates = heapq.nsmallest(limit * 4, candidates)
+        return heapq.nsmallest(limit, candidates, key=self._rank)
+
+    def suggest(self, text: str, limit: int) -> List[str]:
+        """До limit названий для начала названия text (по началам слов, в любом порядке)"""
+        words = list(dict.fromkeys(_words(text)))
+        nodes = [self._find(word) for word in words]
+        if not words or None in nodes:
+            return []
+        if len(words) == 1:
+            found = nodes[0].top[:limit]
+        else:
+            found = self._whole_words(nodes, limit)
+            found += [school for school in self._by_prefixes(words, nodes, limit) if school not in found]
+        return [self._names[school] for school in found[:limit]]
@@ -0,0 +1,53 @@
+"""
+Полнотекстовый поиск броней для админов (бот и сайт).
+
+Ищется по названию школы, сопровождающему, профилю и username через
+индекс FTS5 bookings_fts (схема — booking/schema.py, триггеры и
+заполнение — миграция 2). Каждое слово запроса ищется как начало слова
+(«иван» находит «Иванова»), все слова обязательны. Лучшие совпадения
+(bm25) идут первыми, при равенстве — ближайшие по дате.
+Архив в поиск не входит.
+
+Ранжируются только MAX_CANDIDATES самых новых совпадений: bm25 для
+частого слова («школа» есть в каждой второй брони) на миллионе броней
+считается сотни миллисекунд, а новые брони и так нужнее админу. Для
+запросов с меньшим числом совпадений порядок не меняется.
+"""
+import re
+from typing import Optional
+
+# Лишние слова запроса отбрасываются
+MAX_WORDS = 8
+# Сколько самых новых совпадений ранжируется
+MAX_CANDIDATES = 2000
+
+_WORD = re.compile(r'\w+')
+
+
+def match_query(text: str) -> Optional[str]:
+    """Выражение MATCH из текста поиска; None, если в тексте нет слов"""
+    words = _WORD.findall(text or '')[:MAX_WORDS]
+    if not words:
+        return None
+    # Слова в кавычках: операторы FTS5 (AND, NOT, NEAR) считаются обычными словами
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_sql(columns: str = 'bookings.*', where: str = '') -> str:
+    """
+    Запрос поиска. Параметры: выражение MATCH, параметры where (условия на
+    колонки bookings, без слова WHERE), число строк.
+    Условия where отбирают кандидатов до ранжирования: фильтр по старым
+    датам не теряет совпадения из-за MAX_CANDIDATES.
+    """
+    return f'''
+        SELECT {columns} FROM (
+            SELECT bookings_fts.rowid AS id, bookings_fts.rank AS rank FROM bookings_fts
+            JOIN bookings ON bookings.id = bookings_fts.rowid
+            WHERE bookings_fts MATCH ? {'AND ' + where if where else ''}
+            ORDER BY bookings_fts.rowid DESC LIMIT {MAX_CANDIDATES}
+        ) AS found
+        JOIN bookings ON bookings.id = found.id
+        ORDER BY found.rank, bookings.excursion_date, bookings.id
+        LIMIT ?
+    '''
@@ -0,0 +1,72 @@
+"""Синхронный сервис бронирований (для сайта на Flask)"""
+import logging
+import sqlite3
+from typing import Dict
+
+from . import queries
+from .cache import AvailabilityCache
+from .connection import ConnectionPool
+from .migrations import migrate_database
+from .settings import DB_PATH, SLOTS_PER_DAY
+
+logger = logging.getLogger(__name__)
+
+
+class BookingService:
+    """Проверка мест и атомарное бронирование поверх общего пула подключений"""
+
+    def __init__(self, db_path: str = DB_PATH, capacity: int = SLOTS_PER_DAY):
+        self.db_path = db_path
+        self.capacity = capacity
+        self.pool = ConnectionPool(db_path)
+        self.cache = AvailabilityCache()
+
+    def init_db(self) -> None:
+        """Создает таблицы и индексы, применяет недостающие миграции"""
+        # Отдельное подключение: init_db обычно вызывается в мастер-процессе
+        # до fork, и в пуле не должно остаться унаследованных подключений
+        migrate_database(self.db_path)
+
+    def connection(self) -> sqlite3.Connection:
+        """Подключение текущего потока (закрывать не нужно)"""
+        return self.pool.get()
+
+    def counts_by_date(self) -> Dict[str, int]:
+        """Количество броней по будущим датам (из кеша, если он актуален)"""
+        conn = self.pool.get()
+        if self.pool.data_version_changed(conn):
+            self.cache.invalidate()
+
+        counts = self.cache.get()
+        if counts is None:
+            generation = self.cache.generation
+            counts = queries.date_counts(conn.execute(queries.COUNTS_BY_DATE).fetchall())
+            self.cache.set(counts, generation)
+        return counts
+
+    def available_slots(self, date_str: str) -> int:
+        """Сколько мест осталось на дату"""
+        return max(0, self.capacity - self.counts_by_date().get(date_str, 0))
+
+    def is_date_available(self, date_str: str) -> bool:
+        return self.available_slots(date_str) > 0
+
+    def reserve(self, **booking) -> bool:
+        """
+        Бронирует место на дату.
+        Возвращает False, если мест нет или это время на дату уже занято.
+        """
+        conn = self.pool.get()
+        try:
+            cursor = conn.execute(queries.RESERVE, queries.reserve_params(booking, self.capacity))
+        except sqlite3.IntegrityError:
+            logger.warning("Попытка добавить дублирующую бронь на %s %s", booking['excursion_date'], booking['excursion_time'])
+            return False
+        finally:
+            self.cache.invalidate()
+
+        if cursor.rowcount == 0:
+            return False
+
+        logger.info("Добавлена новая бронь от пользователя %s на %s %s", booking['username'], booking['excursion_date'], booking['excursion_time'])
+        return True
@@ -0,0 +1,14 @@
+"""Общие настройки хранилища бронирований для бота и сайта"""
+import os
+
+# Корень репозитория (на уровень выше пакета booking)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Единый файл базы данных для бота и сайта
+DB_PATH = os.environ.get('EXCURSIONS_DB_PATH', os.path.join(BASE_DIR, 'excursions.db'))
+
+# Сколько экскурсий можно провести в один день
+SLOTS_PER_DAY = int(os.environ.get('EXCURSIONS_SLOTS_PER_DAY', 1))
+
+# Сколько ждать освобождения блокировки записи другим процессом (мс)
+BUSY_TIMEOUT_MS = 5000
@@ -0,0 +1,58 @@
+"""
+Согласованные снимки базы для тяжелых отчетов.
+
+Отчет читает базу на отдельном подключении внутри одной транзакции
+чтения. В режиме WAL такая транзакция видит данные на момент своего
+начала и не мешает записи: брони фиксируются, пока идет выгрузка, а все
+запросы отчета видят одно и то же состояние. Время снимка показывается
+в отчете.
+"""
+import contextlib
+import datetime
+import sqlite3
+from typing import AsyncIterator, Iterator, Optional
+
+import aiosqlite
+
+from .connection import connect
+from .settings import DB_PATH
+
+# Первое чтение внутри BEGIN фиксирует снимок WAL
+_PIN_SNAPSHOT = 'SELECT COUNT(*) FROM sqlite_master'
+
+
+class ReadSnapshot:
+    """Подключение с открытой транзакцией чтения и время снимка"""
+    __slots__ = ('conn', 'taken_at')
+
+    def __init__(self, conn: sqlite3.Connection, taken_at: datetime.datetime):
+        self.conn = conn
+        self.taken_at = taken_at
+
+
+@contextlib.contextmanager
+def read_snapshot(db_path: str = DB_PATH, row_factory: Optional[type] = None) -> Iterator[ReadSnapshot]:
+    """Снимок на отдельном sqlite3-подключении (закрывается при выходе)"""
+    conn = connect(db_path)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    try:
+        conn.execute('BEGIN')
+        conn.execute(_PIN_SNAPSHOT).fetchone()
+        yield ReadSnapshot(conn, datetime.datetime.now())
+    finally:
+        if conn.in_transaction:
+            conn.execute('COMMIT')
+        conn.close()
+
+
+@contextlib.asynccontextmanager
+async def read_snapshot_async(conn: aiosqlite.Connection) -> AsyncIterator[datetime.datetime]:
+    """Транзакция чтения на переданном aiosqlite-подключении; значение — время снимка"""
+    await conn.execute('BEGIN')
+    try:
+        cursor = await conn.execute(_PIN_SNAPSHOT)
+        await cursor.fetchone()
+        yield datetime.datetime.now()
+    finally:
+        await conn.execute('COMMIT')
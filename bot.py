@@ -1,5 +1,5 @@
+import startup  # Первым: запоминает время старта процесса
 import logging
-import aiosqlite
 from datetime import datetime, date
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import (
@@ -7,48 +7,85 @@ from telegram.ext import (
     CommandHandler,
     ConversationHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
-import re
 import asyncio
+import functools
+import time
 import json
 import os
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
 from io import BytesIO
 
-from config import BOT_TOKEN, WORKING_DAYS, WORKING_HOURS_START, WORKING_HOURS_END, DATE_FORMAT, TIME_FORMAT, DISPLAY_DATE_FORMAT, ERROR_MESSAGES
+from config import BOT_TOKEN, WORKING_DAYS, WORKING_HOURS_START, WORKING_HOURS_END, DATE_FORMAT, TIME_FORMAT, DISPLAY_DATE_FORMAT, ERROR_MESSAGES, METRICS_HOST, METRICS_PORT, LOOP_LAG_THRESHOLD_MS
+from config import LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, TELEGRAM_API_URL
+from config import RECORD_UPDATES_PATH, RECORD_SALT
+from config import FLOOD_RATE, FLOOD_BURST, SHED_QUEUE_DEPTH, MAX_QUEUE_DEPTH
+from config import ARCHIVE_KEEP_DAYS, MAINTENANCE_TIME, MAINTENANCE_BURST_BOOKINGS, BACKUP_DIR, BACKUP_KEEP
+from logsetup import setup_logging
 from database import db
+from metrics import track_handler, InstrumentedRequest, UPDATE_QUEUE_DEPTH, start_metrics_server
+from loopmon import monitor as loop_monitor
+import profiler
+import keyboards
+from recorder import UpdateRecorder
+from ratelimit import FloodGuard, FLOOD_TRACKED_USERS
+import validators
+import importer
+from scheduler import MaintenanceScheduler
 
-# Включим логирование
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", 
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+# Включим логирование: цикл событий только ставит записи в очередь,
+# файл и консоль пишет фоновый поток
+setup_logging(LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, secrets=[BOT_TOKEN])
 logger = logging.getLogger(__name__)
+startup.mark('imports')
+
+# Ночное обслуживание базы: архив, PRAGMA optimize, очистка, усечение WAL, копия
+maintenance_scheduler = MaintenanceScheduler(db, ARCHIVE_KEEP_DAYS, MAINTENANCE_BURST_BOOKINGS,
+                                             backup_dir=BACKUP_DIR, backup_keep=BACKUP_KEEP)
 
 # Определим состояния диалога
 (SCHOOL, CLASS, PROFILE, DATE, TIME, CONTACT_PERSON, 
  CONTACT_PHONE, PARTICIPANTS, CONFIRMATION) = range(9)
 
+# Сколько непринятых строк импорта показать в сообщении (все — в CSV-отчете)
+IMPORT_REPORT_LINES = 20
+
+# Сколько секунд после /import ждать файл; позже документ уже не импортируется
+IMPORT_WAIT_SECONDS = 10 * 60
+
+# Кнопка под подсказками названия школы: оставить название, как его ввели
+SCHOOL_KEEP_BUTTON = "✍️ Оставить как ввели"
+
 # Файл для хранения админов
 ADMINS_FILE = 'admins.json'
 
+# Кеш списка админов: файл перечитывается, только если изменилось время его изменения
+_admins_cache = {'mtime': None, 'admins': [], 'ids': frozenset()}
+
+def _cached_admins():
+    """Актуальный кеш админов"""
+    try:
+        mtime = os.path.getmtime(ADMINS_FILE)
+    except OSError:
+        mtime = None
+    
+    if mtime != _admins_cache['mtime']:
+        admins = []
+        try:
+            if mtime is not None:
+                with open(ADMINS_FILE, 'r', encoding='utf-8') as f:
+                    admins = json.load(f)
+        except Exception as e:
+            logger.error("Ошибка загрузки админов: %s", e)
+        _admins_cache.update(mtime=mtime, admins=admins, ids=frozenset(str(a) for a in admins))
+    return _admins_cache
+
 # Загружаем список админов
 def load_admins():
     """Загружаем список админов из файла"""
-    try:
-        if os.path.exists(ADMINS_FILE):
-            with open(ADMINS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        logger.error(f"Ошибка загрузки админов: {e}")
-    return []
+    return list(_cached_admins()['admins'])
 
 # Сохраняем список админов
 def save_admins(admins_list):
@@ -56,35 +93,43 @@ def save_admins(admins_list):
     try:
         with open(ADMINS_FILE, 'w', encoding='utf-8') as f:
             json.dump(admins_list, f, ensure_ascii=False, indent=2)
+        # Время изменения может совпасть с прежним, поэтому сбрасываем кеш явно
+        _admins_cache['mtime'] = -1
         return True
     except Exception as e:
-        logger.error(f"Ошибка сохранения админов: {e}")
+        logger.error("Ошибка сохранения админов: %s", e)
         return False
 
 # Проверка является ли пользователь админом
 def is_admin(user_id):
     """Проверяет, является ли пользователь админом"""
-    admins = load_admins()
-    return str(user_id) in admins
+    return str(user_id) in _cached_admins()['ids']
+
+# Постоянные клавиатуры строятся один раз (объекты telegram неизменяемы)
+# и заранее, при запуске — см. warm_up_static()
 
 # Основное меню для админов
+@functools.lru_cache(maxsize=None)
 def get_main_menu_keyboard():
     """Основное меню для админов"""
     keyboard = [["📋 Забронировать экскурсию", "⚙️ Админ-панель"]]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 # Клавиатура админ-панели
+@functools.lru_cache(maxsize=None)
 def get_admin_keyboard():
     """Клавиатура для админ-панели"""
     keyboard = [
         ["📊 Статистика", "📋 Все бронирования"],
         ["📅 Занятые даты", "📤 Экспорт в Excel"],
+        ["🔍 Поиск броней", "📥 Импорт броней"],
         ["👥 Управление админами", "📱 Отправить сообщение"],
         ["🔄 Очистить состояние", "🔙 В главное меню"]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 # Клавиатура управления админами
+@functools.lru_cache(maxsize=None)
 def get_admin_management_keyboard():
     """Клавиатура для управления админами"""
     keyboard = [
@@ -93,7 +138,32 @@ def get_admin_management_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
+# Клавиатура подтверждения брони
+@functools.lru_cache(maxsize=None)
+def get_booking_confirmation_keyboard():
+    """Клавиатура для подтверждения брони"""
+    keyboard = [["✅ Подтвердить", "❌ Отмена"]]
+    return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+
+# Клавиатура с названиями школ (по одному в строке)
+def get_school_keyboard(names, keep=False):
+    """Школы из справочника; keep — с кнопкой «оставить как ввели»"""
+    keyboard = [[name] for name in names]
+    if keep:
+        keyboard.append([SCHOOL_KEEP_BUTTON])
+    return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+
+async def school_prompt_keyboard(user_id):
+    """Клавиатура для вопроса о школе: школы из прошлых броней пользователя"""
+    try:
+        recent = await db.get_recent_schools(user_id)
+    except Exception as e:
+        logger.error("Ошибка чтения школ пользователя: %s", e)
+        recent = []
+    return get_school_keyboard(recent) if recent else ReplyKeyboardRemove()
+
 # Функция-старт - упрощенная версия
+@track_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начинаем диалог"""
     user = update.effective_user
@@ -119,28 +189,60 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Этот бот поможет забронировать экскурсию для школьников в УФНС России по городу Москве.\n\n"
         "Пожалуйста, укажите полное название вашего учебного заведения, включая номер корпуса и фактический адрес:",
         parse_mode='Markdown',
-        reply_markup=ReplyKeyboardRemove()
+        reply_markup=await school_prompt_keyboard(user.id)
     )
     return SCHOOL
 
 # Обработчик для названия школы
+@track_handler
 async def get_school(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Сохраняем название школы и спрашиваем класс"""
-    school_name = update.message.text.strip()
-    
-    if len(school_name) < 3:
-        await update.message.reply_text("Пожалуйста, введите полное название учебного заведения, включая номер корпуса и фактический адрес (минимум 3 символа):")
-        return SCHOOL
+    """Сохраняем название школы (или предлагаем похожие из справочника) и спрашиваем класс"""
+    text = update.message.text
+    draft = context.user_data.pop('school_draft', None)
+    if text == SCHOOL_KEEP_BUTTON:
+        if not draft:
+            await update.message.reply_text("Пожалуйста, введите полное название учебного заведения, включая номер корпуса и фактический адрес:",
+                                            reply_markup=ReplyKeyboardRemove())
+            return SCHOOL
+        school_name = draft
+    else:
+        try:
+            school_name = validators.school_name(text)
+        except ValueError:
+            await update.message.reply_text("Пожалуйста, введите полное название учебного заведения, включая номер корпуса и фактический адрес (минимум 3 символа):")
+            return SCHOOL
+        
+        # Знакомая школа в другом написании — берем название из справочника,
+        # похожие — предлагаем кнопками
+        try:
+            suggestions = await db.suggest_schools(school_name)
+            known = db.schools.canonical(school_name)
+        except Exception as e:
+            logger.error("Ошибка подсказки школ: %s", e)
+            suggestions, known = [], None
+        if known:
+            school_name = known
+        elif suggestions:
+            context.user_data['school_draft'] = school_name
+            await update.message.reply_text(
+                "Возможно, ваша школа уже есть в списке — выберите ее. "
+                f"Если ее нет, уточните название или нажмите «{SCHOOL_KEEP_BUTTON}»:",
+                reply_markup=get_school_keyboard(suggestions, keep=True)
+            )
+            return SCHOOL
     
     context.user_data['school'] = school_name
-    await update.message.reply_text("Отлично! Теперь укажите класс (например, '10А' или '8'):")
+    await update.message.reply_text("Отлично! Теперь укажите класс (например, '10А' или '8'):",
+                                    reply_markup=ReplyKeyboardRemove())
     return CLASS
 
 # Обработчик для класса
+@track_handler
 async def get_class(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Сохраняем класс и спрашиваем профильное направление"""
-    class_number = update.message.text.strip()
-    if not re.match(r'^[1-9][0-9]?[А-Яа-яA-Za-z]?$', class_number):
+    try:
+        class_number = validators.class_number(update.message.text)
+    except ValueError:
         await update.message.reply_text("Пожалуйста, введите корректный класс (например, '10А', '8Б' или '11'):")
         return CLASS
     
@@ -152,6 +254,7 @@ async def get_class(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return PROFILE
 
 # Обработчик для профиля
+@track_handler
 async def get_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Сохраняем профиль и спрашиваем дату экскурсии"""
     profile = update.message.text.strip()
@@ -161,14 +264,7 @@ async def get_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     booked_dates = await db.get_booked_dates()
     booked_dates_str = ""
     if booked_dates:
-        dates_formatted = []
-        for d in booked_dates[:5]:
-            try:
-                date_obj = datetime.strptime(d, DATE_FORMAT)
-                dates_formatted.append(date_obj.strftime(DISPLAY_DATE_FORMAT))
-            except:
-                continue
-        booked_dates_str = "\n".join(dates_formatted)
+        booked_dates_str = "\n".join(d.strftime(DISPLAY_DATE_FORMAT) for d in booked_dates[:5])
     
     await update.message.reply_text(
         f"Профиль сохранен!\n\n"
@@ -184,17 +280,11 @@ async def get_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     return DATE
 
 # В обработчике get_date замените строку 210 на:
+@track_handler
 async def get_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Проверяем дату и спрашиваем время"""
     try:
-        date_str = update.message.text.strip()
-        try:
-            excursion_date = datetime.strptime(date_str, "%d.%m.%Y").date()
-        except ValueError:
-            try:
-                excursion_date = datetime.strptime(date_str, "%d/%m/%Y").date()
-            except ValueError:
-                excursion_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        excursion_date = validators.parse_date(update.message.text)
         
         # Проверяем, что дата не в прошлом
         if excursion_date < date.today():
@@ -202,7 +292,7 @@ async def get_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
             return DATE
         
         # Проверяем день недели
-        if excursion_date.weekday() not in WORKING_DAYS:
+        if not validators.is_working_day(excursion_date):
             await update.message.reply_text(ERROR_MESSAGES['invalid_day'])
             return DATE
         
@@ -210,7 +300,7 @@ async def get_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         try:
             is_date_available = await db.is_date_available(excursion_date.strftime(DATE_FORMAT))
         except Exception as e:
-            logger.error(f"Ошибка проверки доступности даты: {e}")
+            logger.error("Ошибка проверки доступности даты: %s", e)
             # Если функция не реализована, используем старый подход
             booked_times = await db.get_booked_slots_for_date(excursion_date.strftime(DATE_FORMAT))
             is_date_available = len(booked_times) == 0
@@ -243,7 +333,7 @@ async def get_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
                         f"Пожалуйста, введите другую дату:"
                     )
             except Exception as e:
-                logger.error(f"Ошибка получения информации о брони: {e}")
+                logger.error("Ошибка получения информации о брони: %s", e)
                 await update.message.reply_text(
                     f"❌ Дата {excursion_date.strftime(DISPLAY_DATE_FORMAT)} уже занята.\n"
                     f"📌 В один день может быть только одна экскурсия.\n"
@@ -273,6 +363,7 @@ async def get_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         return DATE
     
 # Обработчик для подтверждения (дополненная проверка)
+@track_handler
 async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обрабатываем подтверждение или отмену заявки"""
     user_choice = update.message.text
@@ -357,7 +448,7 @@ async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
                 )
                 
         except Exception as e:
-            logger.error(f"Ошибка сохранения заявки: {e}")
+            logger.error("Ошибка сохранения заявки: %s", e)
             await update.message.reply_text(
                 "⚠️ Произошла ошибка при сохранении данных. Попробуйте позже.",
                 reply_markup=ReplyKeyboardRemove()
@@ -373,12 +464,13 @@ async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     return ConversationHandler.END
 
 # Обработчик для времени
+@track_handler
 async def get_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Проверяем время и спрашиваем контактное лицо"""
     time_str = update.message.text.strip()
     
     try:
-        time_obj = datetime.strptime(time_str, TIME_FORMAT).time()
+        time_obj = validators.parse_time(time_str)
     except ValueError:
         await update.message.reply_text(
             "❌ Неверный формат времени!\n"
@@ -387,7 +479,7 @@ async def get_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         return TIME
     
     # Проверяем рабочее время
-    if not (WORKING_HOURS_START <= time_obj.hour <= WORKING_HOURS_END):
+    if not validators.in_working_hours(time_obj):
         await update.message.reply_text(
             f"❌ Время должно быть с {WORKING_HOURS_START}:00 до {WORKING_HOURS_END}:00.\n"
             f"Пожалуйста, введите другое время:"
@@ -403,10 +495,12 @@ async def get_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return CONTACT_PERSON
 
 # Обработчик для контактного лица
+@track_handler
 async def get_contact_person(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Сохраняем контактное лицо и спрашиваем телефон"""
-    contact_person = update.message.text.strip()
-    if len(contact_person.split()) < 2:
+    try:
+        contact_person = validators.contact_person(update.message.text)
+    except ValueError:
         await update.message.reply_text("Пожалуйста, введите Фамилию и Имя (например, 'Иванов Иван'):")
         return CONTACT_PERSON
     
@@ -418,29 +512,20 @@ async def get_contact_person(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return CONTACT_PHONE
 
 # Обработчик для телефона
+@track_handler
 async def get_contact_phone(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Проверяем телефон и спрашиваем количество участников"""
-    phone = update.message.text.strip()
-    
-    # Очищаем телефон от лишних символов
-    phone_clean = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-    
-    # Проверяем формат телефона
-    phone_pattern = r'^(\+7|8|7)[\d]{10}$'
-    if not re.match(phone_pattern, phone_clean):
+    try:
+        # Приводится к единому формату +7XXXXXXXXXX
+        phone = validators.contact_phone(update.message.text)
+    except ValueError:
         await update.message.reply_text(
             "❌ Неверный формат телефона!\n"
             "Пожалуйста, введите номер в формате +7XXXXXXXXXX или 8XXXXXXXXXX:"
         )
         return CONTACT_PHONE
     
-    # Приводим к единому формату
-    if phone_clean.startswith('8'):
-        phone_clean = '+7' + phone_clean[1:]
-    elif phone_clean.startswith('7'):
-        phone_clean = '+' + phone_clean
-    
-    context.user_data['phone'] = phone_clean
+    context.user_data['phone'] = phone
     
     await update.message.reply_text(
         "Сколько всего участников планируется на экскурсии (школьники плюс не более 2 сопровождающих)?\n"
@@ -449,42 +534,36 @@ async def get_contact_phone(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return PARTICIPANTS
 
 # Обработчик для количества участников
+@track_handler
 async def get_participants(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Проверяем количество участников и показываем сводку"""
     try:
-        participants = int(update.message.text.strip())
-        
-        if participants < 1 or participants > 20:
-            await update.message.reply_text("Пожалуйста, введите число от 1 до 20:")
-            return PARTICIPANTS
-        
-        context.user_data['participants'] = participants
-        
-        # Формируем сводку
-        summary = (
-            "📋 *Сводка вашей заявки:*\n\n"
-            f"🏫 *Учебное заведение:* {context.user_data.get('school', 'Не указано')}\n"
-            f"👨‍🎓 *Класс:* {context.user_data.get('class', 'Не указан')}\n"
-            f"📚 *Профиль:* {context.user_data.get('profile', 'Не указан')}\n"
-            f"📅 *Дата экскурсии:* {context.user_data.get('date_display', 'Не указана')}\n"
-            f"⏰ *Время:* {context.user_data.get('time', 'Не указано')}\n"
-            f"👤 *Сопровождающий:* {context.user_data.get('contact_person', 'Не указан')}\n"
-            f"📞 *Телефон:* {context.user_data.get('phone', 'Не указан')}\n"
-            f"👥 *Количество участников:* {context.user_data.get('participants', 'Не указано')}\n\n"
-            "Всё верно?"
-        )
-        
-        keyboard = [["✅ Подтвердить", "❌ Отмена"]]
-        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-        
-        await update.message.reply_text(summary, parse_mode='Markdown', reply_markup=reply_markup)
-        return CONFIRMATION
-        
+        participants = validators.participants(update.message.text)
     except ValueError:
         await update.message.reply_text("Пожалуйста, введите число от 1 до 20:")
         return PARTICIPANTS
+    
+    context.user_data['participants'] = participants
+    
+    # Формируем сводку
+    summary = (
+        "📋 *Сводка вашей заявки:*\n\n"
+        f"🏫 *Учебное заведение:* {context.user_data.get('school', 'Не указано')}\n"
+        f"👨‍🎓 *Класс:* {context.user_data.get('class', 'Не указан')}\n"
+        f"📚 *Профиль:* {context.user_data.get('profile', 'Не указан')}\n"
+        f"📅 *Дата экскурсии:* {context.user_data.get('date_display', 'Не указана')}\n"
+        f"⏰ *Время:* {context.user_data.get('time', 'Не указано')}\n"
+        f"👤 *Сопровождающий:* {context.user_data.get('contact_person', 'Не указан')}\n"
+        f"📞 *Телефон:* {context.user_data.get('phone', 'Не указан')}\n"
+        f"👥 *Количество участников:* {context.user_data.get('participants', 'Не указано')}\n\n"
+        "Всё верно?"
+    )
+    
+    await update.message.reply_text(summary, parse_mode='Markdown', reply_markup=get_booking_confirmation_keyboard())
+    return CONFIRMATION
 
 # Обработчик для подтверждения
+@track_handler
 async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обрабатываем подтверждение или отмену заявки"""
     user_choice = update.message.text
@@ -549,7 +628,7 @@ async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
                 )
                 
         except Exception as e:
-            logger.error(f"Ошибка сохранения заявки: {e}")
+            logger.error("Ошибка сохранения заявки: %s", e)
             await update.message.reply_text(
                 "⚠️ Произошла ошибка при сохранении данных. Попробуйте позже.",
                 reply_markup=ReplyKeyboardRemove()
@@ -565,6 +644,7 @@ async def confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     return ConversationHandler.END
 
 # Обработчик для команды отмены
+@track_handler
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Отменяет диалог"""
     await update.message.reply_text(
@@ -575,6 +655,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ConversationHandler.END
 
 # Обработчик для команды help
+@track_handler
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показывает справку"""
     await update.message.reply_text(
@@ -592,44 +673,41 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     )
 
 # Обработчик для просмотра своих бронирований
+@track_handler
 async def my_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показывает бронирования пользователя"""
     user = update.effective_user
     
     try:
-        bookings = await db.get_user_bookings(user.id)
+        # Строки сразу идут в текст ответа, списка броней в памяти нет
+        response = "📋 *Ваши активные бронирования:*\n\n"
+        count = 0
+        async for booking in db.iter_user_bookings(user.id):
+            count += 1
+            response += (
+                f"{count}. *ID:* {booking.id}\n"
+                f"   🏫 {booking.school_name}, класс {booking.class_number}\n"
+                f"   📅 {booking.excursion_date.strftime(DISPLAY_DATE_FORMAT)} в {booking.excursion_time}\n"
+                f"   👤 {booking.contact_person}, 👥 {booking.participants_count} чел.\n\n"
+            )
         
-        if not bookings:
+        if not count:
             await update.message.reply_text(
                 "📭 У вас пока нет активных бронирований.\n"
                 "Чтобы создать заявку, используйте команду /start"
             )
             return
         
-        response = "📋 *Ваши активные бронирования:*\n\n"
-        for i, booking in enumerate(bookings, 1):
-            booking_id, school, class_num, ex_date, ex_time, contact, participants = booking
-            try:
-                date_formatted = datetime.strptime(ex_date, DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT)
-            except:
-                date_formatted = ex_date
-            
-            response += (
-                f"{i}. *ID:* {booking_id}\n"
-                f"   🏫 {school}, класс {class_num}\n"
-                f"   📅 {date_formatted} в {ex_time}\n"
-                f"   👤 {contact}, 👥 {participants} чел.\n\n"
-            )
-        
         await update.message.reply_text(response, parse_mode='Markdown')
         
     except Exception as e:
-        logger.error(f"Ошибка получения бронирований: {e}")
+        logger.error("Ошибка получения бронирований: %s", e)
         await update.message.reply_text("⚠️ Произошла ошибка при получении данных.")
 
 # ==================== АДМИН ФУНКЦИИ ====================
 
 # Админ-панель
+@track_handler
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает админ-панель"""
     user = update.effective_user
@@ -644,9 +722,18 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=get_admin_keyboard()
     )
 
+# Вся история (с архивом) — только по явной просьбе: /stats all, /export all
+def wants_archive(context: ContextTypes.DEFAULT_TYPE) -> bool:
+    return bool(context.args) and context.args[0].lower() == 'all'
+
+# Отчеты читают согласованный снимок базы (db.snapshot) и показывают его время
+def snapshot_caption(snapshot) -> str:
+    return f"🕒 Данные на {snapshot.taken_at.strftime('%d.%m.%Y %H:%M:%S')}"
+
 # Показать статистику
+@track_handler
 async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает статистику"""
+    """Показывает статистику (/stats all — с архивом прошедших экскурсий)"""
     user = update.effective_user
     
     if not is_admin(user.id):
@@ -654,39 +741,43 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        stats = await db.get_booking_stats()
-        all_bookings = await db.get_all_bookings()
-        
-        days_stats = {0: 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0}
-        for booking in all_bookings:
-            try:
-                ex_date = booking[5]
-                date_obj = datetime.strptime(ex_date, DATE_FORMAT)
-                day_of_week = date_obj.weekday()
-                days_stats[day_of_week] += 1
-            except:
-                continue
+        include_archive = wants_archive(context)
+        async with db.snapshot() as snapshot:
+            stats = await snapshot.get_booking_stats(include_archive)
+            # Дни недели считаются в SQL по номеру дня, строки в бот не читаются
+            days_stats = await snapshot.get_weekday_stats(include_archive)
         
         days_names = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
-        days_stats_text = "\n".join([f"• {days_names[i]}: {days_stats[i]}" for i in WORKING_DAYS])
+        days_stats_text = "\n".join([f"• {days_names[i]}: {days_stats.get(i, 0)}" for i in WORKING_DAYS])
         
         response = (
-            "📊 *Статистика бронирований*\n\n"
+            f"📊 *Статистика бронирований{' за всю историю' if include_archive else ''}*\n\n"
             f"📈 *Общая статистика:*\n"
             f"• Всего бронирований: {stats['total_bookings']}\n"
             f"• На будущее: {stats['future_bookings']}\n"
             f"• Всего участников: {stats['total_participants']}\n\n"
             f"📅 *По дням недели:*\n"
-            f"{days_stats_text}"
+            f"{days_stats_text}\n\n"
+            f"{snapshot_caption(snapshot)}"
         )
         
         await update.message.reply_text(response, parse_mode='Markdown')
         
     except Exception as e:
-        logger.error(f"Ошибка получения статистики: {e}")
+        logger.error("Ошибка получения статистики: %s", e)
         await update.message.reply_text("❌ Ошибка при получении статистики.")
 
+# Бронь в списках админа (все бронирования, поиск)
+def booking_entry(booking) -> str:
+    return (
+        f"🆔 *{booking.id}* | {booking.excursion_date.strftime(DISPLAY_DATE_FORMAT)} {booking.excursion_time}\n"
+        f"🏫 {booking.school_name}, {booking.class_number} ({booking.class_profile})\n"
+        f"👤 {booking.contact_person} ({booking.contact_phone})\n"
+        f"👥 {booking.participants_count} чел. | 👤 {booking.username if booking.username else 'нет username'}\n\n"
+    )
+
 # Показать все бронирования
+@track_handler
 async def admin_all_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает все бронирования"""
     user = update.effective_user
@@ -696,43 +787,74 @@ async def admin_all_bookings(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
     
     try:
-        all_bookings = await db.get_all_bookings()
+        # Сообщения собираются в снимке, а отправляются после него: транзакция
+        # чтения не держится на время запросов к Telegram. Новое сообщение
+        # начинается, когда бронь не влезает в лимит (разрыв — только между бронями)
+        max_length = 4000
+        count = 0
+        async with db.snapshot() as snapshot:
+            messages = [f"📋 *Все бронирования:*\n{snapshot_caption(snapshot)}\n\n"]
+            async for booking in snapshot.iter_all_bookings():
+                count += 1
+                entry = booking_entry(booking)
+                if len(messages[-1]) + len(entry) > max_length:
+                    messages.append("")
+                messages[-1] += entry
         
-        if not all_bookings:
+        if not count:
             await update.message.reply_text("📭 Нет активных бронирований.")
             return
         
-        response = "📋 *Все бронирования:*\n\n"
-        
-        for booking in all_bookings:
-            booking_id, username, school, class_num, profile, ex_date, ex_time, contact, phone, participants, booking_date = booking
-            
-            try:
-                date_formatted = datetime.strptime(ex_date, DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT)
-            except:
-                date_formatted = ex_date
-            
-            response += (
-                f"🆔 *{booking_id}* | {date_formatted} {ex_time}\n"
-                f"🏫 {school}, {class_num} ({profile})\n"
-                f"👤 {contact} ({phone})\n"
-                f"👥 {participants} чел. | 👤 {username if username else 'нет username'}\n\n"
-            )
-        
-        # Разбиваем на части, если сообщение слишком длинное
-        max_length = 4000
-        if len(response) > max_length:
-            parts = [response[i:i+max_length] for i in range(0, len(response), max_length)]
-            for part in parts:
-                await update.message.reply_text(part, parse_mode='Markdown')
-        else:
+        for response in messages:
             await update.message.reply_text(response, parse_mode='Markdown')
             
     except Exception as e:
-        logger.error(f"Ошибка получения бронирований: {e}")
+        logger.error("Ошибка получения бронирований: %s", e)
         await update.message.reply_text("❌ Ошибка при получении данных.")
 
+# Поиск броней
+@track_handler
+async def admin_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ищет брони по школе, сопровождающему, профилю и username: /search текст"""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ У вас нет прав доступа.")
+        return
+    
+    text = " ".join(context.args) if context.args else ""
+    if not text:
+        context.user_data['awaiting_search'] = True
+        await update.message.reply_text(
+            "🔍 Введите название школы, ФИО сопровождающего, профиль или username "
+            "(можно начало слов, например «лиц 15 иван»):"
+        )
+        return
+    await send_search_results(update, text)
+
+async def send_search_results(update: Update, text: str):
+    """Отправляет лучшие совпадения поиска"""
+    try:
+        bookings = await db.search_bookings(text)
+    except Exception as e:
+        logger.error("Ошибка поиска броней: %s", e)
+        await update.message.reply_text("❌ Ошибка при поиске.")
+        return
+    
+    if not bookings:
+        await update.message.reply_text("📭 Ничего не найдено.", reply_markup=get_admin_keyboard())
+        return
+    
+    response = f"🔍 *Найдено (лучшие {len(bookings)}):*\n\n"
+    for booking in bookings:
+        entry = booking_entry(booking)
+        if len(response) + len(entry) > 4000:
+            break
+        response += entry
+    await update.message.reply_text(response, parse_mode='Markdown', reply_markup=get_admin_keyboard())
+
 # Показать занятые даты
+@track_handler
 async def admin_booked_dates(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает занятые даты"""
     user = update.effective_user
@@ -742,39 +864,38 @@ async def admin_booked_dates(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
     
     try:
-        booked_dates = await db.get_booked_dates()
+        async with db.snapshot() as snapshot:
+            booked_dates = await snapshot.get_booked_dates()
+            bookings_by_date = {date_obj: await snapshot.get_booking_by_date(date_obj)
+                                for date_obj in booked_dates}
         
         if not booked_dates:
             await update.message.reply_text("📅 Нет занятых дат.")
             return
         
-        response = "📅 *Занятые даты:*\n\n"
+        response = f"📅 *Занятые даты:*\n{snapshot_caption(snapshot)}\n\n"
         
-        for date_str in booked_dates:
-            try:
-                date_obj = datetime.strptime(date_str, DATE_FORMAT)
-                formatted_date = date_obj.strftime(DISPLAY_DATE_FORMAT)
-                day_name = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"][date_obj.weekday()]
-            except:
-                formatted_date = date_str
-                day_name = ""
+        for date_obj in booked_dates:
+            formatted_date = date_obj.strftime(DISPLAY_DATE_FORMAT)
+            day_name = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"][date_obj.weekday()]
             
             # Теперь на одну дату только одно время
-            booking = await db.get_booking_by_date(date_str)
+            booking = bookings_by_date[date_obj]
             if booking:
-                response += f"• {formatted_date} ({day_name}): {booking[6]}\n"
+                response += f"• {formatted_date} ({day_name}): {booking.excursion_time}\n"
             else:
                 response += f"• {formatted_date} ({day_name})\n"
         
         await update.message.reply_text(response, parse_mode='Markdown')
         
     except Exception as e:
-        logger.error(f"Ошибка получения занятых дат: {e}")
+        logger.error("Ошибка получения занятых дат: %s", e)
         await update.message.reply_text("❌ Ошибка.")
 
 # Экспорт в Excel
+@track_handler
 async def admin_export_excel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Экспортирует данные в Excel"""
+    """Экспортирует данные в Excel (/export all — с архивом прошедших экскурсий)"""
     user = update.effective_user
     
     if not is_admin(user.id):
@@ -782,48 +903,50 @@ async def admin_export_excel(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
     
     try:
-        all_bookings = await db.get_all_bookings()
+        include_archive = wants_archive(context)
         
-        if not all_bookings:
-            await update.message.reply_text("📭 Нет данных для экспорта.")
-            return
+        # openpyxl нужен только здесь: импорт занимает ~100 мс при запуске бота
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, Alignment, PatternFill
         
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Бронирования"
+        # write_only: строки сразу сериализуются, а не держатся в памяти как ячейки
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Бронирования")
         
-        headers = ["ID", "Дата брони", "ID пользователя", "Username", "Школа", "Класс", 
-                   "Профиль", "Дата экскурсии", "Время", "Сопровождающий", "Телефон", "Количество"]
+        # Те же колонки принимает импорт (importer.py)
+        headers = importer.HEADERS
+        
+        # Ширину колонок в режиме write_only задаем до первой строки
+        column_widths = [8, 18, 12, 15, 25, 8, 20, 12, 8, 20, 15, 10]
+        for i, width in enumerate(column_widths, 1):
+            ws.column_dimensions[chr(64 + i)].width = width
         
         # Записываем заголовки
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
             cell.font = Font(bold=True, color="FFFFFF")
             cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
             cell.alignment = Alignment(horizontal="center", vertical="center")
+            header_cells.append(cell)
+        ws.append(header_cells)
         
         # Записываем данные
-        for row_idx, booking in enumerate(all_bookings, 2):
-            (booking_id, username, school, class_num, profile, ex_date, ex_time, 
-             contact_person, contact_phone, participants, booking_date) = booking
-            
-            ws.cell(row=row_idx, column=1, value=booking_id)
-            ws.cell(row=row_idx, column=2, value=booking_date)
-            ws.cell(row=row_idx, column=3, value=username)
-            ws.cell(row=row_idx, column=4, value=username)
-            ws.cell(row=row_idx, column=5, value=school)
-            ws.cell(row=row_idx, column=6, value=class_num)
-            ws.cell(row=row_idx, column=7, value=profile)
-            ws.cell(row=row_idx, column=8, value=ex_date)
-            ws.cell(row=row_idx, column=9, value=ex_time)
-            ws.cell(row=row_idx, column=10, value=contact_person)
-            ws.cell(row=row_idx, column=11, value=contact_phone)
-            ws.cell(row=row_idx, column=12, value=participants)
+        count = 0
+        async with db.snapshot() as snapshot:
+            async for booking in snapshot.iter_all_bookings(include_archive):
+                count += 1
+                ws.append([
+                    booking.id, booking.booking_date, booking.username, booking.username,
+                    booking.school_name, booking.class_number, booking.class_profile,
+                    booking.excursion_date, booking.excursion_time, booking.contact_person,
+                    booking.contact_phone, booking.participants_count,
+                ])
         
-        # Настраиваем ширину колонок
-        column_widths = [8, 18, 12, 15, 25, 8, 20, 12, 8, 20, 15, 10]
-        for i, width in enumerate(column_widths, 1):
-            ws.column_dimensions[chr(64 + i)].width = width
+        if not count:
+            await update.message.reply_text("📭 Нет данных для экспорта.")
+            return
         
         excel_buffer = BytesIO()
         wb.save(excel_buffer)
@@ -834,16 +957,104 @@ async def admin_export_excel(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_document(
             document=excel_buffer,
             filename=filename,
-            caption=f"📊 Экспорт данных ({len(all_bookings)} записей)"
+            caption=(f"📊 Экспорт данных{' с архивом' if include_archive else ''} ({count} записей)\n"
+                     f"{snapshot_caption(snapshot)}")
         )
         
-        logger.info(f"Экспорт в Excel выполнен, {len(all_bookings)} записей")
+        logger.info("Экспорт в Excel выполнен, %s записей", count)
         
     except Exception as e:
-        logger.error(f"Ошибка экспорта в Excel: {e}")
+        logger.error("Ошибка экспорта в Excel: %s", e)
         await update.message.reply_text("❌ Ошибка при экспорте данных в Excel.")
 
+# Импорт броней из файла
+@track_handler
+async def admin_import(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Просит прислать файл XLSX/CSV для импорта броней"""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ У вас нет прав доступа.")
+        return
+    
+    context.user_data['awaiting_import'] = time.monotonic() + IMPORT_WAIT_SECONDS
+    await update.message.reply_text(
+        "📥 Отправьте файл XLSX или CSV с бронями.\n\n"
+        "Колонки — как в «📤 Экспорт в Excel», заголовки в первой строке "
+        "(ID и «Дата брони» можно не заполнять). Строки проверяются так же, "
+        "как в диалоге бронирования; занятые даты и время не добавляются.",
+        reply_markup=ReplyKeyboardRemove()
+    )
+
+@track_handler
+async def admin_import_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Импортирует присланный файл и отвечает отчетом по строкам"""
+    user = update.effective_user
+    
+    deadline = context.user_data.pop('awaiting_import', None)
+    if not is_admin(user.id) or deadline is None:
+        return
+    if time.monotonic() > deadline:
+        await update.message.reply_text(
+            "⌛ Время ожидания файла истекло. Нажмите «📥 Импорт броней» и отправьте файл еще раз.",
+            reply_markup=get_admin_keyboard()
+        )
+        return
+    
+    document = update.message.document
+    if not importer.is_supported(document.file_name):
+        await update.message.reply_text("❌ Поддерживаются только файлы XLSX и CSV.", reply_markup=get_admin_keyboard())
+        return
+    if document.file_size and document.file_size > importer.MAX_FILE_SIZE:
+        await update.message.reply_text("❌ Файл больше 20 МБ.", reply_markup=get_admin_keyboard())
+        return
+    
+    await update.message.reply_text("⏳ Импортируем брони...")
+    try:
+        started = time.perf_counter()
+        telegram_file = await document.get_file()
+        data = bytes(await telegram_file.download_as_bytearray())
+        # Разбор и проверка строк — блокирующие, в отдельном потоке
+        parsed = await asyncio.to_thread(
+            importer.read_bookings, data, document.file_name,
+            user.id, user.username or f"{user.first_name} {user.last_name or ''}")
+        reasons = await db.import_bookings(parsed.bookings)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Файл не импортирован: {e}", reply_markup=get_admin_keyboard())
+        return
+    except Exception as e:
+        logger.error("Ошибка импорта броней: %s", e)
+        await update.message.reply_text("❌ Ошибка при импорте броней.", reply_markup=get_admin_keyboard())
+        return
+    
+    problems = sorted(parsed.problems + [(row, reason) for row, reason in zip(parsed.rows, reasons) if reason])
+    imported = reasons.count(None)
+    elapsed = time.perf_counter() - started
+    logger.info("Импорт броней из %s: добавлено %s из %s за %.2f с", document.file_name, imported, parsed.total, elapsed)
+    
+    # Без parse_mode: в причинах есть текст из файла
+    lines = [
+        f"📥 Импорт завершен за {elapsed:.1f} с",
+        f"• Строк в файле: {parsed.total}",
+        f"• Добавлено: {imported}",
+        f"• Не добавлено: {len(problems)}",
+    ]
+    if problems:
+        lines.append("")
+        lines.extend(f"Строка {row}: {reason}" for row, reason in problems[:IMPORT_REPORT_LINES])
+        if len(problems) > IMPORT_REPORT_LINES:
+            lines.append(f"... и еще {len(problems) - IMPORT_REPORT_LINES} (все — в файле отчета)")
+    await update.message.reply_text("\n".join(lines)[:4000], reply_markup=get_admin_keyboard())
+    
+    if len(problems) > IMPORT_REPORT_LINES:
+        await update.message.reply_document(
+            document=BytesIO(importer.report_csv(problems)),
+            filename=f"import_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            caption="📄 Непринятые строки"
+        )
+
 # Управление админами
+@track_handler
 async def admin_management(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает меню управления админами"""
     user = update.effective_user
@@ -859,6 +1070,7 @@ async def admin_management(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 # Показать список админов
+@track_handler
 async def admin_list_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает список админов"""
     user = update.effective_user
@@ -883,6 +1095,7 @@ async def admin_list_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(response, parse_mode='Markdown')
 
 # Добавить админа
+@track_handler
 async def admin_add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Добавляет нового админа"""
     user = update.effective_user
@@ -908,15 +1121,16 @@ async def admin_add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         if save_admins(admins):
             await update.message.reply_text(f"✅ Пользователь с ID {new_admin_id} добавлен в список администраторов.")
-            logger.info(f"Добавлен новый администратор: {new_admin_id}")
+            logger.info("Добавлен новый администратор: %s", new_admin_id)
         else:
             await update.message.reply_text("❌ Ошибка при сохранении списка администраторов.")
         
     except Exception as e:
-        logger.error(f"Ошибка добавления админа: {e}")
+        logger.error("Ошибка добавления админа: %s", e)
         await update.message.reply_text("❌ Ошибка при добавлении администратора.")
 
 # Удалить админа
+@track_handler
 async def admin_remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Удаляет админа"""
     user = update.effective_user
@@ -946,15 +1160,16 @@ async def admin_remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         if save_admins(admins):
             await update.message.reply_text(f"✅ Пользователь с ID {admin_to_remove} удален из списка администраторов.")
-            logger.info(f"Удален администратор: {admin_to_remove}")
+            logger.info("Удален администратор: %s", admin_to_remove)
         else:
             await update.message.reply_text("❌ Ошибка при сохранении списка администраторов.")
         
     except Exception as e:
-        logger.error(f"Ошибка удаления админа: {e}")
+        logger.error("Ошибка удаления админа: %s", e)
         await update.message.reply_text("❌ Ошибка при удалении администратора.")
 
 # Отправить сообщение всем пользователям
+@track_handler
 async def admin_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начинает процесс рассылки сообщений"""
     user = update.effective_user
@@ -973,6 +1188,7 @@ async def admin_broadcast_message(update: Update, context: ContextTypes.DEFAULT_
         reply_markup=ReplyKeyboardRemove()
     )
 
+@track_handler
 async def start_booking_for_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Запускает процесс бронирования для админов"""
     user = update.effective_user
@@ -986,7 +1202,7 @@ async def start_booking_for_admin(update: Update, context: ContextTypes.DEFAULT_
     await update.message.reply_text(
         f"Здравствуйте, {user.first_name}! 👋\n"
         "Пожалуйста, укажите полное название учебного заведения, включая номер корпуса и фактический адрес::",
-        reply_markup=ReplyKeyboardRemove()
+        reply_markup=await school_prompt_keyboard(user.id)
     )
     
     # Устанавливаем состояние, что мы начинаем бронирование
@@ -996,6 +1212,7 @@ async def start_booking_for_admin(update: Update, context: ContextTypes.DEFAULT_
     return SCHOOL
 
 # Обработчик текстовых сообщений для админов
+@track_handler
 async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает текстовые сообщения в админ-режиме"""
     user = update.effective_user
@@ -1005,6 +1222,9 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     text = update.message.text
     
+    # Любое другое действие админа отменяет ожидание файла импорта
+    context.user_data.pop('awaiting_import', None)
+    
     # Обработка основных команд админ-панели
     if text == "⚙️ Админ-панель":
         await admin_panel(update, context)
@@ -1021,6 +1241,12 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif text == "📤 Экспорт в Excel":
         await admin_export_excel(update, context)
     
+    elif text == "🔍 Поиск броней":
+        await admin_search(update, context)
+    
+    elif text == "📥 Импорт броней":
+        await admin_import(update, context)
+    
     elif text == "👥 Управление админами":
         await admin_management(update, context)
     
@@ -1056,20 +1282,21 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await clear_state_command(update, context)
     
     # Обработка специальных запросов
+    elif context.user_data.pop('awaiting_search', None):
+        await send_search_results(update, text)
+    
     elif context.user_data.get('awaiting_broadcast'):
         # Рассылка сообщения
         context.user_data.pop('awaiting_broadcast', None)
         
         try:
-            async with aiosqlite.connect("excursions.db") as conn:
-                cursor = await conn.execute("SELECT DISTINCT user_id FROM bookings")
-                user_ids = await cursor.fetchall()
+            user_ids = await db.get_user_ids()
             
             if not user_ids:
                 await update.message.reply_text("📭 Нет пользователей для рассылки.")
                 return
             
-            user_ids = [str(uid[0]) for uid in user_ids]
+            user_ids = [str(uid) for uid in user_ids]
             success_count = 0
             
             await update.message.reply_text(f"📤 Отправка сообщения {len(user_ids)} пользователям...")
@@ -1084,7 +1311,7 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     success_count += 1
                     await asyncio.sleep(0.1)
                 except Exception as e:
-                    logger.error(f"Ошибка отправки пользователю {user_id}: {e}")
+                    logger.error("Ошибка отправки пользователю %s: %s", user_id, e)
             
             await update.message.reply_text(
                 f"✅ *Рассылка завершена*\n\n"
@@ -1095,7 +1322,7 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             
         except Exception as e:
-            logger.error(f"Ошибка рассылки: {e}")
+            logger.error("Ошибка рассылки: %s", e)
             await update.message.reply_text("❌ Ошибка при рассылке сообщений.")
     
     elif context.user_data.get('awaiting_admin_id_add'):
@@ -1113,6 +1340,7 @@ async def handle_admin_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.pop('awaiting_school', None)
         await get_school(update, context)
 
+@track_handler
 async def clear_state_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Очищает состояние пользователя - для тестирования"""
     user = update.effective_user
@@ -1142,9 +1370,10 @@ async def clear_state_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         # УБРАТЬ parse_mode='Markdown'
     )
     
-    logger.info(f"Админ {user.id} очистил состояние")
+    logger.info("Админ %s очистил состояние", user.id)
 
 # Команда для просмотра состояния
+@track_handler
 async def debug_state_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает текущее состояние пользователя"""
     user = update.effective_user
@@ -1172,24 +1401,180 @@ async def debug_state_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     await update.message.reply_text(response, parse_mode='Markdown')
 
+# Команда для просмотра задержек цикла событий
+@track_handler
+async def loop_lag_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает задержки цикла событий и последние блокирующие вызовы"""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ Только для администраторов.")
+        return
+    
+    # Без parse_mode: в стеках встречаются символы разметки
+    report = "⏱ Задержки цикла событий\n\n" + loop_monitor.report()
+    await update.message.reply_text(report[-4000:])
+
+# Команда для профилирования живого процесса
+@track_handler
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Запускает сэмплирующий профилировщик на N секунд: /profile [секунды]"""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ Только для администраторов.")
+        return
+    
+    if profiler.active is not None and profiler.active.running:
+        await update.message.reply_text("⏳ Профилирование уже идет, дождитесь результата.")
+        return
+    
+    try:
+        seconds = int(context.args[0]) if context.args else 30
+    except ValueError:
+        await update.message.reply_text("❌ Используйте: /profile [секунды]")
+        return
+    seconds = max(1, min(seconds, profiler.MAX_DURATION))
+    
+    profiler.active = profiler.SamplingProfiler()
+    profiler.active.start()
+    await update.message.reply_text(f"🔬 Профилирование запущено на {seconds} с...")
+    
+    # Ждем в отдельной задаче: обновления обрабатываются последовательно,
+    # и ожидание в самом обработчике остановило бы бота
+    context.application.create_task(send_profile(update, profiler.active, seconds))
+
+async def send_profile(update: Update, active: profiler.SamplingProfiler, seconds: int):
+    """Останавливает профилировщик и отправляет результаты документами"""
+    try:
+        await asyncio.sleep(seconds)
+        await asyncio.to_thread(active.stop)
+        collapsed, summary = await asyncio.to_thread(lambda: (active.collapsed(), active.summary()))
+        
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        await update.message.reply_document(
+            document=BytesIO(collapsed.encode('utf-8')),
+            filename=f"profile_{stamp}.collapsed.txt",
+            caption=f"🔥 Стеки для flamegraph ({active.samples} сэмплов)"
+        )
+        await update.message.reply_document(
+            document=BytesIO(summary.encode('utf-8')),
+            filename=f"profile_{stamp}.pstats.txt",
+            caption="📊 Сводка pstats"
+        )
+        logger.info("Профилирование завершено, %s сэмплов", active.samples)
+    except Exception as e:
+        logger.error("Ошибка профилирования: %s", e)
+        await update.message.reply_text("❌ Ошибка при профилировании.")
+    finally:
+        if active.running:
+            active.stop()
+        if profiler.active is active:
+            profiler.active = None
+
+# Команда для просмотра времени запуска
+@track_handler
+async def startup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает фазы запуска и самые медленные импорты"""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ Только для администраторов.")
+        return
+    
+    await update.message.reply_text("⏳ Замеряем импорты...")
+    report = startup.phases_report() + "\n\n" + await startup.import_time_report()
+    await update.message.reply_text(report[-4000:])
+
+# Команда для переноса прошедших экскурсий в архив
+@track_handler
+async def archive_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Переносит прошедшие брони в архив, не дожидаясь ночного запуска"""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ Только для администраторов.")
+        return
+    
+    try:
+        moved = await db.archive_past(ARCHIVE_KEEP_DAYS)
+        await update.message.reply_text(f"🗄 В архив перенесено броней: {moved}")
+    except Exception as e:
+        logger.error("Ошибка архивации: %s", e)
+        await update.message.reply_text("❌ Ошибка при переносе в архив.")
+
+# Команда для обслуживания базы вне расписания
+@track_handler
+async def maintenance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Запускает ночное обслуживание базы сейчас и показывает время задач"""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ Только для администраторов.")
+        return
+    
+    if await maintenance_scheduler.busy(context.application):
+        await update.message.reply_text("⏳ Сейчас идут бронирования, повторите позже.")
+        return
+    
+    results = await maintenance_scheduler.run_jobs()
+    lines = ["🧹 Обслуживание базы:"]
+    for name, elapsed, result in results:
+        lines.append(f"• {name}: {elapsed:.3f} с{'' if result == 'ok' else ' — ошибка'}")
+    await update.message.reply_text("\n".join(lines))
+
+# Команда для резервной копии вне расписания
+@track_handler
+async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Снимает резервную копию базы и сообщает ее размер"""
+    user = update.effective_user
+    
+    if not is_admin(user.id):
+        await update.message.reply_text("❌ Только для администраторов.")
+        return
+    
+    if not BACKUP_DIR:
+        await update.message.reply_text("❌ Резервные копии отключены (BACKUP_DIR).")
+        return
+    
+    await update.message.reply_text("💾 Снимаем резервную копию...")
+    try:
+        started = time.perf_counter()
+        path = await maintenance_scheduler.backup()
+        await update.message.reply_text(
+            f"✅ Копия {os.path.basename(path)}: {os.path.getsize(path) / 1024:.0f} КБ "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+    except Exception as e:
+        logger.error("Ошибка резервного копирования: %s", e)
+        await update.message.reply_text("❌ Ошибка при резервном копировании.")
+
 # Обработчик ошибок
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Логирует ошибки"""
-    logger.error(f"Ошибка: {context.error}", exc_info=context.error)
+    logger.error("Ошибка: %s", context.error, exc_info=context.error)
     
     if update and update.effective_message:
         await update.effective_message.reply_text(
             "⚠️ Произошла непредвиденная ошибка. Попробуйте позже или начните заново с /start"
         )
 
-async def main() -> None:
-    """Асинхронный запуск бота"""
-    # Инициализируем базу данных
-    await db.init_db()
-    logger.info("База данных инициализирована")
+def build_application(recorder: UpdateRecorder = None) -> Application:
+    """Создает Application со всеми обработчиками (используется и в bench/replay.py)"""
+    # Создаем Application (запросы к Bot API замеряются для метрик)
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(f"{TELEGRAM_API_URL}/bot")
+        .base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(InstrumentedRequest())
+        .post_init(post_init)
+        .build()
+    )
     
-    # Создаем Application
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Глубина очереди читается только в момент запроса /metrics
+    UPDATE_QUEUE_DEPTH.callback = application.update_queue.qsize
 
     # Создаем ConversationHandler для основного диалога (бронирования)
     conv_handler = ConversationHandler(
@@ -1225,6 +1610,16 @@ async def main() -> None:
         # Добавляем обработчики команд (ДОБАВЬТЕ ЭТИ ДВЕ СТРОЧКИ):
     application.add_handler(CommandHandler("clear", clear_state_command))  # Очистка состояния
     application.add_handler(CommandHandler("debug", debug_state_command))  # Просмотр состояния
+    application.add_handler(CommandHandler("loop", loop_lag_command))  # Задержки цикла событий
+    application.add_handler(CommandHandler("profile", profile_command))  # Профилирование
+    application.add_handler(CommandHandler("startup", startup_command))  # Время запуска
+    application.add_handler(CommandHandler("stats", admin_stats))  # Статистика (all — с архивом)
+    application.add_handler(CommandHandler("export", admin_export_excel))  # Выгрузка (all — с архивом)
+    application.add_handler(CommandHandler("import", admin_import))  # Импорт броней из файла
+    application.add_handler(CommandHandler("search", admin_search))  # Поиск броней
+    application.add_handler(CommandHandler("archive", archive_command))  # Перенос в архив
+    application.add_handler(CommandHandler("maintenance", maintenance_command))  # Обслуживание базы
+    application.add_handler(CommandHandler("backup", backup_command))  # Резервная копия
     
     # Обработчик для текстовых сообщений админов
     application.add_handler(MessageHandler(
@@ -1232,20 +1627,97 @@ async def main() -> None:
         handle_admin_text
     ))
     
+    # Файлы импорта от админов (после /import или кнопки «📥 Импорт броней»)
+    application.add_handler(MessageHandler(filters.Document.ALL, admin_import_file))
+    
     # Обработчик ошибок
     application.add_error_handler(error_handler)
+    
+    # Группы с отрицательными номерами выполняются раньше диалогов, по возрастанию.
+    # Отметка первого обновления для /startup
+    application.add_handler(TypeHandler(Update, startup.on_update), group=-3)
+    # Запись обновлений для воспроизведения: видит и те, что отбросит защита от флуда
+    if recorder is not None:
+        application.add_handler(TypeHandler(Update, recorder.record), group=-2)
+    # Защита от флуда и сброс нагрузки: ApplicationHandlerStop отменяет обработку
+    if FLOOD_RATE > 0:
+        flood_guard = FloodGuard(FLOOD_RATE, FLOOD_BURST, SHED_QUEUE_DEPTH, MAX_QUEUE_DEPTH)
+        FLOOD_TRACKED_USERS.callback = flood_guard.__len__
+        application.add_handler(TypeHandler(Update, flood_guard.check), group=-1)
+    
+    return application
+
+def warm_up_static() -> None:
+    """Загружает список админов и строит постоянные клавиатуры"""
+    load_admins()
+    keyboards.build_static_keyboards()
+    get_main_menu_keyboard()
+    get_admin_keyboard()
+    get_admin_management_keyboard()
+    get_booking_confirmation_keyboard()
+
+def keyboard_buttons():
+    """Подписи кнопок постоянных клавиатур (запись обновлений оставляет их как есть)"""
+    markups = keyboards.build_static_keyboards() + [
+        get_main_menu_keyboard(), get_admin_keyboard(),
+        get_admin_management_keyboard(), get_booking_confirmation_keyboard(),
+    ]
+    buttons = {SCHOOL_KEEP_BUTTON}
+    for markup in markups:
+        buttons.update(button.text for row in markup.keyboard for button in row)
+    return buttons
+
+async def post_init(application: Application) -> None:
+    """
+    Подготовка перед приемом обновлений: база с прогревом (кеш доступности,
+    горячие запросы) и статические данные готовятся параллельно.
+    Опрос getUpdates начинается только после этого.
+    """
+    async def init_database():
+        await db.init_db()
+        await db.warm_up()
+    
+    await asyncio.gather(init_database(), asyncio.to_thread(warm_up_static))
+    startup.mark('post_init')
+
+async def main() -> None:
+    """Асинхронный запуск бота"""
+    recorder = None
+    if RECORD_UPDATES_PATH:
+        recorder = UpdateRecorder(RECORD_UPDATES_PATH, RECORD_SALT, is_admin, keyboard_buttons())
+        recorder.start()
+    
+    application = build_application(recorder)
+    
+    # Обслуживание базы раз в сутки, в тихие часы (местное время)
+    maintenance_at = datetime.strptime(MAINTENANCE_TIME, TIME_FORMAT).time().replace(
+        tzinfo=datetime.now().astimezone().tzinfo)
+    maintenance_scheduler.schedule(application.job_queue, maintenance_at)
 
     # Создаем файл админов при первом запуске, если его нет
     if not os.path.exists(ADMINS_FILE):
         initial_admin_id = "ВАШ_TELEGRAM_ID"  # ЗАМЕНИТЕ НА ВАШ ID
         save_admins([initial_admin_id])
-        logger.info(f"Создан файл админов, добавлен администратор с ID: {initial_admin_id}")
+        logger.info("Создан файл админов, добавлен администратор с ID: %s", initial_admin_id)
+    
+    # Локальный HTTP-сервер с метриками (METRICS_PORT=0 отключает)
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    
+    # Следим за блокирующими вызовами в цикле событий
+    loop_monitor.threshold = LOOP_LAG_THRESHOLD_MS / 1000
+    loop_monitor.start()
     
     # Запускаем бота
     logger.info("Бот запускается...")
     await application.initialize()
+    # initialize() не вызывает post_init (это делает только run_polling)
+    await application.post_init(application)
     await application.start()
     await application.updater.start_polling()
+    startup.mark('polling')
+    logger.info("Бот готов к работе (запуск занял %.2f с)", startup.phases['polling'])
     
     # Ждем сигнала остановки
     try:
@@ -1255,6 +1727,12 @@ async def main() -> None:
         logger.info("Остановка бота...")
     finally:
         await application.stop()
+        await loop_monitor.stop()
+        if recorder is not None:
+            recorder.stop()
+        if metrics_server is not None:
+            metrics_server.close()
+        await db.close()
         logger.info("Бот остановлен")
 
 if __name__ == "__main__":
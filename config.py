@@ -1,8 +1,9 @@
 import os
 from dotenv import load_dotenv
 
-# Загружаем переменные окружения из файла .env
-load_dotenv()
+# Загружаем переменные окружения из файла .env рядом с config.py
+# (явный путь вместо поиска find_dotenv по стеку вызовов)
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
 
 # Токен бота из переменных окружения
 BOT_TOKEN = os.getenv('BOT_TOKEN')
@@ -10,8 +11,50 @@ BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден в переменных окружения. Проверьте файл .env")
 
-# Конфигурация базы данных
-DB_PATH = "excursions.db"
+# Конфигурация базы данных (общая с сайтом, см. пакет booking)
+from booking.settings import DB_PATH, SLOTS_PER_DAY
+
+# Адрес Bot API (для нагрузочных тестов — локальная замена из bench/fake_bot_api.py)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+
+# Локальный HTTP-эндпоинт с метриками Prometheus (0 — отключить)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Порог задержки цикла событий, после которого снимается стек блокирующего вызова
+LOOP_LAG_THRESHOLD_MS = int(os.getenv('LOOP_LAG_THRESHOLD_MS', '100'))
+
+# Логирование: строки JSON с ротацией по размеру и в полночь
+LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '14'))
+
+# Запись обезличенных обновлений для bench/replay.py (пусто — не записывать).
+# Соль делает псевдо-id стабильными между перезапусками; без нее берется случайная
+RECORD_UPDATES_PATH = os.getenv('RECORD_UPDATES_PATH', '')
+RECORD_SALT = os.getenv('RECORD_SALT') or os.urandom(16).hex()
+
+# Защита от флуда: у пользователя FLOOD_BURST сообщений подряд, дальше
+# FLOOD_RATE в секунду (FLOOD_RATE=0 отключает). При очереди необработанных
+# обновлений от SHED_QUEUE_DEPTH сбрасываются второстепенные запросы,
+# от MAX_QUEUE_DEPTH — все, кроме подтверждения брони
+FLOOD_RATE = float(os.getenv('FLOOD_RATE', '1'))
+FLOOD_BURST = int(os.getenv('FLOOD_BURST', '10'))
+SHED_QUEUE_DEPTH = int(os.getenv('SHED_QUEUE_DEPTH', '50'))
+MAX_QUEUE_DEPTH = int(os.getenv('MAX_QUEUE_DEPTH', '200'))
+
+# Ночное обслуживание базы в MAINTENANCE_TIME (местное время, ЧЧ:ММ): перенос
+# в архив экскурсий старше ARCHIVE_KEEP_DAYS дней, PRAGMA optimize, очистка и
+# усечение WAL. Если за последние 10 минут создано MAINTENANCE_BURST_BOOKINGS
+# броней и больше, обслуживание откладывается
+MAINTENANCE_TIME = os.getenv('MAINTENANCE_TIME', '03:30')
+ARCHIVE_KEEP_DAYS = int(os.getenv('ARCHIVE_KEEP_DAYS', '0'))
+MAINTENANCE_BURST_BOOKINGS = int(os.getenv('MAINTENANCE_BURST_BOOKINGS', '5'))
+# Резервные копии в конце ночного обслуживания (BACKUP_DIR='' отключает);
+# хранятся BACKUP_KEEP последних. Восстановление: python -m booking.backup restore
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '14'))
 
 # Конфигурация времени экскурсий
 WORKING_DAYS = [1, 2, 3]  # 0=Понедельник, 1=Вторник, 2=Среда, 3=Четверг...
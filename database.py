@@ -1,46 +1,152 @@
-import aiosqlite
+import asyncio
 import datetime
-from typing import Optional, List, Tuple
+import json
+import time
+from typing import AsyncIterator, Dict, NamedTuple, Optional, List, Tuple
 import logging
 
+from booking import AsyncBookingService, DB_PATH, SLOTS_PER_DAY, search
+from booking.schools import SCHOOLS_SINCE, SchoolIndex
+from booking.dates import TODAY_SQL, from_day, from_minute, to_day, to_minute
+from metrics import track_db_methods
+
 logger = logging.getLogger(__name__)
 
-# Путь к файлу базы данных
-DB_PATH = "excursions.db"
+# Строк за одно обращение к потоку aiosqlite в потоковых методах iter_*
+STREAM_BATCH_SIZE = 500
+
+# Сколько лучших совпадений возвращает поиск
+SEARCH_LIMIT = 20
+
+# Подсказки названия школы: сколько названий, сколько школ из прошлых броней
+# пользователя и как часто дочитывать справочник (школы с сайта и из импорта), с
+SCHOOL_SUGGESTIONS = 5
+RECENT_SCHOOLS = 3
+SCHOOLS_REFRESH_INTERVAL = 60
+
+
+# Типы строк: распаковываются как кортежи, поля доступны по имени.
+# Дата экскурсии — datetime.date, время — строка 'ЧЧ:ММ'
+
+class BookingRow(NamedTuple):
+    """Бронь для админки (get_all_bookings, iter_all_bookings)"""
+    id: int
+    username: Optional[str]
+    school_name: str
+    class_number: str
+    class_profile: Optional[str]
+    excursion_date: datetime.date
+    excursion_time: str
+    contact_person: str
+    contact_phone: str
+    participants_count: int
+    booking_date: Optional[str]
+
+
+class UserBookingRow(NamedTuple):
+    """Бронь пользователя (get_user_bookings, iter_user_bookings)"""
+    id: int
+    school_name: str
+    class_number: str
+    excursion_date: datetime.date
+    excursion_time: str
+    contact_person: str
+    participants_count: int
+
+
+class DateBookingRow(NamedTuple):
+    """Бронь на дату (get_booking_by_date)"""
+    id: int
+    user_id: int
+    school_name: str
+    class_number: str
+    class_profile: Optional[str]
+    excursion_date: datetime.date
+    excursion_time: str
+    contact_person: str
+    contact_phone: str
+    participants_count: int
+    booking_date: Optional[str]
+
+
+def _row_factory(row_type):
+    """
+    row_factory курсора sqlite3, собирающий строки в row_type.
+    Дата и время из базы (целые числа) переводятся здесь, один раз на строку
+    """
+    make = row_type._make
+    date_at = row_type._fields.index('excursion_date')
+    time_at = row_type._fields.index('excursion_time')
+
+    def factory(cursor, row):
+        row = list(row)
+        row[date_at] = from_day(row[date_at])
+        row[time_at] = from_minute(row[time_at])
+        return make(row)
+    return factory
+
+
+_BOOKING_ROW = _row_factory(BookingRow)
+_USER_BOOKING_ROW = _row_factory(UserBookingRow)
+_DATE_BOOKING_ROW = _row_factory(DateBookingRow)
+
+_USER_BOOKINGS_SQL = f'''
+    SELECT 
+        id, school_name, class_number, excursion_date, 
+        excursion_time, contact_person, participants_count
+    FROM bookings 
+    WHERE user_id = ? AND excursion_date >= {TODAY_SQL}
+    ORDER BY excursion_date, excursion_time
+'''
 
-class Database:
-    def __init__(self, db_path: str = DB_PATH):
-        self.db_path = db_path
-        
-    async def init_db(self) -> None:
-        """Инициализация базы данных и создание таблиц"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS bookings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    username TEXT,
-                    school_name TEXT NOT NULL,
-                    class_number TEXT NOT NULL,
-                    class_profile TEXT,
-                    excursion_date DATE NOT NULL,
-                    excursion_time TEXT NOT NULL,
-                    contact_person TEXT NOT NULL,
-                    contact_phone TEXT NOT NULL,
-                    participants_count INTEGER NOT NULL,
-                    booking_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(excursion_date, excursion_time)
-                )
-            ''')
-            
-            # Создаем индекс для быстрого поиска по дате
-            await db.execute('''
-                CREATE INDEX IF NOT EXISTS idx_excursion_date 
-                ON bookings(excursion_date)
-            ''')
-            
-            await db.commit()
-            logger.info("База данных инициализирована")
+
+def _bookings_source(include_archive: bool) -> Tuple[str, str]:
+    """Таблица и условие отчетов: будущие брони или вся история с архивом"""
+    if include_archive:
+        return 'bookings_all', ''
+    return 'bookings', f"WHERE excursion_date >= {TODAY_SQL}"
+
+
+def _all_bookings_sql(include_archive: bool) -> str:
+    table, where = _bookings_source(include_archive)
+    return f'''
+        SELECT 
+            id, username, school_name, class_number, class_profile,
+            excursion_date, excursion_time, contact_person, 
+            contact_phone, participants_count, booking_date
+        FROM {table} 
+        {where}
+        ORDER BY excursion_date, excursion_time
+    '''
+
+@track_db_methods
+class Database(AsyncBookingService):
+    """
+    Асинхронный доступ к бронированиям для бота.
+    Схема, подключение, кеш доступности и атомарное бронирование
+    берутся из общего сервиса booking (им же пользуется сайт).
+    """
+
+    def __init__(self, db_path: str = DB_PATH, capacity: int = SLOTS_PER_DAY):
+        super().__init__(db_path, capacity)
+        # Справочник школ в памяти (загружается при прогреве)
+        self.schools = SchoolIndex()
+        self._schools_read_at = 0.0
+        # Названия из броней бота, счетчики которых еще не перечитаны
+        self._schools_booked = set()
+
+    async def warm_up(self) -> None:
+        """
+        Прогрев перед приемом обновлений: горячие запросы диалога выполняются
+        по разу, чтобы попасть в кеш подготовленных запросов подключения
+        и поднять страницы индексов в кеш SQLite.
+        """
+        await super().warm_up()
+        today = datetime.date.today()
+        await self.is_time_available(today, '10:00')
+        await self.get_booked_slots_for_date(today)
+        await self.get_user_bookings(0)
+        await self.load_schools()
 
     async def add_booking(
         self,
@@ -49,7 +155,7 @@ class Database:
         school_name: str,
         class_number: str,
         class_profile: str,
-        excursion_date: str,  # В формате 'YYYY-MM-DD'
+        excursion_date: str,  # В формате 'YYYY-MM-DD' (или datetime.date)
         excursion_time: str,  # В формате 'HH:MM'
         contact_person: str,
         contact_phone: str,
@@ -57,186 +163,251 @@ class Database:
     ) -> bool:
         """
         Добавление новой брони экскурсии.
-        Возвращает True если успешно, False если время на эту дату уже занято.
+        Возвращает True если успешно, False если на эту дату уже нет мест.
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Проверяем, свободно ли время на эту дату
-                is_available = await self.is_time_available(excursion_date, excursion_time)
-                
-                if not is_available:
-                    return False
-                
-                # Добавляем новую запись
-                await db.execute('''
-                    INSERT INTO bookings (
-                        user_id, username, school_name, class_number, class_profile,
-                        excursion_date, excursion_time, contact_person, 
-                        contact_phone, participants_count
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    user_id, username, school_name, class_number, class_profile,
-                    excursion_date, excursion_time, contact_person,
-                    contact_phone, participants_count
-                ))
-                
-                await db.commit()
-                logger.info(f"Добавлена новая бронь от пользователя {username} на {excursion_date} {excursion_time}")
-                return True
-                
-        except aiosqlite.IntegrityError:
-            logger.warning(f"Попытка добавить дублирующую бронь на {excursion_date} {excursion_time}")
-            return False
+            added = await self.reserve(
+                user_id=user_id,
+                username=username,
+                school_name=school_name,
+                class_number=class_number,
+                class_profile=class_profile,
+                excursion_date=excursion_date,
+                excursion_time=excursion_time,
+                contact_person=contact_person,
+                contact_phone=contact_phone,
+                participants_count=participants_count
+            )
         except Exception as e:
-            logger.error(f"Ошибка при добавлении брони: {e}")
+            logger.error("Ошибка при добавлении брони: %s", e)
             return False
+        if added:
+            self._schools_booked.add(school_name)
+        return added
 
-    async def is_time_available(self, excursion_date: str, excursion_time: str) -> bool:
+    async def is_time_available(self, excursion_date, excursion_time: str) -> bool:
         """
         Проверяет, свободно ли время на указанную дату.
         Возвращает True если время свободно.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('''
-                SELECT COUNT(*) FROM bookings 
-                WHERE excursion_date = ? AND excursion_time = ?
-            ''', (excursion_date, excursion_time))
-            
-            result = await cursor.fetchone()
-            count = result[0] if result else 0
-            
-            return count == 0
+        conn = await self.connection()
+        cursor = await conn.execute('''
+            SELECT COUNT(*) FROM bookings 
+            WHERE excursion_date = ? AND excursion_time = ?
+        ''', (to_day(excursion_date), to_minute(excursion_time)))
         
-    async def is_date_available(self, date_str):
-        """Проверяет, свободна ли дата (может быть только одна экскурсия в день)"""
-        async with aiosqlite.connect(self.db_path) as conn:
-            cursor = await conn.execute(
-                "SELECT COUNT(*) FROM bookings WHERE excursion_date = ?",
-                (date_str,)
-            )
-            result = await cursor.fetchone()
-            return result[0] == 0
+        result = await cursor.fetchone()
+        count = result[0] if result else 0
+        
+        return count == 0
 
-    async def get_booked_slots_for_date(self, date: str) -> List[str]:
+    async def get_booked_slots_for_date(self, date) -> List[str]:
         """
-        Возвращает список занятых временных слотов на указанную дату.
+        Возвращает список занятых временных слотов ('ЧЧ:ММ') на указанную дату.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('''
-                SELECT excursion_time FROM bookings 
-                WHERE excursion_date = ?
-                ORDER BY excursion_time
-            ''', (date,))
-            
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
+        db = await self.connection()
+        cursor = await db.execute('''
+            SELECT excursion_time FROM bookings 
+            WHERE excursion_date = ?
+            ORDER BY excursion_time
+        ''', (to_day(date),))
         
-    async def get_booking_by_date(self, date_str):
-        """Получает бронирование по дате (только одно на дату)"""
-        async with aiosqlite.connect(self.db_path) as conn:
-            cursor = await conn.execute(
-                """SELECT * FROM bookings 
-                WHERE excursion_date = ? 
-                ORDER BY booking_date DESC 
-                LIMIT 1""",
-                (date_str,)
-            )
-            return await cursor.fetchone()
+        rows = await cursor.fetchall()
+        return [from_minute(row[0]) for row in rows]
+        
+    async def get_booking_by_date(self, date_str) -> Optional[DateBookingRow]:
+        """Получает бронирование по дате ('YYYY-MM-DD' или datetime.date; только одно на дату)"""
+        conn = await self.connection()
+        # Явный список колонок: бот распаковывает 11 значений
+        cursor = await conn.execute(
+            """SELECT id, user_id, school_name, class_number, class_profile,
+                   excursion_date, excursion_time, contact_person, contact_phone,
+                   participants_count, booking_date
+            FROM bookings 
+            WHERE excursion_date = ? 
+            ORDER BY booking_date DESC 
+            LIMIT 1""",
+            (to_day(date_str),)
+        )
+        cursor.row_factory = _DATE_BOOKING_ROW
+        return await cursor.fetchone()
 
-    async def get_booked_dates(self) -> List[str]:
+    async def get_booked_dates(self) -> List[datetime.date]:
         """
         Возвращает список дат, на которые есть бронирования.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('''
-                SELECT DISTINCT excursion_date FROM bookings 
-                WHERE excursion_date >= date('now')
-                ORDER BY excursion_date
-            ''')
-            
-            rows = await cursor.fetchall()
-            return [row[0] for row in rows]
-
-    async def get_user_bookings(self, user_id: int) -> List[Tuple]:
+        counts = await self.counts_by_date()
+        return sorted(datetime.date.fromisoformat(date_str) for date_str, count in counts.items() if count > 0)
+
+    async def get_user_bookings(self, user_id: int) -> List[UserBookingRow]:
         """
         Возвращает список бронирований пользователя.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('''
-                SELECT 
-                    id, school_name, class_number, excursion_date, 
-                    excursion_time, contact_person, participants_count
-                FROM bookings 
-                WHERE user_id = ? AND excursion_date >= date('now')
-                ORDER BY excursion_date, excursion_time
-            ''', (user_id,))
-            
-            return await cursor.fetchall()
+        db = await self.connection()
+        cursor = await db.execute(_USER_BOOKINGS_SQL, (user_id,))
+        cursor.row_factory = _USER_BOOKING_ROW
+        return await cursor.fetchall()
+
+    async def iter_user_bookings(self, user_id: int) -> AsyncIterator[UserBookingRow]:
+        """
+        То же, что get_user_bookings, но строки читаются пачками по мере обхода.
+        """
+        db = await self.connection()
+        cursor = await db.execute(_USER_BOOKINGS_SQL, (user_id,))
+        cursor.row_factory = _USER_BOOKING_ROW
+        cursor.iter_chunk_size = STREAM_BATCH_SIZE
+        try:
+            async for row in cursor:
+                yield row
+        finally:
+            await cursor.close()
+
+    async def get_user_ids(self) -> List[int]:
+        """
+        Возвращает список пользователей, которые хоть раз бронировали (для рассылки).
+        """
+        db = await self.connection()
+        # user_id = 0 у записей с сайта: им писать некуда
+        cursor = await db.execute("SELECT DISTINCT user_id FROM bookings WHERE user_id > 0")
+        rows = await cursor.fetchall()
+        return [row[0] for row in rows]
 
     async def cancel_booking(self, booking_id: int, user_id: int) -> bool:
         """
         Отмена бронирования пользователем.
         Возвращает True если отмена успешна.
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        db = await self.connection()
+        try:
             cursor = await db.execute('''
                 DELETE FROM bookings 
                 WHERE id = ? AND user_id = ?
             ''', (booking_id, user_id))
-            
-            await db.commit()
-            return cursor.rowcount > 0
+        finally:
+            self.cache.invalidate()
+        
+        return cursor.rowcount > 0
 
-    async def get_all_bookings(self) -> List[Tuple]:
+    async def get_all_bookings(self, include_archive: bool = False) -> List[BookingRow]:
         """
         Получение всех бронирований (для админки).
+        include_archive=True — вся история, включая архив прошедших экскурсий.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute('''
-                SELECT 
-                    id, username, school_name, class_number, class_profile,
-                    excursion_date, excursion_time, contact_person, 
-                    contact_phone, participants_count, booking_date
-                FROM bookings 
-                WHERE excursion_date >= date('now')
-                ORDER BY excursion_date, excursion_time
-            ''')
-            
-            return await cursor.fetchall()
-
-    async def get_booking_stats(self) -> dict:
+        db = await self.connection()
+        cursor = await db.execute(_all_bookings_sql(include_archive))
+        cursor.row_factory = _BOOKING_ROW
+        return await cursor.fetchall()
+
+    async def iter_all_bookings(self, include_archive: bool = False) -> AsyncIterator[BookingRow]:
+        """
+        То же, что get_all_bookings, но строки читаются пачками по
+        STREAM_BATCH_SIZE: память не зависит от размера таблицы.
+        """
+        db = await self.connection()
+        cursor = await db.execute(_all_bookings_sql(include_archive))
+        cursor.row_factory = _BOOKING_ROW
+        cursor.iter_chunk_size = STREAM_BATCH_SIZE
+        try:
+            async for row in cursor:
+                yield row
+        finally:
+            await cursor.close()
+
+    async def search_bookings(self, text: str, limit: int = SEARCH_LIMIT) -> List[BookingRow]:
+        """
+        Поиск броней по школе, сопровождающему, профилю и username
+        (по началу слов, лучшие совпадения первыми; см. booking/search.py)
+        """
+        query = search.match_query(text)
+        if query is None:
+            return []
+        db = await self.connection()
+        cursor = await db.execute(search.search_sql(', '.join('bookings.' + field for field in BookingRow._fields)), (query, limit))
+        cursor.row_factory = _BOOKING_ROW
+        return await cursor.fetchall()
+
+    async def load_schools(self) -> None:
+        """Читает справочник школ в память (дерево строится в отдельном потоке)"""
+        db = await self.connection()
+        cursor = await db.execute(SCHOOLS_SINCE, (0, '[]'))
+        rows = await cursor.fetchall()
+        self.schools = await asyncio.to_thread(SchoolIndex.from_rows, rows)
+        self._schools_read_at = time.monotonic()
+        logger.info("Справочник школ загружен, школ: %s", len(self.schools))
+
+    async def suggest_schools(self, text: str, limit: int = SCHOOL_SUGGESTIONS) -> List[str]:
+        """
+        Названия школ из справочника по началу названия (см. booking/schools.py).
+        После своих броней и раз в SCHOOLS_REFRESH_INTERVAL справочник
+        дочитывается из базы: новые названия и счетчики броней
+        """
+        if self._schools_booked or time.monotonic() - self._schools_read_at > SCHOOLS_REFRESH_INTERVAL:
+            booked, self._schools_booked = self._schools_booked, set()
+            db = await self.connection()
+            cursor = await db.execute(SCHOOLS_SINCE, (self.schools.last_id, json.dumps(sorted(booked))))
+            for row_id, name, bookings in await cursor.fetchall():
+                self.schools.update(name, bookings, row_id)
+            self._schools_read_at = time.monotonic()
+        return self.schools.suggest(text, limit)
+
+    async def get_recent_schools(self, user_id: int, limit: int = RECENT_SCHOOLS) -> List[str]:
+        """Школы из прошлых броней пользователя (включая архив), последние первыми"""
+        db = await self.connection()
+        cursor = await db.execute('''
+            SELECT school_name FROM bookings_all WHERE user_id = ?
+            GROUP BY school_name ORDER BY MAX(id) DESC LIMIT ?
+        ''', (user_id, limit))
+        return [row[0] for row in await cursor.fetchall()]
+
+    async def get_booking_stats(self, include_archive: bool = False) -> dict:
         """
         Получение статистики по бронированиям.
+        Итоги считаются по действующим броням, с include_archive=True — по всей истории.
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            # Общее количество броней
-            cursor = await db.execute('SELECT COUNT(*) FROM bookings')
-            total = (await cursor.fetchone())[0]
-            
-            # Брони на сегодня
-            cursor = await db.execute('''
-                SELECT COUNT(*) FROM bookings 
-                WHERE excursion_date = date('now')
-            ''')
-            today = (await cursor.fetchone())[0]
-            
-            # Брони на будущее
-            cursor = await db.execute('''
-                SELECT COUNT(*) FROM bookings 
-                WHERE excursion_date > date('now')
-            ''')
-            future = (await cursor.fetchone())[0]
-            
-            # Общее количество участников
-            cursor = await db.execute('SELECT SUM(participants_count) FROM bookings')
-            total_participants = (await cursor.fetchone())[0] or 0
-            
-            return {
-                'total_bookings': total,
-                'today_bookings': today,
-                'future_bookings': future,
-                'total_participants': total_participants
-            }
+        db = await self.connection()
+        table = 'bookings_all' if include_archive else 'bookings'
+        # Общее количество броней
+        cursor = await db.execute(f'SELECT COUNT(*) FROM {table}')
+        total = (await cursor.fetchone())[0]
+        
+        # Брони на сегодня
+        cursor = await db.execute(f'''
+            SELECT COUNT(*) FROM bookings 
+            WHERE excursion_date = {TODAY_SQL}
+        ''')
+        today = (await cursor.fetchone())[0]
+        
+        # Брони на будущее
+        cursor = await db.execute(f'''
+            SELECT COUNT(*) FROM bookings 
+            WHERE excursion_date > {TODAY_SQL}
+        ''')
+        future = (await cursor.fetchone())[0]
+        
+        # Общее количество участников
+        cursor = await db.execute(f'SELECT SUM(participants_count) FROM {table}')
+        total_participants = (await cursor.fetchone())[0] or 0
+        
+        return {
+            'total_bookings': total,
+            'today_bookings': today,
+            'future_bookings': future,
+            'total_participants': total_participants
+        }
+
+    async def get_weekday_stats(self, include_archive: bool = False) -> Dict[int, int]:
+        """
+        Количество броней по дням недели (0 — понедельник), как в get_all_bookings.
+        Считается в SQL по номеру дня: 1970-01-01 — четверг.
+        """
+        db = await self.connection()
+        table, where = _bookings_source(include_archive)
+        cursor = await db.execute(f'''
+            SELECT (excursion_date + 3) % 7, COUNT(*) FROM {table}
+            {where}
+            GROUP BY 1
+        ''')
+        return dict(await cursor.fetchall())
 
 
 # Создаем глобальный экземпляр базы данных для удобства использования
@@ -251,10 +422,10 @@ async def init_db():
 async def test_connection():
     """Тест соединения с базой данных"""
     try:
-        async with aiosqlite.connect(DB_PATH) as conn:
-            cursor = await conn.execute("SELECT 1")
-            result = await cursor.fetchone()
-            return result[0] == 1 if result else False
+        conn = await db.connection()
+        cursor = await conn.execute("SELECT 1")
+        result = await cursor.fetchone()
+        return result[0] == 1 if result else False
     except Exception as e:
-        logger.error(f"Ошибка подключения к базе данных: {e}")
+        logger.error("Ошибка подключения к базе данных: %s", e)
         return False
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Импорт броней из таблицы XLSX или CSV.
+
+Колонки — как в выгрузке «📤 Экспорт в Excel»: заголовки в первой строке,
+порядок любой, ID и «Дата брони» не используются. Файл читается
+построчно (XLSX — openpyxl в режиме read_only, CSV — модулем csv), разбор
+блокирующий: бот вызывает его в отдельном потоке. Каждая строка
+проверяется теми же правилами, что и шаги диалога бронирования
+(validators.py); проверку мест и вставку делает booking/bulk.py.
+"""
+import csv
+import io
+import os
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import validators
+
+# Колонки выгрузки (bot.admin_export_excel) и поле брони для каждой из них
+COLUMNS = (
+    ("ID", None),
+    ("Дата брони", None),
+    ("ID пользователя", 'user_id'),
+    ("Username", 'username'),
+    ("Школа", 'school_name'),
+    ("Класс", 'class_number'),
+    ("Профиль", 'class_profile'),
+    ("Дата экскурсии", 'excursion_date'),
+    ("Время", 'excursion_time'),
+    ("Сопровождающий", 'contact_person'),
+    ("Телефон", 'contact_phone'),
+    ("Количество", 'participants_count'),
+)
+HEADERS = [title for title, _ in COLUMNS]
+
+# Обязательные поля и их проверки (правила диалога бронирования)
+FIELD_VALIDATORS = {
+    'school_name': validators.school_name,
+    'class_number': validators.class_number,
+    'excursion_date': validators.excursion_date,
+    'excursion_time': validators.excursion_time,
+    'contact_person': validators.contact_person,
+    'contact_phone': validators.contact_phone,
+    'participants_count': validators.participants,
+}
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.csv')
+# Больше Bot API все равно не отдает боту (getFile)
+MAX_FILE_SIZE = 20 * 1024 * 1024
+MAX_ROWS = 50000
+
+
+class ParsedFile(NamedTuple):
+    """Результат разбора: брони, прошедшие проверку, и отклоненные строки"""
+    bookings: List[dict]
+    rows: List[int]                   # номер строки файла для каждой брони
+    problems: List[Tuple[int, str]]   # (номер строки, причина)
+    total: int                        # строк с данными
+
+
+def is_supported(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def _cell(value) -> str:
+    return '' if value is None else str(value).strip()
+
+
+def _csv_rows(data: bytes) -> Iterator[list]:
+    # Excel сохраняет CSV в UTF-8 с BOM или в cp1251 и с разделителем ';'
+    try:
+        data.decode('utf-8-sig')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'cp1251'
+    text = io.TextIOWrapper(io.BytesIO(data), encoding=encoding, newline='')
+    header = text.readline()
+    delimiter = ';' if header.count(';') >= header.count(',') else ','
+    text.seek(0)
+    yield from csv.reader(text, delimiter=delimiter)
+
+
+def _xlsx_rows(data: bytes) -> Iterator[tuple]:
+    # openpyxl нужен только здесь: импорт занимает ~100 мс при запуске бота
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_rows(data: bytes, filename: str) -> Iterator[tuple]:
+    """Строки таблицы по одной (первая — заголовки)"""
+    extension = os.path.splitext(filename.lower())[1]
+    if extension == '.xlsx':
+        return _xlsx_rows(data)
+    if extension == '.csv':
+        return _csv_rows(data)
+    raise ValueError("поддерживаются только файлы XLSX и CSV")
+
+
+def _column_indexes(header) -> dict:
+    """Номер колонки для каждого поля брони по заголовкам"""
+    fields = {title.casefold(): field for title, field in COLUMNS if field}
+    indexes = {}
+    for index, title in enumerate(header):
+        field = fields.get(_cell(title).casefold())
+        if field and field not in indexes:
+            indexes[field] = index
+    missing = [title for title, field in COLUMNS if field in FIELD_VALIDATORS and field not in indexes]
+    if missing:
+        raise ValueError(f"в первой строке нет колонок: {', '.join(missing)}")
+    return indexes
+
+
+def _user_id(value, default: int) -> int:
+    try:
+        return int(float(_cell(value)))
+    except (ValueError, OverflowError):
+        return default
+
+
+def read_bookings(data: bytes, filename: str, user_id: int, username: str) -> ParsedFile:
+    """
+    Разбирает и проверяет файл. Брони без ID пользователя и Username
+    записываются на импортирующего админа (user_id, username).
+    ValueError — файл не подходит целиком (формат, заголовки, размер).
+    """
+    rows = iter_rows(data, filename)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError("файл пустой")
+    indexes = _column_indexes(header)
+
+    bookings, booking_rows, problems = [], [], []
+    total = 0
+    for number, row in enumerate(rows, start=2):
+        if not any(_cell(value) for value in row):
+            continue
+        total += 1
+        if total > MAX_ROWS:
+            raise ValueError(f"в файле больше {MAX_ROWS} строк")
+
+        values = {field: row[index] if index < len(row) else None for field, index in indexes.items()}
+        booking, errors = {}, []
+        for field, validate in FIELD_VALIDATORS.items():
+            try:
+                booking[field] = validate(values[field])
+            except ValueError as e:
+                errors.append(str(e))
+        if errors:
+            problems.append((number, '; '.join(errors)))
+            continue
+        booking['class_profile'] = _cell(values.get('class_profile')) or None
+        booking['user_id'] = _user_id(values.get('user_id'), user_id)
+        booking['username'] = _cell(values.get('username')) or username
+        bookings.append(booking)
+        booking_rows.append(number)
+    return ParsedFile(bookings, booking_rows, problems, total)
+
+
+def report_csv(problems: List[Tuple[int, str]]) -> bytes:
+    """Отчет о непринятых строках для Excel (UTF-8 с BOM, разделитель ';')"""
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(["Строка", "Причина"])
+    writer.writerows(problems)
+    return buffer.getvalue().encode('utf-8')
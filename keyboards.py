@@ -1,5 +1,11 @@
+import functools
+
 from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
 
+# Постоянные клавиатуры строятся один раз: объекты telegram неизменяемы,
+# поэтому один экземпляр можно отправлять в любых ответах
+
+@functools.lru_cache(maxsize=None)
 def get_main_keyboard():
     """Основная клавиатура для меню"""
     keyboard = [
@@ -20,15 +26,21 @@ def get_time_keyboard(booked_times=None):
     keyboard = [available_times[i:i+3] for i in range(0, len(available_times), 3)]
     return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
 
+@functools.lru_cache(maxsize=None)
 def get_confirmation_keyboard():
     """Клавиатура для подтверждения"""
     keyboard = [["✅ Подтвердить", "❌ Отменить"]]
     return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
 
+@functools.lru_cache(maxsize=None)
 def get_weekday_keyboard():
     """Клавиатура для выбора дня недели"""
     keyboard = [
         ["Вторник", "Среда", "Четверг"],
         ["📅 Ввести другую дату"]
     ]
-    return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
\ No newline at end of file
+    return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+
+def build_static_keyboards():
+    """Заранее строит постоянные клавиатуры (прогрев при запуске бота)"""
+    return [get_main_keyboard(), get_confirmation_keyboard(), get_weekday_keyboard()]
\ No newline at end of file
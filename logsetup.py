@@ -0,0 +1,158 @@
+"""
+Неблокирующее логирование бота.
+
+Цикл событий только кладет запись в очередь (QueueHandler), а запись в файл
+и на консоль выполняет фоновый поток QueueListener. В файл пишутся строки
+JSON в UTF-8; файл ротируется по размеру и в полночь, старые части сжимаются
+gzip. Токен бота вырезается из всех сообщений (httpx логирует URL запросов
+вида https://api.telegram.org/bot<токен>/getUpdates).
+"""
+import atexit
+import copy
+import datetime
+import glob
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+from typing import Optional
+
+CONSOLE_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Стандартные атрибуты LogRecord — все остальные считаются полями из extra
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RedactingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который вырезает секреты из готового сообщения и трассировки"""
+
+    def __init__(self, log_queue, secrets=()):
+        super().__init__(log_queue)
+        self.secrets = [secret for secret in secrets if secret]
+
+    def _redact(self, text: str) -> str:
+        for secret in self.secrets:
+            if secret in text:
+                text = text.replace(secret, '***')
+        return text
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # В отличие от QueueHandler.prepare трассировка не вклеивается в
+        # сообщение: она уходит текстом в exc_text (поле exception в JSON),
+        # а объект traceback с кадрами стека в поток записи не передается
+        record = copy.copy(record)
+        record.msg = self._redact(record.getMessage())
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        if record.exc_text:
+            record.exc_text = self._redact(record.exc_text)
+        if record.stack_info:
+            record.stack_info = self._redact(record.stack_info)
+        return record
+
+
+class CompressingRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    Ротация по размеру и по смене суток. Закрытый файл переименовывается
+    в bot.log.ГГГГММДД-ЧЧММСС и сжимается в .gz, хранится backup_count частей.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 14):
+        super().__init__(filename, 'a', encoding='utf-8', delay=False)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rollover_at = self._next_midnight()
+
+    @staticmethod
+    def _next_midnight() -> float:
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        return datetime.datetime.combine(tomorrow, datetime.time()).timestamp()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if time.time() >= self.rollover_at:
+            return True
+        if self.stream is None:
+            self.stream = self._open()
+        return bool(self.max_bytes) and self.stream.tell() >= self.max_bytes
+
+    def doRollover(self) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            rotated = f'{self.baseFilename}.{stamp}'
+            suffix = 1
+            while os.path.exists(rotated + '.gz'):
+                rotated = f'{self.baseFilename}.{stamp}-{suffix}'
+                suffix += 1
+            os.rename(self.baseFilename, rotated)
+            with open(rotated, 'rb') as src, gzip.open(rotated + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+            self._remove_old()
+
+        self.stream = self._open()
+        self.rollover_at = self._next_midnight()
+
+    def _remove_old(self) -> None:
+        parts = sorted(glob.glob(glob.escape(self.baseFilename) + '.*.gz'), key=os.path.getmtime)
+        for path in parts[:max(0, len(parts) - self.backup_count)]:
+            os.remove(path)
+
+
+def setup_logging(log_file: str, level: str = 'INFO', max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 14, secrets=()) -> logging.handlers.QueueListener:
+    """Настраивает корневой логгер и запускает фоновый поток записи"""
+    file_handler = CompressingRotatingFileHandler(log_file, max_bytes, backup_count)
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(RedactingQueueHandler(log_queue, secrets))
+    root.setLevel(level)
+
+    listener.start()
+    # Дописываем очередь при выходе из процесса
+    atexit.register(stop_logging, listener)
+    return listener
+
+
+def stop_logging(listener: Optional[logging.handlers.QueueListener]) -> None:
+    """Останавливает фоновый поток, дописав все записи из очереди"""
+    if listener is not None and listener._thread is not None:
+        listener.stop()
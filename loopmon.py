@@ -0,0 +1,137 @@
+"""
+Монитор задержек цикла событий.
+
+Фоновая задача каждые interval секунд засыпает и замеряет, насколько позже
+она проснулась: это и есть задержка планирования (loop lag). Отдельный поток
+следит за «пульсом» этой задачи. Если цикл не отвечает дольше порога, поток
+снимает стек потока цикла событий — так видно, какой синхронный вызов
+(openpyxl, json, запись в файл и т.п.) и в каком обработчике блокирует бота.
+"""
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Deque, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = metrics.Histogram(
+    'bot_event_loop_lag_seconds', 'Задержка планирования цикла событий',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_BLOCKED = metrics.Counter(
+    'bot_event_loop_blocked_total', 'Случаи блокировки цикла дольше порога', ('handler',))
+
+# Сколько кадров стека сохранять для одного случая блокировки
+STACK_DEPTH = 15
+
+
+class BlockingEvent:
+    """Один случай блокировки цикла"""
+    __slots__ = ('started_at', 'duration', 'handler', 'stack')
+
+    def __init__(self, started_at: float, duration: float, handler: Optional[str], stack: List[str]):
+        self.started_at = started_at
+        self.duration = duration
+        self.handler = handler
+        self.stack = stack
+
+
+class LoopLagMonitor:
+    """Замеряет задержку цикла и ловит блокирующие вызовы"""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, history: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.events: Deque[BlockingEvent] = collections.deque(maxlen=history)
+        self.max_lag = 0.0
+
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._current_event: Optional[BlockingEvent] = None
+
+    def start(self) -> None:
+        """Запускает замеры в текущем цикле событий"""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info("Монитор задержек цикла запущен (порог %.0f мс)", self.threshold * 1000)
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._heartbeat = time.monotonic()
+
+            LOOP_LAG.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+
+            # Цикл снова отвечает — фиксируем итоговую длительность блокировки
+            event = self._current_event
+            if event is not None:
+                event.duration = lag
+                self._current_event = None
+                logger.warning(
+                    "Цикл событий был заблокирован %.0f мс (обработчик: %s): %s",
+                    lag * 1000, event.handler or 'неизвестен', event.stack[-1].strip() if event.stack else ''
+                )
+
+    def _watch(self) -> None:
+        """Поток-сторож: снимает стек, если цикл не отвечает дольше порога"""
+        check_every = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(check_every):
+            stalled = time.monotonic() - self._heartbeat - self.interval
+            if stalled < self.threshold or self._current_event is not None:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame)[-STACK_DEPTH:]
+            handler = metrics.current_handler
+
+            event = BlockingEvent(time.time(), stalled, handler, stack)
+            self._current_event = event
+            self.events.append(event)
+            LOOP_BLOCKED.inc(handler=handler or 'unknown')
+
+    def report(self, limit: int = 5) -> str:
+        """Текстовый отчет для админ-команды"""
+        lines = [
+            f"Порог: {self.threshold * 1000:.0f} мс, максимум задержки: {self.max_lag * 1000:.0f} мс",
+            f"Случаев блокировки: {len(self.events)}",
+        ]
+        for event in list(self.events)[-limit:]:
+            when = time.strftime('%H:%M:%S', time.localtime(event.started_at))
+            lines.append("")
+            lines.append(f"{when} — {event.duration * 1000:.0f} мс, обработчик: {event.handler or 'неизвестен'}")
+            # Последние кадры — самое интересное: там синхронный вызов
+            for frame_text in event.stack[-4:]:
+                lines.append(frame_text.rstrip())
+        return "\n".join(lines)
+
+
+# Глобальный монитор процесса бота
+monitor = LoopLagMonitor()
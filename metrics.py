@@ -0,0 +1,331 @@
+"""
+Встроенные метрики бота в формате Prometheus.
+
+Замеры копятся в памяти (несколько сложений на вызов), текст для Prometheus
+формируется только при запросе /metrics. HTTP-сервер слушает локальный
+адрес внутри процесса бота:
+    curl http://127.0.0.1:9108/metrics
+"""
+import asyncio
+import bisect
+import contextlib
+import functools
+import inspect
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунд
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Все метрики процесса
+REGISTRY: List['Metric'] = []
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metric:
+    """Базовый класс метрики с метками"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return lines
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+                for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """Текущее значение; callback вызывается только при чтении метрик"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                self._values[()] = self.callback()
+            except Exception as e:
+                logger.warning("Не удалось получить значение метрики %s: %s", self.name, e)
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}'
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными корзинами"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Для каждой комбинации меток: [счетчики корзин..., +Inf], сумма
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        data = self._values.get(key)
+        if data is None:
+            data = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        data[0][bisect.bisect_left(self.buckets, value)] += 1
+        data[1] += value
+
+    def samples(self):
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            cumulative += counts[-1]
+            bucket_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ==================== МЕТРИКИ БОТА ====================
+
+HANDLER_LATENCY = Histogram(
+    'bot_handler_duration_seconds', 'Время работы обработчика', ('handler',))
+HANDLER_ERRORS = Counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках', ('handler',))
+HANDLERS_IN_PROGRESS = Gauge(
+    'bot_handlers_in_progress', 'Обработчики, выполняющиеся прямо сейчас')
+DB_LATENCY = Histogram(
+    'bot_db_query_duration_seconds', 'Время выполнения метода Database', ('method',))
+DB_ERRORS = Counter(
+    'bot_db_errors_total', 'Исключения в методах Database', ('method',))
+TELEGRAM_LATENCY = Histogram(
+    'bot_telegram_api_duration_seconds', 'Время запроса к Telegram Bot API', ('method',),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+TELEGRAM_ERRORS = Counter(
+    'bot_telegram_api_errors_total', 'Ошибки запросов к Telegram Bot API', ('method',))
+UPDATE_QUEUE_DEPTH = Gauge(
+    'bot_update_queue_depth', 'Необработанные обновления в очереди Application')
+
+# Имя обработчика, который выполняется сейчас (для монитора задержек цикла)
+current_handler: Optional[str] = None
+
+
+def track_handler(func):
+    """Декоратор: замеряет время обработчика Telegram и считает ошибки"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        global current_handler
+        previous = current_handler
+        current_handler = name
+        HANDLERS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, handler=name)
+            HANDLERS_IN_PROGRESS.dec()
+            current_handler = previous
+
+    return wrapper
+
+
+def _track_db_method(func, name):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            DB_ERRORS.inc(method=name)
+            raise
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - started, method=name)
+
+    return wrapper
+
+
+def _track_db_generator(func, name):
+    # Замеряется только время внутри генератора (чтение пачек строк),
+    # обработка строк вызывающим кодом в него не входит
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        rows = func(*args, **kwargs)
+        spent = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    row = await rows.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception:
+                    DB_ERRORS.inc(method=name)
+                    raise
+                finally:
+                    spent += time.perf_counter() - started
+                yield row
+        finally:
+            await rows.aclose()
+            DB_LATENCY.observe(spent, method=name)
+
+    return wrapper
+
+
+def _track_db_context(func, name):
+    # Замеряется вход в блок (ожидание очереди и начало транзакции);
+    # запросы внутри блока замеряются своими методами
+    @functools.wraps(func)
+    @contextlib.asynccontextmanager
+    async def wrapper(*args, **kwargs):
+        async with contextlib.AsyncExitStack() as stack:
+            started = time.perf_counter()
+            try:
+                value = await stack.enter_async_context(func(*args, **kwargs))
+            except Exception:
+                DB_ERRORS.inc(method=name)
+                raise
+            finally:
+                DB_LATENCY.observe(time.perf_counter() - started, method=name)
+            yield value
+
+    return wrapper
+
+
+# Служебные методы, которые не являются запросами
+_DB_SKIP_METHODS = {'connection', 'close'}
+
+
+def track_db_methods(cls):
+    """
+    Декоратор класса: замеряет все публичные асинхронные методы (включая
+    унаследованные), асинхронные генераторы (iter_*) и асинхронные
+    контекстные менеджеры (snapshot)
+    """
+    for name in dir(cls):
+        if name.startswith('_') or name in _DB_SKIP_METHODS:
+            continue
+        attr = getattr(cls, name)
+        if inspect.iscoroutinefunction(attr):
+            setattr(cls, name, _track_db_method(attr, name))
+        elif inspect.isasyncgenfunction(attr):
+            setattr(cls, name, _track_db_generator(attr, name))
+        elif inspect.isasyncgenfunction(getattr(attr, '__wrapped__', None)):
+            # @contextlib.asynccontextmanager: __wrapped__ — исходный генератор
+            setattr(cls, name, _track_db_context(attr, name))
+    return cls
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, который замеряет время каждого вызова Bot API"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            TELEGRAM_ERRORS.inc(method=api_method)
+            raise
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - started, method=api_method)
+
+
+# ==================== HTTP-СЕРВЕР ====================
+
+async def _handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки запроса не нужны, просто дочитываем их
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if not line or line in (b'\r\n', b'\n'):
+                break
+
+        parts = request_line.decode('latin-1').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+            status, content_type, body = '200 OK', 'text/plain; version=0.0.4; charset=utf-8', render().encode('utf-8')
+        else:
+            status, content_type, body = '404 Not Found', 'text/plain; charset=utf-8', b'Not Found\n'
+
+        writer.write(
+            f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int) -> asyncio.AbstractServer:
+    """Запускает HTTP-сервер с /metrics в текущем цикле событий"""
+    server = await asyncio.start_server(_handle_client, host, port)
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return server
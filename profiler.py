@@ -0,0 +1,210 @@
+"""
+Сэмплирующий профилировщик для живого процесса бота.
+
+Отдельный поток раз в interval секунд снимает стеки всех потоков через
+sys._current_frames() — сам код бота при этом не трассируется, поэтому
+накладные расходы не зависят от нагрузки и профилировщик можно включать
+в пик записи. Стеки потока цикла событий группируются по обработчику
+(по кадру обертки metrics.track_handler на стеке).
+
+Результат:
+  - collapsed stacks (по строке на стек: «кадр;кадр;кадр N») — формат
+    для flamegraph.pl, speedscope и inferno;
+  - сводка pstats по собственному и суммарному времени функций.
+"""
+import collections
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+# Частота опроса по умолчанию: 100 раз в секунду
+DEFAULT_INTERVAL = 0.01
+# Ограничение длительности одного запуска, секунд
+MAX_DURATION = 300
+
+# Ключ функции в формате pstats: (файл, строка, имя)
+FuncKey = Tuple[str, int, str]
+
+# Функции, в которых поток простаивает (ждет событий, блокировки, задачи)
+_IDLE_FUNCTIONS = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('queue.py', 'get'),
+}
+
+
+async def _noop():
+    pass
+
+
+# Код обертки track_handler общий для всех обработчиков: по нему на стеке
+# находим кадр обработчика
+_HANDLER_WRAPPER_CODE = metrics.track_handler(_noop).__code__
+
+
+def _func_key(code) -> FuncKey:
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def _frame_label(key: FuncKey) -> str:
+    filename, lineno, name = key
+    return f'{name} ({os.path.basename(filename)}:{lineno})'
+
+
+def _is_idle(code) -> bool:
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FUNCTIONS
+
+
+class _SampleStats:
+    """Объект, который pstats.Stats принимает вместо cProfile.Profile"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class SamplingProfiler:
+    """Снимает стеки потоков с заданной частотой и агрегирует их"""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        # Стек от внешнего кадра к внутреннему -> число попаданий
+        self.stacks: Dict[Tuple[str, Tuple[FuncKey, ...]], int] = collections.Counter()
+
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, loop_thread_id: Optional[int] = None) -> None:
+        """Запускает опрос; loop_thread_id — поток цикла событий (по умолчанию текущий)"""
+        self._loop_thread_id = loop_thread_id or threading.get_ident()
+        self._stopped.clear()
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.started_at is not None:
+            self.duration = time.monotonic() - self.started_at
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            # Имена потоков обновляем только при появлении новых: threading.enumerate() не бесплатен
+            if not thread_names.keys() >= frames.keys():
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in frames.items():
+                if thread_id != own_id:
+                    self._record(thread_id, frame, thread_names)
+            self.samples += 1
+
+    def _record(self, thread_id: int, frame, thread_names: Dict[int, str]) -> None:
+        is_loop = thread_id == self._loop_thread_id
+        if _is_idle(frame.f_code):
+            # Простой фоновых потоков не интересен, простой цикла — показатель запаса
+            if is_loop:
+                self.stacks['<простой>', ()] += 1
+            return
+
+        keys = []
+        handler = None
+        inner_code = None
+        while frame is not None:
+            code = frame.f_code
+            if is_loop and handler is None and code is _HANDLER_WRAPPER_CODE and inner_code is not None:
+                handler = inner_code.co_name
+            keys.append(_func_key(code))
+            inner_code = code
+            frame = frame.f_back
+        keys.reverse()
+
+        if is_loop:
+            root = handler or '<цикл событий>'
+        else:
+            root = f'<поток {thread_names.get(thread_id, thread_id)}>'
+        self.stacks[root, tuple(keys)] += 1
+
+    def collapsed(self) -> str:
+        """Стеки в формате collapsed stacks для построения flamegraph"""
+        lines = []
+        for (root, keys), count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+            labels = [root] + [_frame_label(key) for key in keys]
+            lines.append(f"{';'.join(label.replace(';', ',') for label in labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def handler_totals(self) -> List[Tuple[str, int]]:
+        """Число попаданий по обработчикам (и потокам), по убыванию"""
+        totals = collections.Counter()
+        for (root, _), count in self.stacks.items():
+            totals[root] += count
+        return totals.most_common()
+
+    def pstats(self) -> pstats.Stats:
+        """
+        Переводит сэмплы в pstats.Stats: собственное время — попадания
+        функции на вершину стека, суммарное — попадания в любое место стека.
+        Время оценивается как число попаданий, умноженное на интервал.
+        """
+        raw: Dict[FuncKey, list] = {}
+        for (_, keys), count in self.stacks.items():
+            if not keys:
+                continue
+            elapsed = count * self.interval
+            seen = set()
+            for index, key in enumerate(keys):
+                entry = raw.setdefault(key, [0, 0, 0.0, 0.0, {}])
+                if key not in seen:
+                    seen.add(key)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += elapsed
+                if index:
+                    caller = keys[index - 1]
+                    cc, nc, tt, ct = entry[4].get(caller, (0, 0, 0.0, 0.0))
+                    entry[4][caller] = (cc + count, nc + count, tt, ct + elapsed)
+            raw[keys[-1]][2] += elapsed
+
+        stats = {key: (cc, nc, tt, ct, callers) for key, (cc, nc, tt, ct, callers) in raw.items()}
+        return pstats.Stats(_SampleStats(stats))
+
+    def summary(self, top: int = 30) -> str:
+        """Текстовая сводка: обработчики и топ функций по pstats"""
+        out = io.StringIO()
+        out.write(f"Длительность: {self.duration:.1f} с, сэмплов: {self.samples}, "
+                  f"интервал: {self.interval * 1000:.0f} мс\n\n")
+        out.write("Попадания по обработчикам и потокам:\n")
+        total = sum(self.stacks.values()) or 1
+        for root, count in self.handler_totals():
+            out.write(f"  {count:8d}  {count * 100 / total:5.1f}%  {root}\n")
+
+        stats = self.pstats()
+        stats.stream = out
+        out.write(f"\nТоп-{top} по собственному времени:\n")
+        stats.sort_stats('tottime').print_stats(top)
+        out.write(f"\nТоп-{top} по суммарному времени:\n")
+        stats.sort_stats('cumulative').print_stats(top)
+        return out.getvalue()
+
+
+# Профилировщик, запущенный админ-командой (не больше одного одновременно)
+active: Optional[SamplingProfiler] = None
@@ -0,0 +1,156 @@
+"""
+Защита от флуда и сброс нагрузки.
+
+Обработчик (TypeHandler) видит каждое обновление раньше диалогов:
+  - у каждого пользователя свое «ведро токенов»: burst сообщений подряд,
+    дальше rate сообщений в секунду. Лишние обновления отбрасываются
+    до запуска обработчиков, пользователь получает одно предупреждение;
+  - обновления обрабатываются последовательно, поэтому общая нагрузка —
+    это очередь еще не обработанных обновлений. Выше shed_depth
+    отбрасываются второстепенные запросы (статистика, выгрузки, /debug),
+    выше max_depth — все, кроме ответов на подтверждение брони.
+
+На пользователя хранится три значения; ведра, которые успели снова
+наполниться, ничем не отличаются от новых и удаляются при очистке.
+"""
+import logging
+import time
+from typing import Dict, Optional
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+UPDATES_DROPPED = metrics.Counter(
+    'bot_updates_dropped_total', 'Обновления, отброшенные до обработчиков', ('reason',))
+FLOOD_TRACKED_USERS = metrics.Gauge(
+    'bot_flood_tracked_users', 'Пользователи в таблице защиты от флуда')
+
+# Приоритеты обновлений
+CRITICAL, NORMAL, LOW = 0, 1, 2
+
+# Ответы на подтверждение брони: диалог почти завершен, их не сбрасываем
+CRITICAL_TEXTS = frozenset({"✅ Подтвердить", "❌ Отмена"})
+# Тяжелые и необязательные запросы админов сбрасываются первыми
+LOW_PRIORITY_TEXTS = frozenset({
+    "📊 Статистика", "📋 Все бронирования", "📅 Занятые даты", "📤 Экспорт в Excel",
+    "📥 Импорт броней",
+})
+LOW_PRIORITY_COMMANDS = frozenset({
+    'debug', 'loop', 'profile', 'startup', 'stats', 'export', 'import', 'archive', 'maintenance', 'backup',
+})
+
+FLOOD_MESSAGE = "⏳ Слишком много сообщений. Подождите несколько секунд и повторите."
+OVERLOAD_MESSAGE = "⚠️ Бот сейчас перегружен. Повторите запрос через минуту."
+
+
+def priority(update: Update) -> int:
+    """Приоритет обновления по тексту сообщения"""
+    message = update.effective_message
+    text = (message.text or '').strip() if message else ''
+    if text in CRITICAL_TEXTS:
+        return CRITICAL
+    if text in LOW_PRIORITY_TEXTS:
+        return LOW
+    if text.startswith('/'):
+        command = text[1:].split(maxsplit=1)[0].split('@', 1)[0] if len(text) > 1 else ''
+        if command in LOW_PRIORITY_COMMANDS:
+            return LOW
+    return NORMAL
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'stamp', 'warned')
+
+    def __init__(self, tokens: float, stamp: float):
+        self.tokens = tokens
+        self.stamp = stamp
+        self.warned = False
+
+
+class FloodGuard:
+    """Ведра токенов по пользователям и сброс нагрузки по глубине очереди"""
+
+    def __init__(self, rate: float = 1.0, burst: int = 10,
+                 shed_depth: int = 50, max_depth: int = 200, sweep_interval: float = 60.0):
+        self.rate = rate
+        self.burst = burst
+        self.shed_depth = shed_depth
+        self.max_depth = max_depth
+        self.sweep_interval = sweep_interval
+        self._buckets: Dict[int, _Bucket] = {}
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def allow(self, user_id: int, now: Optional[float] = None) -> bool:
+        """Забирает токен из ведра пользователя; False — сообщение лишнее"""
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = _Bucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.stamp) * self.rate)
+            bucket.stamp = now
+
+        if bucket.tokens < 1:
+            return False
+        bucket.tokens -= 1
+        bucket.warned = False
+        return True
+
+    def sweep(self, now: Optional[float] = None) -> None:
+        """Удаляет ведра, которые успели наполниться (пользователь затих)"""
+        if now is None:
+            now = time.monotonic()
+        full_after = self.burst / self.rate
+        idle = [user_id for user_id, bucket in self._buckets.items()
+                if now - bucket.stamp >= full_after]
+        for user_id in idle:
+            del self._buckets[user_id]
+        self._last_sweep = now
+
+    def overloaded(self, level: int, depth: int) -> bool:
+        """Нужно ли сбросить обновление с приоритетом level при такой очереди"""
+        if level == CRITICAL:
+            return False
+        if level == LOW:
+            return depth >= self.shed_depth
+        return depth >= self.max_depth
+
+    async def check(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Обработчик для TypeHandler: ApplicationHandlerStop отменяет обработку"""
+        user = update.effective_user
+        if user is None:
+            return
+
+        if self.overloaded(priority(update), context.application.update_queue.qsize()):
+            UPDATES_DROPPED.inc(reason='overload')
+            await self._reply(update, OVERLOAD_MESSAGE)
+            raise ApplicationHandlerStop
+
+        if not self.allow(user.id):
+            UPDATES_DROPPED.inc(reason='flood')
+            bucket = self._buckets[user.id]
+            if not bucket.warned:
+                bucket.warned = True
+                logger.warning("Флуд от пользователя %s, сообщения отбрасываются", user.id)
+                await self._reply(update, FLOOD_MESSAGE)
+            raise ApplicationHandlerStop
+
+    @staticmethod
+    async def _reply(update: Update, text: str) -> None:
+        if update.effective_message is None:
+            return
+        try:
+            await update.effective_message.reply_text(text)
+        except Exception as e:
+            logger.warning("Не удалось отправить предупреждение: %s", e)
@@ -0,0 +1,173 @@
+"""
+Запись входящих обновлений для воспроизведения (bench/replay.py).
+
+Обновления обезличиваются и дописываются в сжатый JSONL (gzip, по строке
+на обновление). Цикл событий только кладет запись в очередь, сжатие и
+запись в файл выполняет фоновый поток.
+
+Обезличивание:
+  - id пользователей и чатов заменяются стабильным HMAC-хешем (одна соль —
+    один и тот же псевдо-id, диалоги не рассыпаются);
+  - имена и username заменяются на псевдонимы;
+  - в тексте цифры телефонов и длинных чисел и буквы свободного текста
+    заменяются детерминированно, с сохранением длины, регистра и алфавита,
+    поэтому проверки бота (класс, ФИО из двух слов, формат телефона) проходят
+    так же. Как есть сохраняются только команды (без аргументов), подписи
+    кнопок клавиатур бота, даты, время и короткие числа.
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Псевдо-id не пересекаются с настоящими id Telegram
+PSEUDO_ID_BASE = 9 * 10 ** 12
+
+_KEEP_PATTERNS = [
+    re.compile(r'^\d{1,2}[./]\d{1,2}[./]\d{4}$'),   # дата ДД.ММ.ГГГГ
+    re.compile(r'^\d{4}-\d{2}-\d{2}$'),             # дата ГГГГ-ММ-ДД
+    re.compile(r'^\d{1,2}:\d{2}$'),                 # время
+    re.compile(r'^\d{1,3}$'),                       # число участников, секунды
+    re.compile(r'^[1-9][0-9]?[А-Яа-яA-Za-z]?$'),    # класс
+]
+# Телефон (код +7, 8 или 7 сохраняется, чтобы проверка формата проходила)
+# или другое длинное число, например телефон без кода «(495) 123-45-67»
+_NUMBER = re.compile(r'(?P<code>\+7|8|7)(?P<rest>[\d\s\-()]{10,})|\(?\d[\d\s\-()]{5,}\d')
+
+_LOWER = {
+    'cyr': 'абвгдежзийклмнопрстуфхцчшщыэюя',
+    'lat': 'abcdefghijklmnopqrstuvwxyz',
+}
+
+
+class Anonymizer:
+    """Детерминированное обезличивание на основе секретной соли"""
+
+    def __init__(self, salt: str, buttons: Iterable[str] = ()):
+        self.key = salt.encode('utf-8')
+        # Подписи кнопок клавиатур бота: в тексте нет личных данных
+        self.buttons = frozenset(buttons)
+
+    def _digest(self, value: str) -> bytes:
+        return hmac.new(self.key, value.encode('utf-8'), hashlib.sha256).digest()
+
+    def user_id(self, user_id: int) -> int:
+        return PSEUDO_ID_BASE + int.from_bytes(self._digest(f'id:{user_id}')[:5], 'big')
+
+    def text(self, text: str) -> str:
+        stripped = text.strip()
+        if stripped in self.buttons:
+            return text
+        # Команда — как есть, ее аргументы (поиск, текст рассылки) обезличиваются
+        if stripped.startswith('/'):
+            command, space, arguments = stripped.partition(' ')
+            return command + space + self.text(arguments)
+        if not stripped or any(pattern.match(stripped) for pattern in _KEEP_PATTERNS):
+            return text
+        text = _NUMBER.sub(self._number, text)
+        return re.sub(r'[^\W\d_]+', lambda m: self._word(m.group(0)), text)
+
+    def _number(self, match: re.Match) -> str:
+        if match.group('code'):
+            return match.group('code') + self._digits(match.group('rest'))
+        return self._digits(match.group(0))
+
+    def _digits(self, value: str) -> str:
+        digest = self._digest('tel:' + value)
+        digits = iter(str(int.from_bytes(digest, 'big')))
+        return ''.join(next(digits) if ch.isdigit() else ch for ch in value)
+
+    def _word(self, word: str) -> str:
+        digest = self._digest('w:' + word.lower())
+        result = []
+        for index, ch in enumerate(word):
+            alphabet = _LOWER['cyr'] if ch.lower() in _LOWER['cyr'] else _LOWER['lat']
+            if ch.lower() not in alphabet:
+                result.append(ch)
+                continue
+            new = alphabet[digest[index % len(digest)] % len(alphabet)]
+            result.append(new.upper() if ch.isupper() else new)
+        return ''.join(result)
+
+    def update(self, data: dict) -> dict:
+        """Обезличивает словарь обновления (Update.to_dict()) на месте"""
+        message = data.get('message') or data.get('edited_message')
+        if message:
+            for key in ('from', 'chat'):
+                entity = message.get(key)
+                if not entity:
+                    continue
+                entity['id'] = self.user_id(entity['id'])
+                if 'first_name' in entity:
+                    entity['first_name'] = 'Пользователь'
+                for field in ('last_name', 'username'):
+                    entity.pop(field, None)
+            for field in ('text', 'caption'):
+                if message.get(field):
+                    message[field] = self.text(message[field])
+            # Вложения и контакты для нагрузки не нужны
+            for field in ('contact', 'document', 'photo', 'location', 'reply_to_message'):
+                message.pop(field, None)
+        return data
+
+
+class UpdateRecorder:
+    """Обработчик отдельной группы (до диалогов): копирует каждое обновление в файл и не мешает остальным"""
+
+    def __init__(self, path: str, salt: str, is_admin: Optional[Callable[[int], bool]] = None,
+                 buttons: Iterable[str] = ()):
+        self.path = path
+        self.anonymizer = Anonymizer(salt, buttons)
+        self.is_admin = is_admin
+        self.recorded = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._write, name='update-recorder', daemon=True)
+        self._thread.start()
+        logger.info("Запись обновлений в %s", self.path)
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    async def record(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user = update.effective_user
+        self._queue.put({
+            'time': time.time(),
+            'admin': bool(user and self.is_admin and self.is_admin(user.id)),
+            'update': update.to_dict(),
+        })
+
+    def _write(self) -> None:
+        # Каждый запуск дописывает новый gzip-member, gzip.open читает их подряд.
+        # flush() после каждой пачки: при аварийной остановке теряется только
+        # незавершенный хвост, bench/replay.py читает файл до него
+        with gzip.open(self.path, 'at', encoding='utf-8') as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                try:
+                    item['update'] = self.anonymizer.update(item['update'])
+                    f.write(json.dumps(item, ensure_ascii=False) + '\n')
+                    self.recorded += 1
+                except Exception as e:
+                    logger.error("Ошибка записи обновления: %s", e)
+                # Сбрасываем буфер, когда очередь опустела
+                if self._queue.empty():
+                    f.flush()
@@ -0,0 +1,103 @@
+"""
+Плановое обслуживание базы в тихие часы (JobQueue бота).
+
+Раз в сутки по очереди выполняются задачи: перенос прошедших экскурсий
+в архив, PRAGMA optimize, инкрементальная очистка, усечение WAL и
+резервная копия. Время
+каждой задачи попадает в метрики. Во время наплыва бронирований (очередь
+обновлений не пуста или за последние минуты создано много броней)
+обслуживание не начинается и повторяется позже.
+"""
+import asyncio
+import logging
+import time
+from datetime import time as dt_time
+from typing import Awaitable, Callable, List, Tuple
+
+from telegram.ext import Application, ContextTypes, JobQueue
+
+import metrics
+from booking import backup, maintenance
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_DURATION = metrics.Histogram(
+    'bot_maintenance_duration_seconds', 'Время задачи обслуживания базы', ('job',),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+MAINTENANCE_RUNS = metrics.Counter(
+    'bot_maintenance_runs_total', 'Запуски задач обслуживания', ('job', 'result'))
+
+# Повтор отложенного обслуживания: через 10 минут, не больше 6 раз за ночь
+RETRY_DELAY = 600
+MAX_RETRIES = 6
+
+
+class MaintenanceScheduler:
+    """Ночное обслуживание базы бота"""
+
+    def __init__(self, database, archive_keep_days: int = 0,
+                 burst_bookings: int = 5, burst_minutes: int = 10,
+                 backup_dir: str = '', backup_keep: int = backup.KEEP_BACKUPS):
+        self.db = database
+        self.archive_keep_days = archive_keep_days
+        self.backup_dir = backup_dir
+        self.backup_keep = backup_keep
+        self.burst_bookings = burst_bookings
+        self.burst_minutes = burst_minutes
+
+    def jobs(self) -> List[Tuple[str, Callable[[], Awaitable]]]:
+        path = self.db.db_path
+        jobs = [
+            ('archive', lambda: self.db.archive_past(self.archive_keep_days)),
+            ('optimize', lambda: maintenance.optimize(path)),
+            ('vacuum', lambda: maintenance.incremental_vacuum(path)),
+            ('checkpoint', lambda: maintenance.checkpoint(path)),
+        ]
+        if self.backup_dir:
+            jobs.append(('backup', self.backup))
+        return jobs
+
+    async def backup(self) -> str:
+        """Резервная копия в отдельном потоке (копирование, проверка и сжатие блокирующие)"""
+        return await asyncio.to_thread(backup.backup, self.db.db_path, self.backup_dir, keep=self.backup_keep)
+
+    def schedule(self, job_queue: JobQueue, at: dt_time) -> None:
+        job_queue.run_daily(self.run, at, name='maintenance')
+        logger.info("Обслуживание базы запланировано на %s", at.strftime('%H:%M'))
+
+    async def busy(self, application: Application) -> bool:
+        """Идет ли сейчас наплыв бронирований"""
+        if application.update_queue.qsize():
+            return True
+        return await self.db.recent_bookings(self.burst_minutes) >= self.burst_bookings
+
+    async def run_jobs(self) -> List[Tuple[str, float, str]]:
+        """Выполняет все задачи; результат — (задача, секунды, итог)"""
+        results = []
+        for name, job in self.jobs():
+            started = time.perf_counter()
+            try:
+                outcome = await job()
+                result = 'ok'
+            except Exception as e:
+                logger.error("Ошибка обслуживания базы (%s): %s", name, e)
+                outcome, result = e, 'error'
+            elapsed = time.perf_counter() - started
+            MAINTENANCE_DURATION.observe(elapsed, job=name)
+            MAINTENANCE_RUNS.inc(job=name, result=result)
+            logger.info("Обслуживание базы: %s за %.3f с (%s)", name, elapsed, outcome)
+            results.append((name, elapsed, result))
+        return results
+
+    async def run(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Задача JobQueue; при наплыве бронирований переносится на RETRY_DELAY"""
+        retries = context.job.data or 0
+        if await self.busy(context.application):
+            MAINTENANCE_RUNS.inc(job='all', result='skipped')
+            if retries < MAX_RETRIES:
+                logger.info("Идут бронирования, обслуживание базы отложено на %s с", RETRY_DELAY)
+                context.job_queue.run_once(self.run, RETRY_DELAY, data=retries + 1, name='maintenance-retry')
+            else:
+                logger.warning("Обслуживание базы пропущено: бронирования шли всю ночь")
+            return
+        await self.run_jobs()
@@ -1,11 +1,28 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, Response, stream_with_context
 import sqlite3
+import csv
+import io
 from datetime import datetime, timedelta, date
 import os
+import sys
 import calendar
 
+# Общий с ботом пакет booking лежит в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking import BookingService, DB_PATH, SLOTS_PER_DAY, connect, read_snapshot, to_day, to_minute
+from booking.dates import row_factory as booking_row
+from booking.schools import school_key
+from booking.search import match_query, search_sql
+
+from assets import init_assets
+from events import AvailabilityBroadcaster
+
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here'
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+
+# Статика с хешем в имени и сжатыми вариантами (asset_url в шаблонах)
+init_assets(app)
 
 # Русские названия месяцев
 RUSSIAN_MONTHS = [
@@ -17,55 +34,63 @@ RUSSIAN_MONTHS = [
 RUSSIAN_WEEKDAYS_SHORT = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
 RUSSIAN_WEEKDAYS_FULL = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
 
+# Время начала экскурсии, которое можно выбрать на сайте
+EXCURSION_TIMES = ['10:00', '11:00', '12:00', '13:00', '14:00', '15:00']
+
+# user_id для записей с сайта (у них нет Telegram-пользователя)
+SITE_USER_ID = 0
+
+# Количество записей на одной странице админ-панели
+ADMIN_PAGE_SIZE = 50
+
+# Размер пачки строк при выгрузке CSV
+CSV_BATCH_SIZE = 500
+
+# Колонки выгрузки CSV (порядок как в таблице админ-панели)
+CSV_COLUMNS = [
+    ('id', 'ID'),
+    ('excursion_date', 'Дата экскурсии'),
+    ('school_name', 'Школа'),
+    ('class_number', 'Класс'),
+    ('class_profile', 'Профиль'),
+    ('contact_person', 'Контактное лицо'),
+    ('contact_phone', 'Телефон'),
+    ('participants_count', 'Участников'),
+    ('username', 'Username'),
+    ('booking_date', 'Дата записи'),
+]
+
 def get_db_connection():
-    """Создает подключение к базе данных"""
-    os.makedirs('instance', exist_ok=True)
-    conn = sqlite3.connect('instance/bookings.db')
+    """Создает подключение к базе данных (с общими настройками пакета booking)"""
+    conn = connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
 def init_database():
-    """Создает таблицу если она не существует"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            username TEXT,
-            school_name TEXT NOT NULL,
-            class_number TEXT NOT NULL,
-            class_profile TEXT,
-            excursion_date TEXT NOT NULL,
-            contact_person TEXT NOT NULL,
-            contact_phone TEXT NOT NULL,
-            participants_count INTEGER NOT NULL,
-            booking_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(excursion_date)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    """Создает таблицы и индексы если они не существуют"""
+    service.init_db()
 
 def get_bookings_count_by_date():
-    """Получаем количество записей на каждую дату"""
-    init_database()
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT excursion_date, COUNT(*) as count 
-        FROM bookings 
-        GROUP BY excursion_date
-    ''')
-    booked_dates = {}
-    for row in cursor.fetchall():
-        booked_dates[row['excursion_date']] = row['count']
-    
-    conn.close()
-    return booked_dates
+    """Получаем количество записей на каждую дату (из общего кеша доступности)"""
+    return service.counts_by_date()
+
+def init_process_state():
+    """
+    Создает объекты процесса, у которых внутри блокировки и threading.local.
+    Под gunicorn воркер вызывает ее заново (post_worker_init в gunicorn.conf.py):
+    gevent подменяет threading только в воркере после fork, и объекты,
+    созданные в мастере при preload_app, были бы общими для всех гринлетов
+    """
+    global service, availability
+    # Единая с ботом база: схема, подключения, кеш доступности и атомарная бронь
+    service = BookingService(DB_PATH)
+    # Рассылка изменений свободных мест открытым календарям
+    availability = AvailabilityBroadcaster(DB_PATH, get_bookings_count_by_date, SLOTS_PER_DAY)
+
+init_process_state()
+
+# Схема создается один раз при загрузке приложения
+init_database()
 
 def generate_calendar_data(year=None, month=None):
     """Генерирует данные для календаря на указанный месяц"""
@@ -123,11 +148,11 @@ def generate_calendar_data(year=None, month=None):
             available_slots = 0
         else:
             bookings_count = bookings.get(date_str, 0)
-            available_slots = max(0, 2 - bookings_count)
+            available_slots = max(0, SLOTS_PER_DAY - bookings_count)
             
             if available_slots == 0:
                 status = 'booked'
-            elif available_slots == 1:
+            elif available_slots < SLOTS_PER_DAY:
                 status = 'limited'
             else:
                 status = 'available'
@@ -166,7 +191,8 @@ def index():
         return render_template('index.html', 
                              calendar=calendar_data,
                              today=today,
-                             total_bookings=total_bookings)
+                             total_bookings=total_bookings,
+                             slots_per_day=SLOTS_PER_DAY)
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -233,10 +259,24 @@ def month_view(year, month):
         return render_template('index.html', 
                              calendar=calendar_data,
                              today=today,
-                             total_bookings=total_bookings)
+                             total_bookings=total_bookings,
+                             slots_per_day=SLOTS_PER_DAY)
     except Exception as e:
         return redirect('/')
 
+@app.route('/events/availability')
+def availability_events():
+    """Поток изменений свободных мест для календаря (Server-Sent Events)"""
+    return Response(
+        availability.subscribe(request.headers.get('Last-Event-ID')),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Отключаем буферизацию в nginx, иначе события приходят пачками
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
 @app.route('/book/<date_str>')
 def book_date(date_str):
     """Страница записи на конкретную дату"""
@@ -271,11 +311,10 @@ def book_date(date_str):
             </html>
             ''', 400
         
-        # Получаем количество записей
-        bookings = get_bookings_count_by_date()
-        bookings_count = bookings.get(date_str, 0)
+        # Получаем количество свободных мест
+        available_slots = service.available_slots(date_str)
         
-        if bookings_count >= 2:
+        if available_slots == 0:
             return '''
             <!DOCTYPE html>
             <html>
@@ -287,13 +326,13 @@ def book_date(date_str):
             </html>
             ''', 400
         
-        available_slots = 2 - bookings_count
-        
         return render_template('booking.html',
                              date_str=date_str,
                              date_formatted=date_obj.strftime('%d.%m.%Y'),
                              weekday=RUSSIAN_WEEKDAYS_FULL[date_obj.weekday()],
-                             available_slots=available_slots)
+                             available_slots=available_slots,
+                             slots_per_day=SLOTS_PER_DAY,
+                             excursion_times=EXCURSION_TIMES)
         
     except (ValueError, IndexError):
         return '''
@@ -313,6 +352,7 @@ def submit_booking():
     try:
         # Получаем данные из формы
         excursion_date = request.form.get('excursion_date')
+        excursion_time = request.form.get('excursion_time') or EXCURSION_TIMES[0]
         username = request.form.get('username')
         school_name = request.form.get('school_name')
         class_number = request.form.get('class_number')
@@ -334,11 +374,26 @@ def submit_booking():
             </html>
             '''
         
-        # Проверяем доступность даты
-        bookings = get_bookings_count_by_date()
-        bookings_count = bookings.get(excursion_date, 0)
+        if excursion_time not in EXCURSION_TIMES:
+            excursion_time = EXCURSION_TIMES[0]
+        
+        # Проверяем доступность даты и бронируем одной атомарной операцией:
+        # проверка мест и вставка выполняются в базе вместе, поэтому
+        # одновременные заявки с сайта и из бота не продадут дату дважды
+        reserved = service.reserve(
+            user_id=SITE_USER_ID,
+            username=username,
+            school_name=school_name,
+            class_number=class_number,
+            class_profile=class_profile,
+            excursion_date=excursion_date,
+            excursion_time=excursion_time,
+            contact_person=contact_person,
+            contact_phone=contact_phone,
+            participants_count=int(participants_count)
+        )
         
-        if bookings_count >= 2:
+        if not reserved:
             return '''
             <!DOCTYPE html>
             <html>
@@ -350,20 +405,7 @@ def submit_booking():
             </html>
             '''
         
-        # Добавляем запись в базу данных
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO bookings 
-            (user_id, username, school_name, class_number, class_profile, 
-             excursion_date, contact_person, contact_phone, participants_count)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (1, username, school_name, class_number, class_profile, 
-              excursion_date, contact_person, contact_phone, int(participants_count)))
-        
-        conn.commit()
-        conn.close()
+        availability.notify_write()
         
         # Форматируем дату для отображения
         date_parts = excursion_date.split('-')
@@ -386,23 +428,173 @@ def submit_booking():
         </html>
         '''
 
+def parse_admin_filters(args):
+    """Разбирает фильтры админ-панели из параметров запроса"""
+    filters = {
+        'date_from': (args.get('date_from') or '').strip(),
+        'date_to': (args.get('date_to') or '').strip(),
+        'school': (args.get('school') or '').strip(),
+        'q': (args.get('q') or '').strip(),
+    }
+    
+    # Даты принимаем только в формате YYYY-MM-DD, иначе игнорируем фильтр
+    for key in ('date_from', 'date_to'):
+        if filters[key]:
+            try:
+                datetime.strptime(filters[key], '%Y-%m-%d')
+            except ValueError:
+                filters[key] = ''
+    
+    return filters
+
+def build_admin_where(filters, with_search=True):
+    """
+    Собирает условие WHERE и параметры для фильтров админ-панели.
+    with_search=False — без условия полнотекстового поиска (его ставит search_sql)
+    """
+    conditions = []
+    params = []
+    
+    if filters['date_from']:
+        conditions.append('bookings.excursion_date >= ?')
+        params.append(to_day(filters['date_from']))
+    if filters['date_to']:
+        conditions.append('bookings.excursion_date <= ?')
+        params.append(to_day(filters['date_to']))
+    key = school_key(filters['school'])
+    if key:
+        # Префикс ключа названия (регистр и знаки препинания не важны, в том
+        # числе для кириллицы) через диапазон, чтобы работал индекс idx_bookings_school_key
+        conditions.append('bookings.school_key >= ? AND bookings.school_key < ?')
+        params.extend([key, key + '\uffff'])
+    query = match_query(filters['q'])
+    if with_search and query:
+        conditions.append('bookings.id IN (SELECT rowid FROM bookings_fts WHERE bookings_fts MATCH ?)')
+        params.append(query)
+    
+    return conditions, params
+
+def parse_cursor(value):
+    """Разбирает курсор страницы вида 'YYYY-MM-DD:id'"""
+    try:
+        date_part, id_part = value.rsplit(':', 1)
+        return to_day(date_part), int(id_part)
+    except (AttributeError, ValueError):
+        return None
+
+def get_admin_page(filters, cursor_value=None, page_size=ADMIN_PAGE_SIZE):
+    """
+    Возвращает одну страницу записей для админ-панели.
+    Используется keyset-пагинация по (excursion_date, id), поэтому время
+    запроса не зависит от номера страницы и размера таблицы.
+    Возвращает записи, курсор следующей страницы и время снимка.
+    С поисковым запросом — одна страница лучших совпадений (FTS5, bm25).
+    """
+    query = match_query(filters['q'])
+    if query:
+        conditions, params = build_admin_where(filters, with_search=False)
+        with read_snapshot(DB_PATH, booking_row) as snapshot:
+            rows = snapshot.conn.execute(search_sql(where=' AND '.join(conditions)),
+                                         [query] + params + [page_size]).fetchall()
+        return rows, None, snapshot.taken_at
+    
+    conditions, params = build_admin_where(filters)
+    
+    after = parse_cursor(cursor_value) if cursor_value else None
+    if after:
+        conditions.append('(excursion_date, id) < (?, ?)')
+        params.extend(after)
+    
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    
+    # Отдельная транзакция чтения: страница не мешает бронированиям.
+    # Строки — словари с уже переведенными датой и временем экскурсии
+    with read_snapshot(DB_PATH, booking_row) as snapshot:
+        rows = snapshot.conn.execute(f'''
+            SELECT * FROM bookings
+            {where}
+            ORDER BY excursion_date DESC, id DESC
+            LIMIT ?
+        ''', params + [page_size + 1]).fetchall()
+    
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = f"{last['excursion_date']}:{last['id']}"
+    
+    return rows, next_cursor, snapshot.taken_at
+
+def iter_bookings_csv(filters):
+    """Построчно формирует CSV с отфильтрованными записями"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    
+    # BOM, чтобы Excel корректно открыл файл в UTF-8
+    buffer.write('\ufeff')
+    writer.writerow([title for _, title in CSV_COLUMNS])
+    
+    conditions, params = build_admin_where(filters)
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    
+    # Вся выгрузка читает один снимок: строки, записанные во время
+    # выгрузки, в нее не попадут, а сама выгрузка не задержит запись
+    with read_snapshot(DB_PATH, booking_row) as snapshot:
+        cursor = snapshot.conn.execute(f'''
+            SELECT * FROM bookings
+            {where}
+            ORDER BY excursion_date DESC, id DESC
+        ''', params)
+        
+        while True:
+            rows = cursor.fetchmany(CSV_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                writer.writerow([row[column] for column, _ in CSV_COLUMNS])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        
+        # Заголовок, если записей нет
+        if buffer.tell():
+            yield buffer.getvalue()
+
 @app.route('/admin')
 def admin():
     """Админ-панель"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM bookings ORDER BY excursion_date DESC')
-    bookings = cursor.fetchall()
-    conn.close()
+    filters = parse_admin_filters(request.args)
+    bookings, next_cursor, snapshot_time = get_admin_page(filters, request.args.get('after'))
+    
+    # Параметры фильтров без пустых значений — для ссылок пагинации и выгрузки
+    filter_args = {key: value for key, value in filters.items() if value}
+    
+    return render_template('admin.html',
+                         bookings=bookings,
+                         filters=filters,
+                         filter_args=filter_args,
+                         next_cursor=next_cursor,
+                         snapshot_time=snapshot_time,
+                         is_search=match_query(filters['q']) is not None,
+                         is_first_page=not request.args.get('after'))
+
+@app.route('/admin/export.csv')
+def admin_export_csv():
+    """Потоковая выгрузка отфильтрованных записей в CSV"""
+    filters = parse_admin_filters(request.args)
+    filename = f"bookings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     
-    return render_template('admin.html', bookings=bookings)
+    return Response(
+        stream_with_context(iter_bookings_csv(filters)),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 @app.route('/test')
 def test():
     """Тестовая страница"""
     try:
         # Добавим тестовые данные
-        init_database()
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -422,12 +614,13 @@ def test():
         for date_str in test_dates:
             cursor.execute('''
                 INSERT OR IGNORE INTO bookings 
-                (user_id, username, school_name, class_number, excursion_date, contact_person, contact_phone, participants_count)
-                VALUES (1, 'Тестовый', 'Школа №1', '10А', ?, 'Иванов И.И.', '+79001234567', 20)
-            ''', (date_str,))
+                (user_id, username, school_name, class_number, excursion_date, excursion_time, contact_person, contact_phone, participants_count, school_key)
+                VALUES (0, 'Тестовый', 'Школа №1', '10А', ?, ?, 'Иванов И.И.', '+79001234567', 20, ?)
+            ''', (to_day(date_str), to_minute('10:00'), school_key('Школа №1')))
         
         conn.commit()
         conn.close()
+        availability.notify_write()
         
         return '''
         <!DOCTYPE html>
@@ -0,0 +1,134 @@
+"""
+Сборка статических файлов сайта.
+
+Каждый файл из static/ (кроме static/dist) копируется в static/dist под именем
+с хешем содержимого (css/index.3f9a1c2b7d4e.css), рядом кладутся сжатые
+варианты .gz и .br. Такие файлы никогда не меняются, поэтому отдаются с
+Cache-Control: immutable и кешируются браузером на год.
+
+Сборка выполняется автоматически при старте приложения, вручную:
+    python assets.py
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаем только gzip
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+# Какие файлы собираем
+ASSET_EXTENSIONS = ('.css', '.js', '.svg')
+
+# Длина хеша в имени файла
+HASH_LENGTH = 12
+
+# Заголовок кеширования для файлов с хешем в имени
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Сжатые варианты в порядке предпочтения: (Content-Encoding, расширение)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def iter_source_files(static_dir=STATIC_DIR):
+    """Возвращает пути исходных файлов относительно static/"""
+    for root, dirs, files in os.walk(static_dir):
+        # Результаты сборки не собираем повторно
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != DIST_DIR]
+        for filename in sorted(files):
+            if filename.endswith(ASSET_EXTENSIONS):
+                full_path = os.path.join(root, filename)
+                yield os.path.relpath(full_path, static_dir).replace(os.sep, '/')
+
+
+def write_atomic(path, data):
+    """Записывает файл целиком через временный файл"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    # Атомарная замена: параллельно стартующие воркеры не увидят недописанный файл
+    os.replace(tmp_path, path)
+
+
+def write_if_missing(path, data):
+    """Записывает файл, только если его еще нет (имя уже содержит хеш)"""
+    if not os.path.exists(path):
+        write_atomic(path, data)
+
+
+def build_assets(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Собирает файлы с хешем в имени и сжатые варианты, возвращает манифест"""
+    manifest = {}
+
+    for name in iter_source_files(static_dir):
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        base, ext = os.path.splitext(name)
+        hashed_name = f'{base}.{digest}{ext}'
+        target = os.path.join(dist_dir, hashed_name)
+
+        write_if_missing(target, data)
+        write_if_missing(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            write_if_missing(target + '.br', brotli.compress(data, quality=11))
+
+        manifest[name] = hashed_name
+
+    write_atomic(os.path.join(dist_dir, 'manifest.json'),
+                 json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+    return manifest
+
+
+def init_assets(app):
+    """Собирает статику и подключает к приложению asset_url() и маршрут /assets/"""
+    manifest = build_assets()
+
+    def asset_url(name):
+        """URL файла с хешем в имени (или обычный static, если файла нет в манифесте)"""
+        hashed_name = manifest.get(name)
+        if hashed_name is None:
+            return url_for('static', filename=name)
+        return url_for('hashed_asset', filename=hashed_name)
+
+    @app.route('/assets/<path:filename>')
+    def hashed_asset(filename):
+        """Отдает собранный файл, при возможности — заранее сжатый вариант"""
+        path = os.path.normpath(os.path.join(DIST_DIR, filename))
+        if not path.startswith(DIST_DIR + os.sep) or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        accepted = request.headers.get('Accept-Encoding', '')
+
+        encoding = None
+        for candidate, suffix in ENCODINGS:
+            if candidate in accepted and os.path.isfile(path + suffix):
+                encoding = candidate
+                path = path + suffix
+                break
+
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    app.jinja_env.globals['asset_url'] = asset_url
+    return manifest
+
+
+if __name__ == '__main__':
+    for source, target in build_assets().items():
+        print(f'{source} -> dist/{target}')
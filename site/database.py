@@ -12,8 +12,12 @@ class Booking(db.Model):
     school_name = db.Column(db.String(200), nullable=False)
     class_number = db.Column(db.String(20), nullable=False)
     class_profile = db.Column(db.String(100))
-    excursion_date = db.Column(db.Date, nullable=False)
+    # Номер дня от 1970-01-01 и минуты от полуночи (см. booking/dates.py)
+    excursion_date = db.Column(db.Integer, nullable=False)
+    excursion_time = db.Column(db.Integer, nullable=False)
     contact_person = db.Column(db.String(200), nullable=False)
     contact_phone = db.Column(db.String(20), nullable=False)
     participants_count = db.Column(db.Integer, nullable=False)
-    booking_date = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    booking_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('excursion_date', 'excursion_time'),)
\ No newline at end of file
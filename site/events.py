@@ -0,0 +1,145 @@
+"""
+Рассылка изменений свободных мест открытым страницам календаря (Server-Sent Events).
+
+В каждом процессе работает один фоновый поток-наблюдатель. Он держит
+собственное подключение к базе и по PRAGMA data_version узнает о любой
+записи — из этого воркера, из соседних воркеров или из бота. Только тогда
+он перечитывает количество записей по датам и публикует разницу.
+Клиенты ничего не опрашивают в базе: они ждут на общем Condition и
+забирают новые события из кольцевого буфера, поэтому тысячи простаивающих
+подключений стоят лишь памяти под генератор.
+"""
+import collections
+import json
+import os
+import sqlite3
+import threading
+
+# Сколько последних событий хранить для переподключившихся клиентов (Last-Event-ID)
+HISTORY_SIZE = 512
+
+# Как часто наблюдатель проверяет data_version, секунд
+POLL_INTERVAL = 1.0
+
+# Интервал keep-alive комментариев, чтобы прокси не закрывали простаивающее соединение
+KEEPALIVE_INTERVAL = 15.0
+
+# Через сколько миллисекунд браузеру переподключаться после обрыва
+RETRY_MS = 5000
+
+
+class AvailabilityBroadcaster:
+    """Публикует изменения свободных мест по датам всем подписчикам процесса"""
+
+    def __init__(self, db_path, load_counts, capacity,
+                 history_size=HISTORY_SIZE, poll_interval=POLL_INTERVAL):
+        self.db_path = db_path
+        self.load_counts = load_counts
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+
+        self._condition = threading.Condition()
+        self._history = collections.deque(maxlen=history_size)
+        self._seq = 0
+        self._wakeup = threading.Event()
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        """Запускает наблюдателя в текущем процессе (после fork — заново)"""
+        if self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            thread = threading.Thread(target=self._watch, name='availability-watcher', daemon=True)
+            thread.start()
+            self._started_pid = os.getpid()
+
+    def notify_write(self):
+        """Будит наблюдателя сразу после записи, не дожидаясь следующей проверки"""
+        self._wakeup.set()
+
+    def publish(self, changes):
+        """Добавляет событие {дата: свободных мест} и будит подписчиков"""
+        with self._condition:
+            self._seq += 1
+            self._history.append((self._seq, json.dumps(changes, separators=(',', ':'))))
+            self._condition.notify_all()
+
+    def _events_after(self, last_seq):
+        """События после last_seq; None, если клиент отстал дальше буфера"""
+        if not self._history or last_seq >= self._seq:
+            return []
+        if last_seq < self._history[0][0] - 1:
+            return None
+        return [event for event in self._history if event[0] > last_seq]
+
+    def subscribe(self, last_event_id=None):
+        """Генератор SSE-сообщений для одного клиента"""
+        self.ensure_started()
+
+        try:
+            last_seq = int(last_event_id)
+        except (TypeError, ValueError):
+            last_seq = None
+
+        with self._condition:
+            if last_seq is None or last_seq > self._seq:
+                last_seq = self._seq
+
+        yield f'retry: {RETRY_MS}\n\n'
+
+        while True:
+            with self._condition:
+                events = self._events_after(last_seq)
+                if events == []:
+                    self._condition.wait(KEEPALIVE_INTERVAL)
+                    events = self._events_after(last_seq)
+                current_seq = self._seq
+
+            if events is None:
+                # Пропущено слишком много изменений — пусть страница перезагрузится
+                last_seq = current_seq
+                yield f'id: {last_seq}\nevent: reset\ndata: {{}}\n\n'
+            elif events:
+                for seq, data in events:
+                    last_seq = seq
+                    yield f'id: {seq}\ndata: {data}\n\n'
+            else:
+                yield ': ping\n\n'
+
+    def _slots(self, count):
+        return max(0, self.capacity - count)
+
+    def _watch(self):
+        """Фоновый поток: следит за data_version и публикует изменения"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            counts = self.load_counts()
+
+            while True:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+                try:
+                    current_version = conn.execute('PRAGMA data_version').fetchone()[0]
+                    if current_version == data_version:
+                        continue
+                    new_counts = self.load_counts()
+                except sqlite3.Error:
+                    # База временно недоступна — попробуем на следующей итерации
+                    continue
+                data_version = current_version
+
+                changes = {
+                    date_str: self._slots(new_counts.get(date_str, 0))
+                    for date_str in set(counts) | set(new_counts)
+                    if counts.get(date_str, 0) != new_counts.get(date_str, 0)
+                }
+                counts = new_counts
+                if changes:
+                    self.publish(changes)
+        finally:
+            conn.close()
@@ -0,0 +1,52 @@
+"""Настройки gunicorn для сайта записи на экскурсии"""
+import multiprocessing
+import os
+
+# Адрес, на котором слушает сайт
+bind = os.environ.get('SITE_BIND', '127.0.0.1:8000')
+
+# Процессы: SQLite в режиме WAL допускает параллельное чтение,
+# запись сериализуется самой базой через busy_timeout
+workers = int(os.environ.get('SITE_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+# Поток /events/availability держит соединение открытым часами. В gthread
+# каждое такое соединение занимает поток воркера, поэтому при наличии gevent
+# используем его: простаивающий подписчик стоит одного гринлета
+try:
+    import gevent  # noqa: F401
+    worker_class = os.environ.get('SITE_WORKER_CLASS', 'gevent')
+except ImportError:
+    worker_class = os.environ.get('SITE_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    # Одновременных соединений на воркер
+    worker_connections = int(os.environ.get('SITE_WORKER_CONNECTIONS', 5000))
+else:
+    # Потоков на воркер (gthread; у gevent их заменяют гринлеты)
+    threads = int(os.environ.get('SITE_THREADS', 4))
+
+# Приложение загружается в мастер-процессе один раз, воркеры получают его через fork
+preload_app = True
+
+
+# Keep-alive чуть больше, чем у типичного reverse proxy, чтобы прокси
+# не получал закрытое соединение посреди запроса
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+
+# Периодический перезапуск воркеров защищает от утечек памяти
+max_requests = 2000
+max_requests_jitter = 200
+
+pidfile = 'gunicorn.pid'
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
+
+
+def post_worker_init(worker):
+    # Вызывается в воркере после monkey-patch gevent: подключения и рассылку
+    # мест воркер создает сам, с блокировками и threading.local гринлетов
+    from app import init_process_state
+    init_process_state()
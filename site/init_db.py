@@ -1,30 +1,20 @@
-import sqlite3
+import os
+import sys
 
-conn = sqlite3.connect('instance/bookings.db')
-cursor = conn.cursor()
+# Общий с ботом пакет booking лежит в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Создаем таблицу bookings
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS bookings (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    username TEXT,
-    school_name TEXT NOT NULL,
-    class_number TEXT NOT NULL,
-    class_profile TEXT,
-    excursion_date TEXT NOT NULL,
-    contact_person TEXT NOT NULL,
-    contact_phone TEXT NOT NULL,
-    participants_count INTEGER NOT NULL,
-    booking_date TEXT DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(excursion_date)
-)
-''')
+from booking import DB_PATH, connect, init_schema, to_day, to_minute
+from booking.schools import school_key
+
+conn = connect(DB_PATH)
+
+# Создаем таблицу bookings (та же схема, что у бота)
+init_schema(conn)
 
 # Добавим тестовые данные для проверки
-cursor.execute("INSERT OR IGNORE INTO bookings (user_id, username, school_name, class_number, excursion_date, contact_person, contact_phone, participants_count) VALUES (1, 'Тестовый', 'Школа №1', '10А', '2024-02-10', 'Иванов', '+79001234567', 20)")
+conn.execute("INSERT OR IGNORE INTO bookings (user_id, username, school_name, class_number, excursion_date, excursion_time, contact_person, contact_phone, participants_count, school_key) VALUES (0, 'Тестовый', 'Школа №1', '10А', ?, ?, 'Иванов', '+79001234567', 20, ?)", (to_day('2024-02-10'), to_minute('10:00'), school_key('Школа №1')))
 
-conn.commit()
 conn.close()
 
 print("✅ Таблица 'bookings' создана успешно!")
@@ -0,0 +1,148 @@
+"""
+Локальный нагрузочный тест сайта.
+
+Пример:
+    gunicorn -c gunicorn.conf.py wsgi:app
+    python loadtest.py --url http://127.0.0.1:8000 --concurrency 32 --duration 20
+
+Для каждого сценария (/, /book/<date>, /submit_booking) выводит
+p50/p99 задержки и пропускную способность (запросов в секунду).
+"""
+import argparse
+import http.client
+import random
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+
+SCENARIOS = ('index', 'book', 'submit')
+
+
+def future_weekdays(count=200):
+    """Будние дни начиная с завтрашнего"""
+    days = []
+    current = date.today() + timedelta(days=1)
+    while len(days) < count:
+        if current.weekday() < 5:
+            days.append(current.strftime('%Y-%m-%d'))
+        current += timedelta(days=1)
+    return days
+
+
+def percentile(values, p):
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Worker(threading.Thread):
+    """Поток, который гоняет запросы по одному keep-alive соединению"""
+
+    def __init__(self, host, port, deadline, scenarios, dates, results, lock):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.deadline = deadline
+        self.scenarios = scenarios
+        self.dates = dates
+        self.results = results
+        self.lock = lock
+        self.conn = None
+
+    def connect(self):
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+    def request(self, scenario):
+        date_str = random.choice(self.dates)
+        if scenario == 'index':
+            self.conn.request('GET', '/')
+        elif scenario == 'book':
+            self.conn.request('GET', f'/book/{date_str}')
+        else:
+            body = urlencode({
+                'excursion_date': date_str,
+                'username': 'Нагрузочный тест',
+                'school_name': f'Школа №{random.randint(1, 5000)}',
+                'class_number': '10А',
+                'class_profile': '',
+                'contact_person': 'Иванов Иван',
+                'contact_phone': '+79001234567',
+                'participants_count': '15',
+            })
+            self.conn.request('POST', '/submit_booking', body=body, headers={
+                'Content-Type': 'application/x-www-form-urlencoded',
+            })
+        response = self.conn.getresponse()
+        response.read()
+        return response.status
+
+    def run(self):
+        self.connect()
+        local = {name: [] for name in self.scenarios}
+        errors = {name: 0 for name in self.scenarios}
+        while time.perf_counter() < self.deadline:
+            scenario = random.choice(self.scenarios)
+            started = time.perf_counter()
+            try:
+                status = self.request(scenario)
+                if status >= 500:
+                    errors[scenario] += 1
+            except (OSError, http.client.HTTPException):
+                errors[scenario] += 1
+                self.conn.close()
+                self.connect()
+                continue
+            local[scenario].append(time.perf_counter() - started)
+        self.conn.close()
+
+        with self.lock:
+            for name in self.scenarios:
+                self.results[name]['latencies'].extend(local[name])
+                self.results[name]['errors'] += errors[name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест сайта записи на экскурсии')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Адрес сайта')
+    parser.add_argument('--concurrency', type=int, default=16, help='Число параллельных клиентов')
+    parser.add_argument('--duration', type=float, default=10.0, help='Длительность теста, секунд')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='Сценарии через запятую: index, book, submit')
+    args = parser.parse_args()
+
+    parts = urlsplit(args.url)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip() in SCENARIOS]
+    dates = future_weekdays()
+    results = {name: {'latencies': [], 'errors': 0} for name in scenarios}
+    lock = threading.Lock()
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    workers = [
+        Worker(parts.hostname, parts.port or 80, deadline, scenarios, dates, results, lock)
+        for _ in range(args.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"{'Сценарий':<10} {'Запросов':>9} {'Ошибок':>7} {'p50, мс':>9} {'p99, мс':>9} {'Среднее, мс':>12} {'RPS':>8}")
+    total = 0
+    for name in scenarios:
+        latencies = sorted(results[name]['latencies'])
+        total += len(latencies)
+        mean = statistics.mean(latencies) * 1000 if latencies else 0.0
+        print(f"{name:<10} {len(latencies):>9} {results[name]['errors']:>7} "
+              f"{percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 99) * 1000:>9.1f} "
+              f"{mean:>12.1f} {len(latencies) / elapsed:>8.1f}")
+    print(f"Итого: {total} запросов за {elapsed:.1f} с, {total / elapsed:.1f} запросов/с")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+// Обновление свободных мест в календаре без перезагрузки страницы (Server-Sent Events)
+(function () {
+    var table = document.querySelector('table.calendar[data-events-url]');
+    if (!table || !window.EventSource) {
+        return;
+    }
+
+    var capacity = parseInt(table.getAttribute('data-capacity'), 10) || 1;
+
+    function slotsText(slots) {
+        if (slots === 0) {
+            return '✗ Нет мест';
+        }
+        if (slots < capacity) {
+            return '! Осталось мест: ' + slots;
+        }
+        return '✓ Свободно мест: ' + slots;
+    }
+
+    function statusFor(slots) {
+        if (slots === 0) {
+            return 'booked';
+        }
+        return slots < capacity ? 'limited' : 'available';
+    }
+
+    function updateDay(cell, slots) {
+        var status = statusFor(slots);
+        var isToday = cell.classList.contains('day-today');
+        cell.className = 'day-' + status + (isToday ? ' day-today' : '');
+
+        var badge = cell.querySelector('.day-status');
+        if (badge) {
+            badge.className = 'day-status status-' + status;
+            badge.textContent = slots + '/' + capacity;
+        }
+
+        var info = cell.querySelector('.slots-info');
+        if (info) {
+            info.textContent = slotsText(slots);
+        }
+
+        var button = cell.querySelector('.booking-btn');
+        if (!button) {
+            return;
+        }
+        var replacement;
+        if (status === 'booked') {
+            replacement = document.createElement('button');
+            replacement.className = 'booking-btn disabled';
+            replacement.disabled = true;
+            replacement.textContent = 'Недоступно';
+        } else {
+            replacement = document.createElement('a');
+            replacement.className = 'booking-btn';
+            replacement.href = '/book/' + cell.getAttribute('data-date');
+            replacement.textContent = 'Записаться';
+        }
+        button.parentNode.replaceChild(replacement, button);
+    }
+
+    var source = new EventSource(table.getAttribute('data-events-url'));
+
+    source.onmessage = function (event) {
+        var changes = JSON.parse(event.data);
+        Object.keys(changes).forEach(function (dateStr) {
+            var cell = table.querySelector('td[data-date="' + dateStr + '"]');
+            if (cell) {
+                updateDay(cell, changes[dateStr]);
+            }
+        });
+    };
+
+    // Сервер не может восстановить пропущенные изменения — обновляем страницу целиком
+    source.addEventListener('reset', function () {
+        window.location.reload();
+    });
+})();
@@ -0,0 +1,12 @@
+"""
+Точка входа для production-запуска сайта.
+
+Запуск:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Плавная перезагрузка воркеров без потери запросов:
+    kill -HUP $(cat gunicorn.pid)
+"""
+# При импорте app схема и режим WAL настраиваются один раз в мастер-процессе
+# до fork, воркеры открывают собственные подключения уже к готовой базе
+from app import app
@@ -0,0 +1,71 @@
+"""
+Замеры запуска бота.
+
+Модуль импортируется первым в bot.py и запоминает время старта; дальше
+bot.py отмечает фазы (импорты, post_init, первое обновление). Отчет
+о времени импортов строится запуском `python -X importtime -c "import bot"`
+в отдельном процессе — в текущем процессе модули уже загружены.
+"""
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+PROCESS_STARTED = time.monotonic()
+
+# Фаза -> секунды от старта
+phases: Dict[str, float] = {}
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def mark(phase: str) -> None:
+    """Отмечает фазу запуска (повторная отметка не перезаписывает первую)"""
+    phases.setdefault(phase, time.monotonic() - PROCESS_STARTED)
+
+
+async def on_update(update, context) -> None:
+    """Обработчик для TypeHandler: отмечает время первого обновления"""
+    if 'first_update' not in phases:
+        mark('first_update')
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    """Строки `import time: self | cumulative | module` -> (модуль, self мкс, cumulative мкс)"""
+    result = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # заголовок таблицы
+        result.append((parts[2].rstrip(), int(parts[0]), int(parts[1])))
+    return result
+
+
+async def import_time_report(module: str = 'bot', top: int = 15) -> str:
+    """Топ модулей по суммарному времени импорта (в отдельном процессе)"""
+    env = dict(os.environ, LOG_FILE=os.devnull, RECORD_UPDATES_PATH='')
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, '-X', 'importtime', '-c', f'import {module}',
+        cwd=REPO_DIR, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    rows = parse_importtime(stderr.decode('utf-8', 'replace'))
+    if not rows:
+        return "Не удалось получить время импортов"
+
+    total = next((cumulative for name, _, cumulative in rows if name.strip() == module), 0)
+    lines = [f"Импорт {module}: {total / 1000:.0f} мс", "Модуль — собственное / суммарное, мс:"]
+    for name, self_us, cumulative in sorted(rows, key=lambda row: -row[2])[:top]:
+        lines.append(f"{name.strip()} — {self_us / 1000:.1f} / {cumulative / 1000:.1f}")
+    return "\n".join(lines)
+
+
+def phases_report() -> str:
+    lines = ["Фазы запуска (с от старта процесса):"]
+    for phase, seconds in sorted(phases.items(), key=lambda item: item[1]):
+        lines.append(f"• {phase}: {seconds:.3f}")
+    return "\n".join(lines)
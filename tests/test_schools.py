@@ -0,0 +1,43 @@
+"""
+Подсказки названия школы (booking/schools.py).
+
+Запуск:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking.schools import SchoolIndex  # noqa: E402
+
+
+class SuggestTest(unittest.TestCase):
+    def test_prefix_with_more_words_than_schools(self):
+        # У каждой школы три разных слова на «лес» или «лев»: слов с самым
+        # редким началом больше, чем школ в справочнике
+        rows = []
+        for number in range(60):
+            rows.append((len(rows) + 1, f'леса{number} лесб{number} лесв{number}', 1))
+            rows.append((len(rows) + 1, f'лева{number} левб{number} левв{number}', 1))
+        rows.append((len(rows) + 1, 'Лесной левый берег', 5))
+        rows.append((len(rows) + 1, 'лесная левада', 1))
+        index = SchoolIndex.from_rows(rows)
+
+        self.assertEqual(index.suggest('лес лев', 5), ['Лесной левый берег', 'лесная левада'])
+        self.assertEqual(index.suggest('лев лес', 5), ['Лесной левый берег', 'лесная левада'])
+
+    def test_whole_words_before_prefixes(self):
+        index = SchoolIndex.from_rows([
+            (1, 'Лицей №1501', 10),
+            (2, 'Лицей №15', 1),
+            (3, 'ЛИЦЕЙ № 15', 1),
+        ])
+
+        self.assertEqual(index.suggest('лицей 15', 5), ['Лицей №15', 'Лицей №1501'])
+        self.assertEqual(index.canonical('лицей 15'), 'Лицей №15')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Проверки полей брони.
+
+Одни и те же правила для шагов диалога бронирования и для импорта броней
+из файла. Функции принимают текст сообщения или значение ячейки таблицы
+и возвращают приведенное значение либо бросают ValueError с причиной.
+"""
+import re
+from datetime import date, datetime, time
+from typing import Optional
+
+from config import DATE_FORMAT, DISPLAY_DATE_FORMAT, TIME_FORMAT, WORKING_DAYS, WORKING_HOURS_START, WORKING_HOURS_END
+
+SCHOOL_MIN_LENGTH = 3
+CLASS_PATTERN = re.compile(r'^[1-9][0-9]?[А-Яа-яA-Za-z]?$')
+PHONE_PATTERN = re.compile(r'^(\+7|8|7)[\d]{10}$')
+MIN_PARTICIPANTS = 1
+MAX_PARTICIPANTS = 20
+
+# Форматы даты, которые принимает диалог
+DATE_INPUT_FORMATS = (DISPLAY_DATE_FORMAT, "%d/%m/%Y", DATE_FORMAT)
+
+
+def _text(value) -> str:
+    """Текст ячейки: целые числа из таблиц приходят как int или float"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return '' if value is None else str(value).strip()
+
+
+def school_name(value) -> str:
+    text = _text(value)
+    if len(text) < SCHOOL_MIN_LENGTH:
+        raise ValueError(f"название школы короче {SCHOOL_MIN_LENGTH} символов")
+    return text
+
+
+def class_number(value) -> str:
+    text = _text(value)
+    if not CLASS_PATTERN.match(text):
+        raise ValueError(f"неверный класс «{text}»")
+    return text
+
+
+def parse_date(value) -> date:
+    """Дата из datetime/date или текста в одном из DATE_INPUT_FORMATS"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    for date_format in DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"неверная дата «{text}»")
+
+
+def is_working_day(day: date) -> bool:
+    return day.weekday() in WORKING_DAYS
+
+
+def excursion_date(value, today: Optional[date] = None) -> date:
+    """Дата экскурсии: не в прошлом и в рабочий день"""
+    day = parse_date(value)
+    if day < (today or date.today()):
+        raise ValueError(f"дата {day.strftime(DISPLAY_DATE_FORMAT)} уже прошла")
+    if not is_working_day(day):
+        raise ValueError(f"{day.strftime(DISPLAY_DATE_FORMAT)} — не день экскурсий")
+    return day
+
+
+def parse_time(value) -> time:
+    """Время из datetime/time или текста ЧЧ:ММ"""
+    if isinstance(value, datetime):
+        return value.time()
+    if isinstance(value, time):
+        return value
+    text = _text(value)
+    try:
+        return datetime.strptime(text, TIME_FORMAT).time()
+    except ValueError:
+        raise ValueError(f"неверное время «{text}»") from None
+
+
+def in_working_hours(moment: time) -> bool:
+    return WORKING_HOURS_START <= moment.hour <= WORKING_HOURS_END
+
+
+def excursion_time(value) -> str:
+    """Время экскурсии в рабочие часы, строкой ЧЧ:ММ"""
+    moment = parse_time(value)
+    if not in_working_hours(moment):
+        raise ValueError(f"время {moment.strftime(TIME_FORMAT)} вне часов экскурсий")
+    return moment.strftime(TIME_FORMAT)
+
+
+def contact_person(value) -> str:
+    """Фамилия и имя (хотя бы два слова)"""
+    text = _text(value)
+    if len(text.split()) < 2:
+        raise ValueError("у сопровождающего нужны фамилия и имя")
+    return text
+
+
+def contact_phone(value) -> str:
+    """Телефон +7XXXXXXXXXX (принимаются также 8XXXXXXXXXX и 7XXXXXXXXXX)"""
+    text = _text(value)
+    # Очищаем телефон от лишних символов
+    phone = text.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
+    if not PHONE_PATTERN.match(phone):
+        raise ValueError(f"неверный телефон «{text}»")
+    # Приводим к единому формату
+    if phone.startswith('8'):
+        return '+7' + phone[1:]
+    if phone.startswith('7'):
+        return '+' + phone
+    return phone
+
+
+def participants(value) -> int:
+    text = _text(value)
+    try:
+        count = int(text)
+    except ValueError:
+        raise ValueError(f"количество участников «{text}» — не число") from None
+    if not MIN_PARTICIPANTS <= count <= MAX_PARTICIPANTS:
+        raise ValueError(f"участников должно быть от {MIN_PARTICIPANTS} до {MAX_PARTICIPANTS}")
+    return count